@@ -0,0 +1,122 @@
+import { describe, expect, it } from '@jest/globals';
+import {
+  SensorMeasurementRollupRow,
+  SensorMeasurementRow,
+  SensorMeasurementsRollupAccumulator,
+  startOfDay,
+  startOfHour,
+} from '../sensor-measurements-rollup-schedule/SensorMeasurementsRollup';
+
+const PLANTS = ['6f1c2b8e-4a57-4d0c-9a3e-2b1d7c5e8f90', '0b9e7d6c-5a4f-4e3d-8c2b-1a0f9e8d7c6b'];
+const START = Date.UTC(2026, 2, 1, 8, 0, 0);
+const MINUTES = 5 * 60;
+const STEP_MINUTES = 7;
+
+function measurement(plant: string, minutes: number, index: number): SensorMeasurementRow {
+  const voltage = 1.5 + ((index * 7) % 13) / 10;
+  return {
+    plant: plant,
+    measured_at: new Date(START + minutes * 60 * 1000).toISOString(),
+    moisture_percentage: 20 + ((index * 11) % 17) * 2.5,
+    voltage_current: voltage,
+    voltage_min: voltage - 0.05,
+    voltage_max: voltage + 0.05,
+  };
+}
+
+function measurements(): SensorMeasurementRow[] {
+  const rows: SensorMeasurementRow[] = [];
+  for (let minutes = 0; minutes < MINUTES; minutes += STEP_MINUTES) {
+    PLANTS.forEach((plant, plantIndex) => rows.push(measurement(plant, minutes, rows.length + plantIndex)));
+  }
+  return rows;
+}
+
+/**
+ * Applies the result of mergeInto like the schedule does with createMany / updateBatch.
+ */
+function merge(stored: SensorMeasurementRollupRow[], rows: SensorMeasurementRow[], bucketStartOf: (date: Date) => Date): SensorMeasurementRollupRow[] {
+  const accumulator = new SensorMeasurementsRollupAccumulator(bucketStartOf);
+  rows.forEach(row => accumulator.add(row));
+  const { create, update } = accumulator.mergeInto(stored);
+  const byId = new Map<string, SensorMeasurementRollupRow>(stored.map(row => [row.id!, row]));
+  for (const row of update) {
+    byId.set(row.id!, row);
+  }
+  for (const row of create) {
+    const id = `rollup-${byId.size + 1}`;
+    byId.set(id, { ...row, id: id });
+  }
+  return Array.from(byId.values());
+}
+
+function byBucket(rows: SensorMeasurementRollupRow[]) {
+  return new Map<string, SensorMeasurementRollupRow>(rows.map(row => [SensorMeasurementsRollupAccumulator.getBucketKey(row.plant, new Date(row.bucket_start)), row]));
+}
+
+function expectSameRollup(actual: SensorMeasurementRollupRow[], expected: SensorMeasurementRollupRow[]) {
+  const actualByBucket = byBucket(actual);
+  const expectedByBucket = byBucket(expected);
+  expect(actual.length).toBe(expected.length);
+  expect(Array.from(actualByBucket.keys()).sort()).toEqual(Array.from(expectedByBucket.keys()).sort());
+  for (const [key, expectedRow] of expectedByBucket) {
+    const actualRow = actualByBucket.get(key)!;
+    expect(actualRow.bucket_key).toBe(key);
+    expect(actualRow.measurement_count).toBe(expectedRow.measurement_count);
+    expect(actualRow.moisture_min).toBe(expectedRow.moisture_min);
+    expect(actualRow.moisture_max).toBe(expectedRow.moisture_max);
+    expect(actualRow.voltage_min).toBe(expectedRow.voltage_min);
+    expect(actualRow.voltage_max).toBe(expectedRow.voltage_max);
+    expect(actualRow.moisture_avg).toBeCloseTo(expectedRow.moisture_avg!, 9);
+    expect(actualRow.voltage_avg).toBeCloseTo(expectedRow.voltage_avg!, 9);
+  }
+}
+
+describe('SensorMeasurementsRollupAccumulator', () => {
+  for (const [name, bucketStartOf] of [
+    ['hourly', startOfHour],
+    ['daily', startOfDay],
+  ] as const) {
+    it(`merges incremental ${name} runs into the same rollup as one run over all rows`, () => {
+      const rows = measurements();
+      // Late rows from the sensor spool: rolled up in the last run, but measured in the first hour
+      const lateRows = PLANTS.map((plant, index) => measurement(plant, 3 + index, 1000 + index));
+      const oneShot = merge([], [...rows, ...lateRows], bucketStartOf);
+
+      let incremental: SensorMeasurementRollupRow[] = [];
+      incremental = merge(incremental, rows.slice(0, 37), bucketStartOf);
+      incremental = merge(incremental, rows.slice(37, 80), bucketStartOf);
+      incremental = merge(incremental, [...rows.slice(80), ...lateRows], bucketStartOf);
+
+      expectSameRollup(incremental, oneShot);
+    });
+  }
+
+  it('updates stored rows whose bucket_start is formatted differently instead of creating duplicates', () => {
+    const rows = measurements().slice(0, 10);
+    const stored = merge([], rows, startOfHour).map(row => ({
+      ...row,
+      bucket_start: row.bucket_start.replace('.000Z', 'Z'),
+      bucket_key: null,
+    }));
+
+    const accumulator = new SensorMeasurementsRollupAccumulator(startOfHour);
+    rows.forEach(row => accumulator.add(row));
+    const { create, update } = accumulator.mergeInto(stored);
+
+    expect(create).toEqual([]);
+    expect(update.length).toBe(stored.length);
+    expect(update.every(row => row.bucket_key === SensorMeasurementsRollupAccumulator.getBucketKey(row.plant, new Date(row.bucket_start)))).toBe(true);
+  });
+
+  it('covers all buckets with its plants and bucket range', () => {
+    const accumulator = new SensorMeasurementsRollupAccumulator(startOfHour);
+    measurements().forEach(row => accumulator.add(row));
+
+    const range = accumulator.getBucketRange()!;
+    expect(accumulator.getPlants().sort()).toEqual([...PLANTS].sort());
+    expect(range.first.getTime()).toBe(startOfHour(new Date(START)).getTime());
+    const lastMinutes = Math.floor((MINUTES - 1) / STEP_MINUTES) * STEP_MINUTES;
+    expect(range.last.getTime()).toBe(startOfHour(new Date(START + lastMinutes * 60 * 1000)).getTime());
+  });
+});
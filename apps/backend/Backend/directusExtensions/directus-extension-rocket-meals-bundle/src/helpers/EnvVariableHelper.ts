@@ -100,6 +100,16 @@ export class EnvVariableHelper {
     return this.getEnvVariable(EnvVariableHelper.getEnvFieldNameForAutoTranslateApiKey());
   }
 
+  static getSensorRollupCron() {
+    return this.getEnvVariable('SENSOR_ROLLUP_CRON') || '*/10 * * * *';
+  }
+
+  static getSensorRollupRetentionDays(): number {
+    // 0 or unset keeps all raw sensor_measurements
+    let value = parseInt(this.getEnvVariable('SENSOR_ROLLUP_RETENTION_DAYS') || '0', 10);
+    return Number.isNaN(value) ? 0 : value;
+  }
+
   static getAdminEmail() {
     return this.getEnvVariable('ADMIN_EMAIL');
   }
@@ -0,0 +1,123 @@
+/**
+ * Decoder for the compact binary measurement format sent by the sensor agent
+ * (apps/sensor/wire_format.py). All numbers are little endian fixed-point integers.
+ *
+ * Frame:  magic "FP" | version (u8) | record count (u16)
+ * Record: seconds (u32) | milliseconds (u16) | flags (u8) | status (u8) | dedupe_key (16 bytes)
+ *         | moisture (u16, 0.1 %) | voltage current/min/max (3x u16, mV)
+ *         | voltage stddev (u16, 0.1 mV) | moisture stddev (u16, 0.01 %)
+ *         [| plant (16 byte uuid)] [| voltage median (u16, mV) | moisture median (u16, 0.1 %)]
+ *         [| suppressed_windows (u16)]
+ */
+export const SENSOR_WIRE_CONTENT_TYPE = 'application/vnd.flowerpi.measurements';
+
+const MAGIC = 'FP';
+const VERSION = 1;
+const FRAME_SIZE = 5;
+const RECORD_SIZE = 36;
+const UUID_SIZE = 16;
+
+const FLAG_PLANT = 0x01;
+const FLAG_MEDIANS = 0x02;
+const FLAG_SUPPRESSED = 0x04;
+
+const STATUSES = ['published', 'draft', 'archived'];
+
+export type SensorMeasurementPayload = {
+  measured_at: string;
+  moisture_percentage: number;
+  voltage_current: number;
+  voltage_min: number;
+  voltage_max: number;
+  voltage_stddev: number;
+  moisture_stddev: number;
+  status: string;
+  dedupe_key: string;
+  plant?: string;
+  voltage_median?: number;
+  moisture_median?: number;
+  suppressed_windows?: number;
+};
+
+export class SensorWireFormatError extends Error {}
+
+function bytesToHex(data: Uint8Array, offset: number, length: number): string {
+  let hex = '';
+  for (let index = offset; index < offset + length; index++) {
+    hex += data[index]!.toString(16).padStart(2, '0');
+  }
+  return hex;
+}
+
+function bytesToUuid(data: Uint8Array, offset: number): string {
+  const hex = bytesToHex(data, offset, UUID_SIZE);
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+}
+
+export class SensorWireFormat {
+  static decode(buffer: Uint8Array): SensorMeasurementPayload[] {
+    if (buffer.byteLength < FRAME_SIZE) {
+      throw new SensorWireFormatError('Frame too short.');
+    }
+    const view = new DataView(buffer.buffer, buffer.byteOffset, buffer.byteLength);
+    const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1));
+    if (magic !== MAGIC || view.getUint8(2) !== VERSION) {
+      throw new SensorWireFormatError('Not a flower-pi measurement frame.');
+    }
+    const count = view.getUint16(3, true);
+
+    const payloads: SensorMeasurementPayload[] = [];
+    let offset = FRAME_SIZE;
+    const ensure = (length: number) => {
+      if (offset + length > buffer.byteLength) {
+        throw new SensorWireFormatError('Frame truncated.');
+      }
+    };
+
+    for (let index = 0; index < count; index++) {
+      ensure(RECORD_SIZE);
+      const seconds = view.getUint32(offset, true);
+      const millis = view.getUint16(offset + 4, true);
+      const flags = view.getUint8(offset + 6);
+      const status = STATUSES[view.getUint8(offset + 7)];
+      if (!status) {
+        throw new SensorWireFormatError('Unknown status.');
+      }
+      const payload: SensorMeasurementPayload = {
+        measured_at: new Date(seconds * 1000 + millis).toISOString(),
+        status: status,
+        dedupe_key: bytesToHex(buffer, offset + 8, UUID_SIZE),
+        moisture_percentage: view.getUint16(offset + 24, true) / 10,
+        voltage_current: view.getUint16(offset + 26, true) / 1000,
+        voltage_min: view.getUint16(offset + 28, true) / 1000,
+        voltage_max: view.getUint16(offset + 30, true) / 1000,
+        voltage_stddev: view.getUint16(offset + 32, true) / 10000,
+        moisture_stddev: view.getUint16(offset + 34, true) / 100,
+      };
+      offset += RECORD_SIZE;
+
+      if (flags & FLAG_PLANT) {
+        ensure(UUID_SIZE);
+        payload.plant = bytesToUuid(buffer, offset);
+        offset += UUID_SIZE;
+      }
+      if (flags & FLAG_MEDIANS) {
+        ensure(4);
+        payload.voltage_median = view.getUint16(offset, true) / 1000;
+        payload.moisture_median = view.getUint16(offset + 2, true) / 10;
+        offset += 4;
+      }
+      if (flags & FLAG_SUPPRESSED) {
+        ensure(2);
+        payload.suppressed_windows = view.getUint16(offset, true);
+        offset += 2;
+      }
+      payloads.push(payload);
+    }
+
+    if (offset !== buffer.byteLength) {
+      throw new SensorWireFormatError('Trailing bytes after the last measurement.');
+    }
+    return payloads;
+  }
+}
@@ -0,0 +1,64 @@
+import { defineEndpoint } from '@directus/extensions-sdk';
+import { SENSOR_WIRE_CONTENT_TYPE, SensorWireFormat, SensorWireFormatError } from './SensorWireFormat';
+
+const ENDPOINT_ID = 'sensor-ingest';
+const SENSOR_MEASUREMENTS_COLLECTION = 'sensor_measurements';
+// A frame holds at most 65535 records of at most 58 bytes each.
+const MAX_BODY_BYTES = 4 * 1024 * 1024;
+
+function sendError(res: any, status: number, code: string, message: string) {
+  res.status(status).json({ errors: [{ message: message, extensions: { code: code } }] });
+}
+
+async function readRawBody(req: AsyncIterable<Buffer>, maxBytes: number): Promise<Buffer | undefined> {
+  const chunks: Buffer[] = [];
+  let size = 0;
+  for await (const chunk of req) {
+    size += chunk.length;
+    if (size > maxBytes) {
+      return undefined;
+    }
+    chunks.push(chunk);
+  }
+  return Buffer.concat(chunks);
+}
+
+/**
+ * POST /sensor-ingest/measurements
+ * Accepts the compact binary measurement format of the sensor agent (SENSOR_WIRE_FORMAT=binary),
+ * decodes it and creates the items like POST /items/sensor_measurements, with the permissions of the
+ * calling user. Errors (e.g. RECORD_NOT_UNIQUE for a known dedupe_key) are returned like Directus does.
+ */
+export default defineEndpoint({
+  id: ENDPOINT_ID,
+  handler: (router, apiContext) => {
+    router.post('/measurements', async (req: any, res: any, next: any) => {
+      if (!req.accountability?.user) {
+        return sendError(res, 401, 'INVALID_CREDENTIALS', 'Authentication required.');
+      }
+      const contentType = (req.headers['content-type'] || '').split(';')[0].trim();
+      if (contentType !== SENSOR_WIRE_CONTENT_TYPE) {
+        return sendError(res, 415, 'UNSUPPORTED_MEDIA_TYPE', `Expected ${SENSOR_WIRE_CONTENT_TYPE}.`);
+      }
+
+      try {
+        const body = await readRawBody(req, MAX_BODY_BYTES);
+        if (!body) {
+          return sendError(res, 413, 'REQUEST_TOO_LARGE', 'Measurement frame too large.');
+        }
+        const measurements = SensorWireFormat.decode(body);
+        const itemsService = new apiContext.services.ItemsService(SENSOR_MEASUREMENTS_COLLECTION, {
+          schema: req.schema,
+          accountability: req.accountability,
+        });
+        const keys = await itemsService.createMany(measurements);
+        return res.json({ data: keys });
+      } catch (error) {
+        if (error instanceof SensorWireFormatError) {
+          return sendError(res, 400, 'INVALID_PAYLOAD', error.message);
+        }
+        return next(error);
+      }
+    });
+  },
+});
@@ -0,0 +1,213 @@
+export type SensorMeasurementRow = {
+  plant?: string | null;
+  measured_at?: string | null;
+  date_created?: string | null;
+  moisture_percentage?: number | null;
+  voltage_current?: number | null;
+  voltage_min?: number | null;
+  voltage_max?: number | null;
+};
+
+export type SensorMeasurementRollupRow = {
+  id?: string;
+  plant: string | null;
+  bucket_start: string;
+  bucket_key?: string | null;
+  measurement_count: number;
+  moisture_min: number | null;
+  moisture_max: number | null;
+  moisture_avg: number | null;
+  voltage_min: number | null;
+  voltage_max: number | null;
+  voltage_avg: number | null;
+};
+
+type RunningStat = {
+  min: number | null;
+  max: number | null;
+  sum: number;
+  count: number;
+};
+
+type Bucket = {
+  plant: string | null;
+  bucketStart: Date;
+  measurementCount: number;
+  moisture: RunningStat;
+  voltage: RunningStat;
+};
+
+function isNumber(value: number | null | undefined): value is number {
+  return value !== null && value !== undefined && !Number.isNaN(value);
+}
+
+function emptyStat(): RunningStat {
+  return { min: null, max: null, sum: 0, count: 0 };
+}
+
+function addToStat(stat: RunningStat, value: number | null | undefined, min?: number | null, max?: number | null) {
+  if (!isNumber(value)) {
+    return;
+  }
+  // Window extremes (voltage_min/voltage_max) are more exact than the window average, if the sensor sent them
+  const low = isNumber(min) ? min : value;
+  const high = isNumber(max) ? max : value;
+  stat.min = stat.min === null ? low : Math.min(stat.min, low);
+  stat.max = stat.max === null ? high : Math.max(stat.max, high);
+  stat.sum += value;
+  stat.count += 1;
+}
+
+function mergeMin(a: number | null, b: number | null): number | null {
+  if (a === null) return b;
+  if (b === null) return a;
+  return Math.min(a, b);
+}
+
+function mergeMax(a: number | null, b: number | null): number | null {
+  if (a === null) return b;
+  if (b === null) return a;
+  return Math.max(a, b);
+}
+
+function mergeAvg(existingAvg: number | null, existingCount: number, stat: RunningStat): number | null {
+  if (stat.count === 0) {
+    return existingAvg;
+  }
+  if (existingAvg === null || existingCount === 0) {
+    return stat.sum / stat.count;
+  }
+  return (existingAvg * existingCount + stat.sum) / (existingCount + stat.count);
+}
+
+/**
+ * Buckets start in the local time of the server (TZ), so a daily bucket is a local calendar day.
+ */
+export function startOfHour(date: Date): Date {
+  const start = new Date(date.getTime());
+  start.setMinutes(0, 0, 0);
+  return start;
+}
+
+export function startOfDay(date: Date): Date {
+  return new Date(date.getFullYear(), date.getMonth(), date.getDate());
+}
+
+/**
+ * Directus stores "dateTime" fields (like date_created) without a timezone in the local time of the server.
+ */
+export function toDirectusDateTime(date: Date): string {
+  const pad = (value: number) => String(value).padStart(2, '0');
+  return (
+    `${date.getFullYear()}-${pad(date.getMonth() + 1)}-${pad(date.getDate())}` +
+    `T${pad(date.getHours())}:${pad(date.getMinutes())}:${pad(date.getSeconds())}`
+  );
+}
+
+export function getMeasurementDate(row: SensorMeasurementRow): Date | null {
+  const value = row.measured_at || row.date_created;
+  if (!value) {
+    return null;
+  }
+  const date = new Date(value);
+  return Number.isNaN(date.getTime()) ? null : date;
+}
+
+/**
+ * Aggregates new measurements per plant and bucket, so they can be merged into the already stored rollup rows.
+ * Averages are merged weighted by measurement_count, so the raw rows are not needed again once rolled up.
+ */
+export class SensorMeasurementsRollupAccumulator {
+  private buckets = new Map<string, Bucket>();
+  private bucketStartOf: (date: Date) => Date;
+
+  constructor(bucketStartOf: (date: Date) => Date) {
+    this.bucketStartOf = bucketStartOf;
+  }
+
+  /**
+   * Stored in the unique field bucket_key, so the database holds at most one row per plant and bucket.
+   */
+  static getBucketKey(plant: string | null | undefined, bucketStart: Date): string {
+    return `${plant ?? ''}|${bucketStart.toISOString()}`;
+  }
+
+  get size(): number {
+    return this.buckets.size;
+  }
+
+  add(row: SensorMeasurementRow) {
+    const date = getMeasurementDate(row);
+    if (!date) {
+      return;
+    }
+    const plant = row.plant ?? null;
+    const bucketStart = this.bucketStartOf(date);
+    const key = SensorMeasurementsRollupAccumulator.getBucketKey(plant, bucketStart);
+    let bucket = this.buckets.get(key);
+    if (!bucket) {
+      bucket = { plant, bucketStart, measurementCount: 0, moisture: emptyStat(), voltage: emptyStat() };
+      this.buckets.set(key, bucket);
+    }
+    bucket.measurementCount += 1;
+    addToStat(bucket.moisture, row.moisture_percentage);
+    addToStat(bucket.voltage, row.voltage_current, row.voltage_min, row.voltage_max);
+  }
+
+  getPlants(): (string | null)[] {
+    const plants = new Set<string | null>();
+    for (const bucket of this.buckets.values()) {
+      plants.add(bucket.plant);
+    }
+    return Array.from(plants);
+  }
+
+  /**
+   * First and last bucket start. Existing rows are looked up by this range and matched by their parsed bucket_start,
+   * so the lookup does not depend on how the database formats the stored timestamp.
+   */
+  getBucketRange(): { first: Date; last: Date } | null {
+    let first: Date | null = null;
+    let last: Date | null = null;
+    for (const bucket of this.buckets.values()) {
+      if (!first || bucket.bucketStart < first) first = bucket.bucketStart;
+      if (!last || bucket.bucketStart > last) last = bucket.bucketStart;
+    }
+    return first && last ? { first, last } : null;
+  }
+
+  /**
+   * Returns the rows to create and the rows to update, after merging with the existing rollup rows of the same buckets.
+   */
+  mergeInto(existingRows: SensorMeasurementRollupRow[]): { create: SensorMeasurementRollupRow[]; update: SensorMeasurementRollupRow[] } {
+    const existingByKey = new Map<string, SensorMeasurementRollupRow>();
+    for (const existing of existingRows) {
+      existingByKey.set(SensorMeasurementsRollupAccumulator.getBucketKey(existing.plant, new Date(existing.bucket_start)), existing);
+    }
+
+    const create: SensorMeasurementRollupRow[] = [];
+    const update: SensorMeasurementRollupRow[] = [];
+    for (const [key, bucket] of this.buckets) {
+      const existing = existingByKey.get(key);
+      const existingCount = existing?.measurement_count ?? 0;
+      const row: SensorMeasurementRollupRow = {
+        plant: bucket.plant,
+        bucket_start: bucket.bucketStart.toISOString(),
+        bucket_key: key,
+        measurement_count: existingCount + bucket.measurementCount,
+        moisture_min: mergeMin(existing?.moisture_min ?? null, bucket.moisture.min),
+        moisture_max: mergeMax(existing?.moisture_max ?? null, bucket.moisture.max),
+        moisture_avg: mergeAvg(existing?.moisture_avg ?? null, existingCount, bucket.moisture),
+        voltage_min: mergeMin(existing?.voltage_min ?? null, bucket.voltage.min),
+        voltage_max: mergeMax(existing?.voltage_max ?? null, bucket.voltage.max),
+        voltage_avg: mergeAvg(existing?.voltage_avg ?? null, existingCount, bucket.voltage),
+      };
+      if (existing?.id) {
+        update.push({ ...row, id: existing.id });
+      } else {
+        create.push(row);
+      }
+    }
+    return { create, update };
+  }
+}
@@ -0,0 +1,235 @@
+import { CollectionNames } from 'repo-depkit-common';
+import { MyDefineHook } from '../helpers/MyDefineHook';
+import { ApiContext } from '../helpers/ApiContext';
+import { EnvVariableHelper } from '../helpers/EnvVariableHelper';
+import { DatabaseInitializedCheck } from '../helpers/DatabaseInitializedCheck';
+import {
+  SensorMeasurementRollupRow,
+  SensorMeasurementRow,
+  SensorMeasurementsRollupAccumulator,
+  startOfDay,
+  startOfHour,
+  toDirectusDateTime,
+} from './SensorMeasurementsRollup';
+
+const SCHEDULE_NAME = 'sensor_measurements_rollup';
+
+const SENSOR_MEASUREMENTS_COLLECTION = CollectionNames.SENSOR_MEASUREMENTS;
+const HOURLY_COLLECTION = CollectionNames.SENSOR_MEASUREMENTS_HOURLY;
+const DAILY_COLLECTION = CollectionNames.SENSOR_MEASUREMENTS_DAILY;
+const STATE_COLLECTION = CollectionNames.SENSOR_MEASUREMENTS_ROLLUP_STATE;
+
+// Rows younger than this are left for the next run, so a request that is still being written is not skipped
+const SAFETY_LAG_MS = 60 * 1000;
+// One transaction per day of date_created, so the first run over a large table does not hold one huge transaction
+const SLICE_MS = 24 * 60 * 60 * 1000;
+const PAGE_SIZE = 5000;
+const PRUNE_BATCH_SIZE = 5000;
+// Widens the lookup of existing rollup rows, so the bounds differ from the stored bucket_start values already in
+// the date and a different stored time format (separator, milliseconds, offset) cannot push a bucket out of range
+const LOOKUP_MARGIN_MS = 24 * 60 * 60 * 1000;
+
+type RollupState = {
+  high_water_mark?: string | null;
+  rows_rolled_up?: number | null;
+  rows_pruned?: number | null;
+};
+
+/**
+ * Rolls sensor_measurements up into hourly and daily min/max/avg per plant.
+ * The high-water mark is the date_created up to which all rows are contained in the rollups, it is written in the
+ * same transaction as the rollup rows. Late measurements from the sensor spool keep their measured_at and are merged
+ * into the (older) bucket they belong to.
+ */
+class SensorMeasurementsRollupJob {
+  private apiContext: ApiContext;
+  private schema: any;
+
+  constructor(apiContext: ApiContext) {
+    this.apiContext = apiContext;
+  }
+
+  private getItemsService(collection: string, knex?: any) {
+    return new this.apiContext.services.ItemsService(collection, {
+      schema: this.schema,
+      knex: knex ?? this.apiContext.database,
+      accountability: null,
+    });
+  }
+
+  async run() {
+    this.schema = await this.apiContext.getSchema();
+    const stateService = this.getItemsService(STATE_COLLECTION);
+    const state: RollupState = (await stateService.readSingleton({ fields: ['*'] })) || {};
+
+    const cutoff = new Date(Math.floor((Date.now() - SAFETY_LAG_MS) / 1000) * 1000);
+    let highWaterMark = state.high_water_mark ? new Date(state.high_water_mark) : await this.getStartBeforeFirstMeasurement();
+    let rowsRolledUp = Number(state.rows_rolled_up ?? 0);
+
+    let rowsThisRun = 0;
+    while (highWaterMark && highWaterMark < cutoff) {
+      const sliceEnd = new Date(Math.min(highWaterMark.getTime() + SLICE_MS, cutoff.getTime()));
+      const rows = await this.rollupSlice(highWaterMark, sliceEnd, rowsRolledUp);
+      rowsRolledUp += rows;
+      rowsThisRun += rows;
+      highWaterMark = sliceEnd;
+    }
+    this.apiContext.logger.info(`${SCHEDULE_NAME}: rolled up ${rowsThisRun} measurements, high-water mark ${highWaterMark ? toDirectusDateTime(highWaterMark) : '-'}`);
+
+    const retentionDays = EnvVariableHelper.getSensorRollupRetentionDays();
+    if (highWaterMark && retentionDays > 0) {
+      const pruned = await this.pruneRolledUpMeasurements(highWaterMark, retentionDays);
+      if (pruned > 0) {
+        await stateService.upsertSingleton({ rows_pruned: Number(state.rows_pruned ?? 0) + pruned }, { emitEvents: false });
+      }
+      this.apiContext.logger.info(`${SCHEDULE_NAME}: pruned ${pruned} measurements older than ${retentionDays} days`);
+    }
+  }
+
+  private async getStartBeforeFirstMeasurement(): Promise<Date | null> {
+    const measurementsService = this.getItemsService(SENSOR_MEASUREMENTS_COLLECTION);
+    const first = await measurementsService.readByQuery({
+      fields: ['date_created'],
+      filter: { date_created: { _nnull: true } },
+      sort: ['date_created'],
+      limit: 1,
+    });
+    if (first.length === 0) {
+      return null;
+    }
+    // The slices select date_created > start, so start one second before the first row
+    return new Date(new Date(first[0].date_created).getTime() - 1000);
+  }
+
+  private async rollupSlice(from: Date, to: Date, rowsRolledUpBefore: number): Promise<number> {
+    const hourly = new SensorMeasurementsRollupAccumulator(startOfHour);
+    const daily = new SensorMeasurementsRollupAccumulator(startOfDay);
+
+    const measurementsService = this.getItemsService(SENSOR_MEASUREMENTS_COLLECTION);
+    let rows = 0;
+    for (let offset = 0; ; offset += PAGE_SIZE) {
+      // Rows with date_created in (from, to] do not change while reading, so offset paging is stable
+      const page: SensorMeasurementRow[] = await measurementsService.readByQuery({
+        fields: ['plant', 'measured_at', 'date_created', 'moisture_percentage', 'voltage_current', 'voltage_min', 'voltage_max'],
+        filter: {
+          _and: [{ date_created: { _gt: toDirectusDateTime(from) } }, { date_created: { _lte: toDirectusDateTime(to) } }],
+        },
+        sort: ['date_created', 'id'],
+        limit: PAGE_SIZE,
+        offset: offset,
+      });
+      for (const row of page) {
+        hourly.add(row);
+        daily.add(row);
+      }
+      rows += page.length;
+      if (page.length < PAGE_SIZE) {
+        break;
+      }
+    }
+
+    await this.apiContext.database.transaction(async trx => {
+      await this.mergeBuckets(HOURLY_COLLECTION, hourly, trx);
+      await this.mergeBuckets(DAILY_COLLECTION, daily, trx);
+      await this.getItemsService(STATE_COLLECTION, trx).upsertSingleton(
+        { high_water_mark: toDirectusDateTime(to), rows_rolled_up: rowsRolledUpBefore + rows },
+        { emitEvents: false }
+      );
+    });
+    return rows;
+  }
+
+  private async mergeBuckets(collection: string, accumulator: SensorMeasurementsRollupAccumulator, trx: any) {
+    if (accumulator.size === 0) {
+      return;
+    }
+    const rollupService = this.getItemsService(collection, trx);
+    const range = accumulator.getBucketRange()!;
+    const plants = accumulator.getPlants();
+    const plantIds = plants.filter((plant): plant is string => plant !== null);
+    const plantFilters: any[] = [{ plant: { _in: plantIds } }];
+    if (plantIds.length < plants.length) {
+      plantFilters.push({ plant: { _null: true } });
+    }
+    // Range instead of exact bucket_start values: mergeInto matches the rows by their parsed bucket_start
+    const from = new Date(range.first.getTime() - LOOKUP_MARGIN_MS);
+    const to = new Date(range.last.getTime() + LOOKUP_MARGIN_MS);
+    const existingRows: SensorMeasurementRollupRow[] = await rollupService.readByQuery({
+      fields: ['*'],
+      filter: {
+        _and: [
+          { _or: plantFilters },
+          { bucket_start: { _gte: from.toISOString() } },
+          { bucket_start: { _lte: to.toISOString() } },
+        ],
+      },
+      limit: -1,
+    });
+    const { create, update } = accumulator.mergeInto(existingRows);
+    if (create.length > 0) {
+      await rollupService.createMany(create, { emitEvents: false });
+    }
+    if (update.length > 0) {
+      await rollupService.updateBatch(update, { emitEvents: false });
+    }
+  }
+
+  private async pruneRolledUpMeasurements(highWaterMark: Date, retentionDays: number): Promise<number> {
+    const threshold = new Date(Date.now() - retentionDays * 24 * 60 * 60 * 1000);
+    const measurementsService = this.getItemsService(SENSOR_MEASUREMENTS_COLLECTION);
+    const query = {
+      filter: {
+        _and: [
+          // Only rows that are already contained in the rollups
+          { date_created: { _lte: toDirectusDateTime(highWaterMark) } },
+          {
+            _or: [
+              { measured_at: { _lt: threshold.toISOString() } },
+              { _and: [{ measured_at: { _null: true } }, { date_created: { _lt: toDirectusDateTime(threshold) } }] },
+            ],
+          },
+        ],
+      },
+      limit: PRUNE_BATCH_SIZE,
+    };
+
+    let pruned = 0;
+    while (true) {
+      const keys = await measurementsService.deleteByQuery(query, { emitEvents: false });
+      pruned += keys.length;
+      if (keys.length < PRUNE_BATCH_SIZE) {
+        return pruned;
+      }
+    }
+  }
+}
+
+export default MyDefineHook.defineHookWithAllTablesExisting(SCHEDULE_NAME, async ({ schedule }, apiContext) => {
+  const cronFrequency = EnvVariableHelper.getSensorRollupCron();
+  let running = false;
+
+  schedule(cronFrequency, async () => {
+    if (running) {
+      apiContext.logger.info(SCHEDULE_NAME + ': previous run still in progress, skipping');
+      return;
+    }
+    const rollupTablesExist = await DatabaseInitializedCheck.checkTablesExist(SCHEDULE_NAME, apiContext, [
+      SENSOR_MEASUREMENTS_COLLECTION,
+      HOURLY_COLLECTION,
+      DAILY_COLLECTION,
+      STATE_COLLECTION,
+    ]);
+    if (!rollupTablesExist) {
+      return;
+    }
+
+    running = true;
+    try {
+      await new SensorMeasurementsRollupJob(apiContext).run();
+    } catch (error) {
+      apiContext.logger.error(SCHEDULE_NAME + ': rollup failed: ' + error);
+    } finally {
+      running = false;
+    }
+  });
+});
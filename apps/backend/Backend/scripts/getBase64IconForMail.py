@@ -2,15 +2,28 @@
 # Therefore we convert the font to a base64 string and include it directly in the html template.
 
 import os
+import sys
 import json
+import time
 import base64
+import hashlib
 import argparse
+from functools import lru_cache
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
 
 # Delimiter to parse icon family and icon name
 IconParseDelimiter = ':'
 
+# Default icon family
+DefaultIconFamily = "MaterialCommunityIcons"
+
+# CSS class of the icons in the sprite output format
+SpriteClassName = "rm-icon"
+
+# Rendered icons are cached on disk, repeated builds of the mail templates do not render them again
+DefaultCacheFile = os.path.join(os.path.expanduser("~"), ".cache", "rocket-meals", "mail-icons.json")
+
 # Function to dynamically load available icon families based on glyphmap filenames
 def load_available_icon_families(glyphmaps_path, fonts_path):
     available_families = {}
@@ -40,19 +53,31 @@ def find_node_modules_directory(max_levels_up=10):
         current_dir = os.path.dirname(current_dir)
     return None
 
-# Function to load the glyph map from the JSON file
+# Function to load the glyph map from the JSON file (once per process and family)
+@lru_cache(maxsize=None)
 def load_glyph_map(glyph_map_path):
     with open(glyph_map_path, "r") as file:
         glyph_map = json.load(file)
     return glyph_map
 
+# Function to load a font (once per process, family and size)
+@lru_cache(maxsize=64)
+def load_font(font_path, size):
+    return ImageFont.truetype(font_path, size)
+
+# Function to hash the font file, part of the disk cache key so updated fonts are rendered again
+@lru_cache(maxsize=None)
+def get_font_hash(font_path):
+    with open(font_path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
 # Function to encode the icon as a Base64 string
 def encode_icon_to_base64(icon_name, glyph_map, font_path, size=64):
     if icon_name not in glyph_map:
         raise ValueError(f"Icon '{icon_name}' not found in the glyph map.")
 
     unicode_code = chr(glyph_map[icon_name])
-    font = ImageFont.truetype(font_path, size)
+    font = load_font(font_path, size)
     image = Image.new("RGBA", (size, size), (255, 255, 255, 0))
     draw = ImageDraw.Draw(image)
 
@@ -75,53 +100,217 @@ def wrap_base64_icon_in_div(base64_icon, icon_name, size):
     '''
     return html
 
-# Main function to generate the icon
-def main(icon_input, node_modules_path, size, output_format):
-    glyphmaps_path = os.path.join(node_modules_path, '@expo/vector-icons/build/vendor/react-native-vector-icons/glyphmaps')
-    fonts_path = os.path.join(node_modules_path, '@expo/vector-icons/build/vendor/react-native-vector-icons/Fonts')
+# Function to pack the icons into one sprite PNG, identical icons share one tile
+# Returns the sprite as data URI, the tile index per icon input and the number of tiles
+def build_icon_sprite(results, size):
+    tiles = {}
+    tile_indexes = {}
+    for icon_input, base64_icon in results:
+        if base64_icon is None:
+            continue
+        png_data = base64.b64decode(base64_icon.split(",", 1)[1])
+        tile_indexes[icon_input] = tiles.setdefault(png_data, len(tiles))
 
-    # Load available icon families dynamically
-    available_families = load_available_icon_families(glyphmaps_path, fonts_path)
+    sprite = Image.new("RGBA", (size * max(len(tiles), 1), size), (255, 255, 255, 0))
+    for png_data, index in tiles.items():
+        with Image.open(BytesIO(png_data)) as tile:
+            sprite.paste(tile, (index * size, 0))
+
+    buffered = BytesIO()
+    sprite.save(buffered, format="PNG", optimize=True)
+    base64_data = base64.b64encode(buffered.getvalue()).decode("utf-8")
+    return f"data:image/png;base64,{base64_data}", tile_indexes, len(tiles)
+
+# Function to create the style block that embeds the sprite once for all icons
+def create_sprite_style(sprite_data_uri, tile_count, size):
+    rules = [
+        f".{SpriteClassName} {{ display: inline-block; width: {size}px; height: {size}px; margin-right: 8px; "
+        f"background-image: url({sprite_data_uri}); background-repeat: no-repeat; }}"
+    ]
+    for index in range(tile_count):
+        rules.append(f".{SpriteClassName}-{index} {{ background-position: -{index * size}px 0; }}")
+    rules_html = "\n        ".join(rules)
+    return f'''
+    <style>
+        {rules_html}
+    </style>
+    '''
+
+# Function to wrap a sprite icon in a div and return the HTML
+def wrap_sprite_icon_in_div(tile_index, icon_name, size):
+    html = f'''
+    <div style="display: flex; align-items: center;">
+        <span class="{SpriteClassName} {SpriteClassName}-{tile_index}" role="img" aria-label="{icon_name}"></span>
+    </div>
+    '''
+    return html
+
+class IconCache:
+    # Data URIs of rendered icons keyed by (family, icon, size, font hash), stored as JSON
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.entries = {}
+        self.changed = False
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, "r") as file:
+                    self.entries = json.load(file)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    @staticmethod
+    def key(icon_family, icon_name, size, font_hash):
+        return f"{icon_family}{IconParseDelimiter}{icon_name}|{size}|{font_hash}"
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, base64_icon):
+        self.entries[key] = base64_icon
+        self.changed = True
 
-    # Default icon family
-    default_icon_family = "MaterialCommunityIcons"
+    def save(self):
+        if not self.cache_file or not self.changed:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+        tmp_path = self.cache_file + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.entries, file, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.cache_file)
 
-    # Parse the input to get the icon family and icon name
+# Function to parse 'IconFamily:iconName', the family defaults to MaterialCommunityIcons
+def parse_icon_input(icon_input):
     if IconParseDelimiter in icon_input:
-        icon_family, icon_name = icon_input.split(IconParseDelimiter, 1)
-    else:
-        icon_family = default_icon_family  # Default family
-        icon_name = icon_input
+        return icon_input.split(IconParseDelimiter, 1)
+    return DefaultIconFamily, icon_input
 
-    if icon_family not in available_families:
-        print(f"Error: Icon family '{icon_family}' not found.")
-        print("Available icon families are:")
-        for family in available_families.keys():
-            print(f" - {family}")
-        return
+# Function to read icon inputs from a file, one per line ('#' starts a comment)
+def read_icon_inputs(input_file):
+    icon_inputs = []
+    with open(input_file, "r") as file:
+        for line in file:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                icon_inputs.append(line)
+    return icon_inputs
 
-    glyph_map_path = available_families[icon_family]['glyph_map']
-    font_path = available_families[icon_family]['font']
+# Function to render many icons in one process, returns a list of (icon_input, base64_icon or None)
+# and the number of icons rendered, taken from the cache and failed
+def render_icons(icon_inputs, available_families, size, cache):
+    results = []
+    counts = {"rendered": 0, "cached": 0, "failed": 0}
+    for icon_input in icon_inputs:
+        icon_family, icon_name = parse_icon_input(icon_input)
+        if icon_family not in available_families:
+            print(f"Error: Icon family '{icon_family}' not found.")
+            print("Available icon families are:")
+            for family in available_families.keys():
+                print(f" - {family}")
+            results.append((icon_input, None))
+            counts["failed"] += 1
+            continue
 
-    # Load the glyph map
-    glyph_map = load_glyph_map(glyph_map_path)
+        glyph_map_path = available_families[icon_family]['glyph_map']
+        font_path = available_families[icon_family]['font']
+        cache_key = IconCache.key(icon_family, icon_name, size, get_font_hash(font_path))
+        base64_icon = cache.get(cache_key)
+        if base64_icon is None:
+            try:
+                base64_icon = encode_icon_to_base64(icon_name, load_glyph_map(glyph_map_path), font_path, size)
+            except ValueError as e:
+                print(f"Error: {e}")
+                results.append((icon_input, None))
+                counts["failed"] += 1
+                continue
+            cache.set(cache_key, base64_icon)
+            counts["rendered"] += 1
+        else:
+            counts["cached"] += 1
+        results.append((icon_input, base64_icon))
+    return results, counts
+
+# Main function to generate the icons
+def main(icon_inputs, node_modules_path, size, output_format, cache_file=DefaultCacheFile):
+    glyphmaps_path = os.path.join(node_modules_path, '@expo/vector-icons/build/vendor/react-native-vector-icons/glyphmaps')
+    fonts_path = os.path.join(node_modules_path, '@expo/vector-icons/build/vendor/react-native-vector-icons/Fonts')
+
+    # Load available icon families dynamically
+    available_families = load_available_icon_families(glyphmaps_path, fonts_path)
+
+    start_time = time.monotonic()
+    cache = IconCache(cache_file)
+    results, counts = render_icons(icon_inputs, available_families, size, cache)
+    cache.save()
 
     # Generate the output
     if output_format == "base64":
-        base64_icon = encode_icon_to_base64(icon_name, glyph_map, font_path, size)
-        wrapped_html = wrap_base64_icon_in_div(base64_icon, icon_name, size)
+        for icon_input, base64_icon in results:
+            if base64_icon is None:
+                continue
+            icon_family, icon_name = parse_icon_input(icon_input)
+            wrapped_html = wrap_base64_icon_in_div(base64_icon, icon_name, size)
+            print(f"HTML for '{icon_input}':\n")
+            print(wrapped_html)
+    elif output_format == "sprite":
+        print_sprite_output(results, size)
+
+    elapsed_ms = (time.monotonic() - start_time) * 1000
+    print(
+        f"{len(results)} icons ({counts['rendered']} rendered, {counts['cached']} from cache, {counts['failed']} failed)"
+        f" in {elapsed_ms:.0f} ms",
+        file=sys.stderr,
+    )
+    return results
+
+# Function to print the sprite style once and the markup per icon, and report the saved bytes
+def print_sprite_output(results, size):
+    sprite_data_uri, tile_indexes, tile_count = build_icon_sprite(results, size)
+    style_html = create_sprite_style(sprite_data_uri, tile_count, size)
+    print("Style for the <head> of the template (embeds the sprite once):\n")
+    print(style_html)
+
+    sprite_bytes = len(style_html.encode("utf-8"))
+    per_icon_bytes = 0
+    occurrences = 0
+    for icon_input, base64_icon in results:
+        if base64_icon is None:
+            continue
+        icon_family, icon_name = parse_icon_input(icon_input)
+        wrapped_html = wrap_sprite_icon_in_div(tile_indexes[icon_input], icon_name, size)
         print(f"HTML for '{icon_input}':\n")
         print(wrapped_html)
+        sprite_bytes += len(wrapped_html.encode("utf-8"))
+        per_icon_bytes += len(wrap_base64_icon_in_div(base64_icon, icon_name, size).encode("utf-8"))
+        occurrences += 1
+
+    summary = (
+        f"Sprite: {tile_count} unique icons for {occurrences} occurrences, "
+        f"{sprite_bytes} bytes instead of {per_icon_bytes} bytes with per icon data URIs "
+    )
+    if sprite_bytes <= per_icon_bytes:
+        summary += f"({per_icon_bytes - sprite_bytes} bytes saved)"
+    else:
+        summary += f"({sprite_bytes - per_icon_bytes} bytes more, the sprite only pays off for several icons)"
+    print(summary, file=sys.stderr)
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Generate Base64 icon from various icon families.")
-    parser.add_argument("icon_input", help="The icon input in the format 'IconFamily:iconName'. Default family is MaterialCommunityIcons.")
+    parser = argparse.ArgumentParser(description="Generate Base64 icons from various icon families.")
+    parser.add_argument("icon_input", nargs="*", help="One or more icons in the format 'IconFamily:iconName'. Default family is MaterialCommunityIcons.")
+    parser.add_argument("--input_file", help="File with one icon input per line, rendered in the same run.", default=None)
     parser.add_argument("--node_modules", help="Path to the node_modules directory.", default=None)
     parser.add_argument("--size", help="Size of the icon (used for both font size and image size).", type=int, default=24)
-    parser.add_argument("--output_format", help="Output format: 'base64' for Base64 image.", choices=["base64"], default="base64")
+    parser.add_argument("--output_format", help="Output format: 'base64' for a Base64 image per icon, 'sprite' for one sprite PNG with markup per icon.", choices=["base64", "sprite"], default="base64")
+    parser.add_argument("--cache_file", help="Disk cache of rendered icons.", default=DefaultCacheFile)
+    parser.add_argument("--no_cache", help="Render every icon, without reading or writing the disk cache.", action="store_true")
 
     args = parser.parse_args()
 
+    icon_inputs = list(args.icon_input)
+    if args.input_file:
+        icon_inputs += read_icon_inputs(args.input_file)
+    if not icon_inputs:
+        parser.error("Please specify at least one icon input or --input_file.")
+
     node_modules_path = args.node_modules
     if not node_modules_path:
         node_modules_path = find_node_modules_directory()
@@ -130,4 +319,4 @@ if __name__ == "__main__":
         print("Error: node_modules directory not found. Please specify it with --node_modules <path>.")
         sys.exit(1)
 
-    main(args.icon_input, node_modules_path, args.size, args.output_format)
+    main(icon_inputs, node_modules_path, args.size, args.output_format, None if args.no_cache else args.cache_file)
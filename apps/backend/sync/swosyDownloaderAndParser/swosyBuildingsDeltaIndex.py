@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+INDEX_VERSION = 1
+DEFAULT_INDEX_FILE_NAME = "swosy_buildings_delta_index.json"
+
+OP_CREATE = "create"
+OP_UPDATE = "update"
+OP_DELETE = "delete"
+
+# Fields of a parsed building that come from swosy; an update only sends these, so fields
+# maintained in Directus (status, sort, translations, ...) are left alone
+SOURCE_FIELDS = ["alias", "external_identifier", "coordinates", "businesshours"]
+
+
+# Function to reduce a parsed building to the fields an update sends
+def source_fields(parsed):
+    data = {field: parsed[field] for field in SOURCE_FIELDS}
+    if parsed.get("image_thumb_hash"):
+        data["image_thumb_hash"] = parsed["image_thumb_hash"]
+    return data
+
+
+# Function to fingerprint the synced fields of a swosy building
+def fingerprint_building(building):
+    fields = {
+        "name": building.get("name"),
+        "short": building.get("short"),
+        "longitude": building.get("longitude"),
+        "latitude": building.get("latitude"),
+    }
+    for day in DAYS:
+        fields[f"opening_time_{day}"] = building.get(f"opening_time_{day}")
+        fields[f"closing_time_{day}"] = building.get(f"closing_time_{day}")
+    canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class BuildingsDeltaIndex:
+    # Fingerprint per building short of the last successful delta run
+    def __init__(self, path):
+        self.path = path
+        self.fingerprints = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                index = json.load(f)
+            if index.get("version") == INDEX_VERSION:
+                self.fingerprints = index.get("buildings", {})
+
+    def iter_changes(self, swosy_data, parse_building):
+        """
+        Yields {"op", "external_identifier", "data"} records for new and changed buildings while
+        streaming swosy_data, then one delete record per building that is gone. The fingerprints
+        of this run are kept in self.next_fingerprints until save() is called.
+        """
+        self.next_fingerprints = {}
+        self.counts = {OP_CREATE: 0, OP_UPDATE: 0, OP_DELETE: 0, "unchanged": 0}
+        for building in swosy_data:
+            short = building.get("short")
+            fingerprint = fingerprint_building(building)
+            self.next_fingerprints[short] = fingerprint
+            previous = self.fingerprints.get(short)
+            if previous == fingerprint:
+                self.counts["unchanged"] += 1
+                continue
+            parsed = parse_building(building)
+            if previous is None:
+                self.counts[OP_CREATE] += 1
+                yield {"op": OP_CREATE, "external_identifier": short, "data": parsed}
+            else:
+                self.counts[OP_UPDATE] += 1
+                yield {"op": OP_UPDATE, "external_identifier": short, "data": source_fields(parsed)}
+
+        for short in self.fingerprints:
+            if short not in self.next_fingerprints:
+                self.counts[OP_DELETE] += 1
+                yield {"op": OP_DELETE, "external_identifier": short}
+
+    def save(self):
+        # Only called after all changes were written, so a failed run is repeated completely
+        self.fingerprints = self.next_fingerprints
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": INDEX_VERSION, "buildings": self.fingerprints}, f, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -1,59 +1,201 @@
+import argparse
 import json
-import sys
+import os
 
-def parse_swosy_to_rocket_meals(swosy_data):
-    rocket_meals_data = []
+from swosyBuildingsDeltaIndex import DAYS, DEFAULT_INDEX_FILE_NAME, OP_CREATE, OP_UPDATE, BuildingsDeltaIndex, source_fields
+from swosyDirectusWriter import DEFAULT_BATCH_SIZE, DirectusBatchWriter
+from swosyImageBuildingDownloader import sanitize_filename
+from swosyImageDerivativePipeline import default_output_path, generate_derivatives
+from swosyJsonStream import iter_json_array, write_json_lines
+
+BUILDINGS_COLLECTION = "buildings"
+BUSINESSHOURS_COLLECTION = "businesshours"
+# Junction collections that link businesshours to buildings and canteens
+BUSINESSHOURS_JUNCTIONS = ["buildings_businesshours", "canteens_foodservice_hours", "canteens_foodservice_hours_during_semester_break"]
+
+# Function to get the thumb hash per building short from the downloaded building images
+def get_building_thumb_hashes(swosy_data, images_path):
+    image_paths = {}
     for building in swosy_data:
-        new_building = {
-            "status": "draft",
-            "sort": None,
-            "user_updated": None,
-            "date_updated": None,
-            "alias": building.get("name"),
-            "external_identifier": building.get("short"),
-            "url": None,
-            "image": None,
-            "image_remote_url": None,
-            "image_thumb_hash": None,
-            "date_of_construction": None,
-            "coordinates": {
-                "coordinates": [
-                    building.get("longitude"),
-                    building.get("latitude")
-                ],
-                "type": "Point"
-            },
-            "apartments": [],
-            "translations": [],
-            "businesshours": []
-        }
-
-        days = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
-
-        for day in days:
-            if building.get(f"opening_time_{day}") and building.get(f"closing_time_{day}"):
+        path = os.path.join(images_path, f"{building['short']}_{sanitize_filename(building['name'])}.jpg")
+        if os.path.exists(path):
+            image_paths[path] = building['short']
+
+    results = generate_derivatives(list(image_paths), default_output_path(images_path))
+    return {image_paths[path]: result["thumb_hash"] for path, result in results.items()}
+
+# Function to parse one swosy building into a rocket meals building
+def parse_building(building, thumb_hashes=None):
+    thumb_hashes = thumb_hashes or {}
+    new_building = {
+        "status": "draft",
+        "sort": None,
+        "user_updated": None,
+        "date_updated": None,
+        "alias": building.get("name"),
+        "external_identifier": building.get("short"),
+        "url": None,
+        "image": None,
+        "image_remote_url": None,
+        "image_thumb_hash": thumb_hashes.get(building.get("short")),
+        "date_of_construction": None,
+        "coordinates": {
+            "coordinates": [
+                building.get("longitude"),
+                building.get("latitude")
+            ],
+            "type": "Point"
+        },
+        "apartments": [],
+        "translations": [],
+        "businesshours": []
+    }
+
+    # Days with the same opening and closing time share one businesshours entry with several weekday flags
+    businesshours_by_time = {}
+    for day in DAYS:
+        time_start = building.get(f"opening_time_{day}")
+        time_end = building.get(f"closing_time_{day}")
+        if time_start and time_end:
+            businesshours_entry = businesshours_by_time.get((time_start, time_end))
+            if businesshours_entry is None:
                 businesshours_entry = {
                     "businesshours_id": {
-                        "time_start": building.get(f"opening_time_{day}"),
-                        "time_end": building.get(f"closing_time_{day}"),
+                        "time_start": time_start,
+                        "time_end": time_end,
                         "date_valid_from": None,
                         "date_valid_till": None
                     }
                 }
-                for d in days:
-                    businesshours_entry["businesshours_id"][d] = (d == day)
-
+                for d in DAYS:
+                    businesshours_entry["businesshours_id"][d] = False
+                businesshours_by_time[(time_start, time_end)] = businesshours_entry
                 new_building["businesshours"].append(businesshours_entry)
+            businesshours_entry["businesshours_id"][day] = True
+
+    return new_building
+
+# Function to parse the buildings one by one, so a streamed export is never held in memory
+def iter_parse_swosy_to_rocket_meals(swosy_data, thumb_hashes=None):
+    for building in swosy_data:
+        yield parse_building(building, thumb_hashes)
+
+def parse_swosy_to_rocket_meals(swosy_data, thumb_hashes=None):
+    return list(iter_parse_swosy_to_rocket_meals(swosy_data, thumb_hashes))
+
+# Function to stream the export into JSON Lines and/or Directus with constant memory
+def main_streaming(file_path, images_path=None, output_file_path=None, directus_url=None, directus_token=None,
+                   batch_size=DEFAULT_BATCH_SIZE, delta_index_path=None):
+    # The export is read twice instead of kept in memory: once for the image paths, once for the buildings
+    thumb_hashes = get_building_thumb_hashes(iter_json_array(file_path), images_path) if images_path else None
 
-        rocket_meals_data.append(new_building)
+    delta_index = None
+    if delta_index_path:
+        # Only created, updated and deleted buildings are emitted, as {"op", "external_identifier", "data"}
+        delta_index = BuildingsDeltaIndex(delta_index_path)
+        records = delta_index.iter_changes(iter_json_array(file_path), lambda building: parse_building(building, thumb_hashes))
+    else:
+        records = iter_parse_swosy_to_rocket_meals(iter_json_array(file_path), thumb_hashes)
+
+    writer = None
+    if directus_url:
+        writer = DirectusBatchWriter(directus_url, directus_token, BUILDINGS_COLLECTION, batch_size=batch_size)
+        records = tee_to_writer(records, writer, delta=delta_index is not None)
+
+    if output_file_path:
+        count = write_json_lines(records, output_file_path)
+        print(f"{count} records have been saved to {output_file_path}")
+    else:
+        for _ in records:
+            pass
+
+    if writer:
+        print(f"Created {writer.written}, updated {writer.updated}, deleted {writer.deleted} buildings in {writer.requests} requests at {directus_url}")
+    if delta_index:
+        delta_index.save()
+        print("Delta: " + ", ".join(f"{op}: {count}" for op, count in delta_index.counts.items()))
+
+# Function to get the ids of the businesshours linked to the given buildings
+def get_businesshours_ids(writer, external_identifiers):
+    buildings = writer.read_where("external_identifier", external_identifiers, ["businesshours.businesshours_id"])
+    return [
+        link["businesshours_id"]
+        for building in buildings
+        for link in building.get("businesshours") or []
+        if link.get("businesshours_id")
+    ]
 
-    return rocket_meals_data
+# Function to delete businesshours that no building or canteen links to anymore. Replacing or deleting a
+# building only removes its junction rows, the businesshours items themselves would be left orphaned
+def delete_unreferenced_businesshours(writer, businesshours_ids):
+    if not businesshours_ids:
+        return
+    referenced = set()
+    for junction in BUSINESSHOURS_JUNCTIONS:
+        links = writer.read_where("businesshours_id", businesshours_ids, ["businesshours_id"], collection=junction)
+        referenced.update(link["businesshours_id"] for link in links)
+    unreferenced = [businesshours_id for businesshours_id in businesshours_ids if businesshours_id not in referenced]
+    writer.delete_where("id", unreferenced, collection=BUSINESSHOURS_COLLECTION)
 
-def main(file_path):
+# Function to update a building; the nested businesshours replace the previous ones, which are deleted afterwards
+def update_building(writer, external_identifier, data):
+    previous_businesshours = get_businesshours_ids(writer, [external_identifier]) if "businesshours" in data else []
+    writer.update_where("external_identifier", external_identifier, data)
+    delete_unreferenced_businesshours(writer, previous_businesshours)
+
+# Function to write created buildings. The delta index may be new or lost while Directus already has the
+# buildings, so creates of existing external_identifiers become updates instead of duplicates
+def create_or_update_buildings(writer, records):
+    if not records:
+        return
+    existing = {
+        building["external_identifier"]
+        for building in writer.read_where(
+            "external_identifier", [record["external_identifier"] for record in records], ["external_identifier"]
+        )
+    }
+    for record in records:
+        if record["external_identifier"] in existing:
+            update_building(writer, record["external_identifier"], source_fields(record["data"]))
+        else:
+            writer.add(record["data"])
+    writer.flush()
+
+# Function to delete buildings together with their then unreferenced businesshours
+def delete_buildings(writer, external_identifiers):
+    if not external_identifiers:
+        return
+    businesshours_ids = get_businesshours_ids(writer, external_identifiers)
+    writer.delete_where("external_identifier", external_identifiers)
+    delete_unreferenced_businesshours(writer, businesshours_ids)
+
+# Function to pass records through while also writing them with a Directus writer
+def tee_to_writer(records, writer, delta=False):
+    created = []
+    deleted = []
+    for record in records:
+        if not delta:
+            writer.add(record)
+        elif record["op"] == OP_CREATE:
+            created.append(record)
+            if len(created) >= writer.batch_size:
+                create_or_update_buildings(writer, created)
+                created = []
+        elif record["op"] == OP_UPDATE:
+            update_building(writer, record["external_identifier"], record["data"])
+        else:
+            deleted.append(record["external_identifier"])
+        yield record
+    create_or_update_buildings(writer, created)
+    writer.flush()
+    delete_buildings(writer, deleted)
+
+def main(file_path, images_path=None):
     with open(file_path, 'r') as f:
         swosy_data = json.load(f)
 
-    rocket_meals_data = parse_swosy_to_rocket_meals(swosy_data)
+    thumb_hashes = get_building_thumb_hashes(swosy_data, images_path) if images_path else None
+    rocket_meals_data = parse_swosy_to_rocket_meals(swosy_data, thumb_hashes)
 
     output_file_path = "swosy_parsed_buildings_json_for_rocket_meals_json.json"
     with open(output_file_path, 'w') as f:
@@ -62,7 +204,27 @@ def main(file_path):
     print(f"Parsed data has been saved to {output_file_path}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python3 script.py path_to_swosy_json")
+    parser = argparse.ArgumentParser(description="Parse a swosy buildings export into rocket meals buildings.")
+    parser.add_argument("swosy_json", help="path to the swosy buildings json")
+    parser.add_argument("images_path", nargs="?", help="downloaded building images, fills image_thumb_hash")
+    parser.add_argument("--jsonl", action="store_true", help="stream the export and write compact JSON Lines")
+    parser.add_argument("--output", help="output file of --jsonl / --delta")
+    parser.add_argument("--directus-url", help="stream the buildings directly into this Directus instance")
+    parser.add_argument("--directus-token", default=os.environ.get("DIRECTUS_TOKEN"), help="defaults to $DIRECTUS_TOKEN")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="buildings per Directus request")
+    parser.add_argument("--delta", action="store_true", help="only emit created, updated and deleted buildings since the last delta run")
+    parser.add_argument("--index", default=DEFAULT_INDEX_FILE_NAME, help="fingerprint index of --delta")
+    args = parser.parse_args()
+
+    if args.jsonl or args.directus_url or args.delta:
+        if args.directus_url and not args.directus_token:
+            parser.error("--directus-url needs --directus-token or DIRECTUS_TOKEN")
+        output_file_path = args.output
+        if not output_file_path and (args.jsonl or not args.directus_url):
+            output_file_path = "swosy_buildings_delta.jsonl" if args.delta else "swosy_parsed_buildings_json_for_rocket_meals_json.jsonl"
+        main_streaming(
+            args.swosy_json, args.images_path, output_file_path, args.directus_url, args.directus_token, args.batch_size,
+            delta_index_path=args.index if args.delta else None,
+        )
     else:
-        main(sys.argv[1])
+        main(args.swosy_json, args.images_path)
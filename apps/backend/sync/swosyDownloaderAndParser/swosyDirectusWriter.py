@@ -0,0 +1,101 @@
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BATCH_SIZE = 100
+
+
+class DirectusBatchWriter:
+    """
+    Creates items in a Directus collection in batches (one POST /items/<collection> per batch).
+    Use it as a context manager so the last incomplete batch is written on exit.
+    Updates and deletes address items by a field (e.g. external_identifier) through Directus' query body.
+    Reads and deletes can also target another collection, e.g. a junction collection.
+    """
+
+    def __init__(self, directus_url, token, collection, batch_size=DEFAULT_BATCH_SIZE, timeout=30, session=None):
+        self.directus_url = directus_url.rstrip('/')
+        self.items_url = self.collection_url(collection)
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.session.mount("http://", HTTPAdapter(max_retries=3))
+        self.session.mount("https://", HTTPAdapter(max_retries=3))
+        self.session.headers["Authorization"] = f"Bearer {token}"
+        self.batch = []
+        self.written = 0
+        self.updated = 0
+        self.deleted = 0
+        self.requests = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        return False
+
+    def add(self, item):
+        self.batch.append(item)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def add_all(self, items):
+        for item in items:
+            self.add(item)
+        return self.written
+
+    def flush(self):
+        if not self.batch:
+            return
+        self.send("POST", self.batch)
+        self.written += len(self.batch)
+        self.batch = []
+
+    def collection_url(self, collection):
+        return f"{self.directus_url}/items/{collection}"
+
+    def read_where(self, field, values, fields, collection=None):
+        # One request per batch_size values, returns the items of all requests
+        url = self.collection_url(collection) if collection else self.items_url
+        values = list(values)
+        items = []
+        for start in range(0, len(values), self.batch_size):
+            params = {
+                "filter": json.dumps({field: {"_in": values[start:start + self.batch_size]}}),
+                "fields": ",".join(fields),
+                "limit": -1,
+            }
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            if not response.ok:
+                raise requests.exceptions.HTTPError(
+                    f"Directus returned {response.status_code} for GET {url}: {response.text}", response=response
+                )
+            self.requests += 1
+            items.extend(response.json()["data"])
+        return items
+
+    def update_where(self, field, value, data):
+        self.send("PATCH", {"query": {"filter": {field: {"_eq": value}}}, "data": data})
+        self.updated += 1
+
+    def delete_where(self, field, values, collection=None):
+        # One request per batch_size values; only deletes in the writer's own collection are counted
+        url = self.collection_url(collection) if collection else self.items_url
+        values = list(values)
+        for start in range(0, len(values), self.batch_size):
+            chunk = values[start:start + self.batch_size]
+            self.send("DELETE", {"query": {"filter": {field: {"_in": chunk}}}}, url)
+            if url == self.items_url:
+                self.deleted += len(chunk)
+
+    def send(self, method, payload, url=None):
+        url = url or self.items_url
+        response = self.session.request(method, url, json=payload, timeout=self.timeout)
+        if not response.ok:
+            raise requests.exceptions.HTTPError(
+                f"Directus returned {response.status_code} for {method} {url}: {response.text}", response=response
+            )
+        self.requests += 1
@@ -1,8 +1,10 @@
+import argparse
 import os
-import requests
-from urllib.parse import urlparse
-from datetime import datetime
 import re
+from urllib.parse import urlparse
+
+from swosyImageContentStore import ImageContentStore, default_store_path
+from swosyImageDownloadEngine import ImageDownloadEngine
 
 # Function to strip trailing slash from URL
 def strip_url(url):
@@ -20,53 +22,32 @@ def create_directory_structure(hostname):
     os.makedirs(images_path, exist_ok=True)
     return images_path
 
-# Function to format time in HH:MM
-def format_time(seconds):
-    hours = seconds // 3600
-    minutes = (seconds % 3600) // 60
-    return f"{int(hours):02}:{int(minutes):02}"
-
 # Function to sanitize filename
 def sanitize_filename(name):
     # Remove special characters
     return re.sub(r'[^a-zA-Z0-9_-]', '', name)
 
 # Function to download building images
-def download_building_images(api_url, images_path):
-    buildings_url = f"{api_url}/buildings/"
-    response = requests.get(buildings_url)
-    response.raise_for_status()
-    buildings = response.json()
-
-    total_buildings = len(buildings)
-    start_time = datetime.now()
-
-    for idx, building in enumerate(buildings, start=1):
-        building_short = building['short']
-        building_name = sanitize_filename(building['name'])
-        photo_url = f"{api_url}/buildings/{building['id']}/photos?resTag=original&webp=false"
-
-        try:
-            photo_response = requests.get(photo_url)
-            photo_response.raise_for_status()
-
-            photo_path = os.path.join(images_path, f"{building_short}_{building_name}.jpg")
-            with open(photo_path, 'wb') as photo_file:
-                photo_file.write(photo_response.content)
-
-            status = "OK"
-        except requests.exceptions.RequestException:
-            status = "Not found"
-
-        elapsed_time = (datetime.now() - start_time).total_seconds()
-        estimated_total_time = (elapsed_time / idx) * total_buildings
-        remaining_time = estimated_total_time - elapsed_time
-
-        print(f"\r{idx}/{total_buildings} - passed time: {format_time(elapsed_time)} / est. finished in: {format_time(remaining_time)} - current building: {building_short} - image download status: {status}", end='')
-
-    print()  # Move to the next line after completing the loop
+def download_building_images(api_url, images_path, max_workers=8, skip_existing=False, store=None):
+    engine = ImageDownloadEngine(max_workers=max_workers, skip_existing=skip_existing, store=store)
+    buildings = engine.get_json(f"{api_url}/buildings/")
+
+    jobs = [
+        (
+            building['short'],
+            f"{api_url}/buildings/{building['id']}/photos?resTag=original&webp=false",
+            f"{building['short']}_{sanitize_filename(building['name'])}.jpg",
+        )
+        for building in buildings
+    ]
+    return engine.download_all(jobs, images_path)
 
 def main():
+    parser = argparse.ArgumentParser(description="Download the swosy building images into the shared image store.")
+    parser.add_argument("--max-workers", type=int, default=8, help="concurrent downloads")
+    parser.add_argument("--skip-existing", action="store_true", help="relink known images without revalidating them")
+    args = parser.parse_args()
+
     # Ask the user to choose an API URL
     print("Please select the API URL:")
     print("1: https://app.stwh.customer.ingenit.com//api")
@@ -84,7 +65,9 @@ def main():
     api_url = strip_url(api_url)
     hostname = get_hostname(api_url)
     images_path = create_directory_structure(hostname)
-    download_building_images(api_url, images_path)
+    # Images from both API hosts share one content-addressed store
+    store = ImageContentStore(default_store_path())
+    download_building_images(api_url, images_path, max_workers=args.max_workers, skip_existing=args.skip_existing, store=store)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+MANIFEST_FILE_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+OBJECTS_DIR_NAME = "objects"
+PARTIAL_DIR_NAME = "partial"
+
+LINK_MODE_HARDLINK = "hardlink"
+LINK_MODE_SYMLINK = "symlink"
+
+
+# Function to get the default store directory shared by all hostnames and image types
+def default_store_path():
+    return os.path.join(os.getcwd(), 'image-store')
+
+
+class ImageContentStore:
+    """
+    Content-addressed image store shared by the meal and building downloaders.
+    - every image body is stored once as objects/<sha256[:2]>/<sha256>, no matter how many URLs or names point to it
+    - the human-readable files ({meal_id}.jpg, {short}_{name}.jpg) are hardlinks (or symlinks) to these objects
+    - manifest.json maps each URL to its sha256 and ETag / Last-Modified, so reruns only revalidate
+      and relink unchanged images instead of downloading them again
+    - ETags are only sent back for their own URL; the same photo under another URL is recognized by its sha256
+      after the download, since an ETag (e.g. nginx's mtime-size) says nothing about other URLs
+    """
+
+    def __init__(self, root, link_mode=LINK_MODE_HARDLINK):
+        self.root = root
+        self.link_mode = link_mode
+        self.manifest_path = os.path.join(root, MANIFEST_FILE_NAME)
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(root, OBJECTS_DIR_NAME), exist_ok=True)
+        os.makedirs(os.path.join(root, PARTIAL_DIR_NAME), exist_ok=True)
+        self.urls = {}
+        self.links = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r") as f:
+                    manifest = json.load(f)
+                if manifest.get("version") == MANIFEST_VERSION:
+                    self.urls = manifest.get("urls", {})
+                    self.links = manifest.get("links", {})
+            except (OSError, ValueError):
+                pass
+
+    def object_path(self, digest):
+        return os.path.join(self.root, OBJECTS_DIR_NAME, digest[:2], digest)
+
+    def has_object(self, digest):
+        return os.path.exists(self.object_path(digest))
+
+    def partial_path(self, url):
+        # One partial download per URL, independent of the names it is linked under
+        return os.path.join(self.root, PARTIAL_DIR_NAME, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".part")
+
+    def get(self, url):
+        with self.lock:
+            return dict(self.urls.get(url, {}))
+
+    def set(self, url, entry):
+        with self.lock:
+            self.urls[url] = entry
+
+    def digest_for(self, path):
+        # sha256 of a linked file name, None if the store does not know it
+        with self.lock:
+            digest = self.links.get(os.path.abspath(path))
+        if digest and os.path.exists(path) and self.has_object(digest) and os.path.samefile(path, self.object_path(digest)):
+            return digest
+        return None
+
+    def add_object(self, file_path, digest):
+        """
+        Moves a completely downloaded file into the store.
+        Returns False if the content was already stored (the file is discarded), True otherwise.
+        """
+        target = self.object_path(digest)
+        with self.lock:
+            if os.path.exists(target):
+                os.remove(file_path)
+                return False
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(file_path, target)
+            return True
+
+    def link(self, digest, path):
+        # Points path at the stored object; replaces an outdated file atomically
+        target = self.object_path(digest)
+        if os.path.exists(path) and os.path.samefile(path, target):
+            with self.lock:
+                self.links[os.path.abspath(path)] = digest
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".link"
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            if self.link_mode == LINK_MODE_SYMLINK:
+                os.symlink(os.path.relpath(target, os.path.dirname(os.path.abspath(path))), tmp_path)
+            else:
+                os.link(target, tmp_path)
+        except OSError:
+            # e.g. store and images on different file systems: fall back to a plain copy
+            shutil.copyfile(target, tmp_path)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.links[os.path.abspath(path)] = digest
+
+    def stats(self):
+        with self.lock:
+            links = dict(self.links)
+        sizes = {}
+        for digest in set(links.values()):
+            if self.has_object(digest):
+                sizes[digest] = os.path.getsize(self.object_path(digest))
+        stored_bytes = sum(sizes.values())
+        linked_bytes = sum(sizes.get(digest, 0) for digest in links.values())
+        return {
+            "objects": len(sizes),
+            "links": len(links),
+            "stored_bytes": stored_bytes,
+            "saved_bytes": linked_bytes - stored_bytes,
+        }
+
+    def save(self):
+        with self.lock:
+            manifest = {"version": MANIFEST_VERSION, "urls": self.urls, "links": self.links}
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f, indent=4, sort_keys=True)
+            os.replace(tmp_path, self.manifest_path)
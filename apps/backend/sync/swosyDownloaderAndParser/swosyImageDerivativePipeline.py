@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional, without it no derivatives and thumb hashes are generated
+    Image = None
+
+from swosyImageDownloadEngine import format_time
+from swosyThumbHash import rgba_to_thumb_hash_base64
+
+INDEX_FILE_NAME = "index.json"
+DEFAULT_WIDTHS = (160, 480, 1024)
+THUMB_HASH_SIZE = 100
+QUALITY = {"webp": 80, "avif": 55}
+
+
+# Function to get the output formats Pillow can write here (AVIF needs a Pillow build with libavif)
+def available_formats():
+    extensions = Image.registered_extensions()
+    return [fmt for fmt in ("webp", "avif") if f".{fmt}" in extensions]
+
+
+# Function to get the default output directory next to the images folder, shared by meals and buildings
+def default_output_path(images_path):
+    return os.path.join(os.path.dirname(os.path.abspath(images_path)), 'derived')
+
+
+# Function to hash a file in chunks
+def file_sha256(path, chunk_size=64 * 1024):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class DerivativeCache:
+    # Results per content hash in <output>/index.json, so unchanged images are never processed again
+    def __init__(self, output_dir, settings):
+        self.output_dir = output_dir
+        self.settings = settings
+        self.path = os.path.join(output_dir, INDEX_FILE_NAME)
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def get(self, digest):
+        entry = self.entries.get(digest)
+        if not entry or entry.get("settings") != self.settings:
+            return None
+        for relative_path in entry["variants"].values():
+            if not os.path.exists(os.path.join(self.output_dir, relative_path)):
+                return None
+        return entry
+
+    def set(self, digest, entry):
+        self.entries[digest] = entry
+
+    def save(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+# Function to create the variants and the thumb hash of one image (runs in a worker process)
+def process_image(source_path, digest, output_dir, widths, formats, settings):
+    with Image.open(source_path) as opened:
+        image = ImageOps.exif_transpose(opened)
+        image.load()
+
+    thumb = image.convert("RGBA")
+    thumb.thumbnail((THUMB_HASH_SIZE, THUMB_HASH_SIZE))
+    thumb_hash = rgba_to_thumb_hash_base64(thumb.width, thumb.height, thumb.tobytes())
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    relative_dir = os.path.join(digest[:2], digest)
+    os.makedirs(os.path.join(output_dir, relative_dir), exist_ok=True)
+    variants = {}
+    # Never upscale: widths above the original collapse into one variant of the original size
+    for width in sorted({min(width, image.width) for width in widths}):
+        resized = image.copy()
+        resized.thumbnail((width, image.height), Image.LANCZOS)
+        for fmt in formats:
+            name = f"w{width}.{fmt}"
+            relative_path = os.path.join(relative_dir, name)
+            resized.save(os.path.join(output_dir, relative_path), format=fmt.upper(), quality=QUALITY[fmt])
+            variants[name] = relative_path
+
+    return {
+        "settings": settings,
+        "width": image.width,
+        "height": image.height,
+        "thumb_hash": thumb_hash,
+        "variants": variants,
+    }
+
+
+# Function to generate variants and thumb hashes for many images, returns a dict path -> result
+def generate_derivatives(image_paths, output_dir, widths=DEFAULT_WIDTHS, max_workers=None, store=None):
+    if Image is None:
+        print("Pillow is not installed (pip install Pillow) - skipping thumbnails and thumb hashes")
+        return {}
+
+    formats = available_formats()
+    settings = f"widths={','.join(str(width) for width in widths)};formats={','.join(formats)}"
+    cache = DerivativeCache(output_dir, settings)
+    results = {}
+    pending = {}  # content hash -> paths, identical images are processed once
+    for path in image_paths:
+        digest = (store.digest_for(path) if store else None) or file_sha256(path)
+        cached = cache.get(digest)
+        if cached:
+            results[path] = cached
+        else:
+            pending.setdefault(digest, []).append(path)
+
+    total = len(pending)
+    print(f"{len(results)} images cached, processing {total} images ({', '.join(formats)})")
+    start_time = time.monotonic()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(process_image, paths[0], digest, output_dir, widths, formats, settings): digest
+            for digest, paths in pending.items()
+        }
+        for idx, future in enumerate(as_completed(futures), start=1):
+            digest = futures[future]
+            try:
+                result = future.result()
+            except (OSError, ValueError) as e:  # PIL.UnidentifiedImageError is an OSError
+                print(f"\nFailed to process {pending[digest][0]}: {e}")
+                continue
+            cache.set(digest, result)
+            for path in pending[digest]:
+                results[path] = result
+            if idx % 50 == 0:
+                cache.save()
+            elapsed_time = time.monotonic() - start_time
+            remaining_time = (elapsed_time / idx) * total - elapsed_time
+            print(
+                f"\r{idx}/{total} - passed time: {format_time(elapsed_time)} / est. finished in: {format_time(remaining_time)}"
+                f" - {idx / elapsed_time if elapsed_time > 0 else 0.0:.1f} images/s   ",
+                end='',
+            )
+
+    cache.save()
+    if total:
+        print()  # Move to the next line after completing the loop
+    return results
+
+
+def main(images_path, output_path=None):
+    output_path = output_path or default_output_path(images_path)
+    image_paths = [
+        os.path.join(images_path, file_name)
+        for file_name in sorted(os.listdir(images_path))
+        if file_name.lower().endswith((".jpg", ".jpeg", ".png"))
+    ]
+    results = generate_derivatives(image_paths, output_path)
+
+    thumb_hashes = {os.path.basename(path): result["thumb_hash"] for path, result in results.items()}
+    output_file_path = os.path.join(output_path, "thumb_hashes.json")
+    with open(output_file_path, 'w') as f:
+        json.dump(thumb_hashes, f, indent=4, sort_keys=True)
+    print(f"Derived images and {output_file_path} have been saved to {output_path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python3 script.py path_to_images [path_to_output]")
+    else:
+        main(*sys.argv[1:])
@@ -0,0 +1,270 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import formatdate
+
+import requests
+from requests.adapters import HTTPAdapter
+
+STATE_FILE_NAME = ".download_state.json"
+PART_SUFFIX = ".part"
+
+STATUS_OK = "OK"
+STATUS_RESUMED = "Resumed"
+STATUS_NOT_MODIFIED = "Not modified"
+STATUS_SKIPPED = "Skipped (exists)"
+STATUS_NOT_FOUND = "Not found"
+STATUS_DEDUPLICATED = "Deduplicated"
+
+
+# Function to format time in HH:MM
+def format_time(seconds):
+    hours = seconds // 3600
+    minutes = (seconds % 3600) // 60
+    return f"{int(hours):02}:{int(minutes):02}"
+
+
+# Function to create a session with a connection pool sized for the workers
+def create_session(max_workers):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class DownloadState:
+    # ETag / Last-Modified per downloaded file, stored next to the images in .download_state.json
+    def __init__(self, directory):
+        self.path = os.path.join(directory, STATE_FILE_NAME)
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def get(self, file_name):
+        with self.lock:
+            return dict(self.entries.get(file_name, {}))
+
+    def set(self, file_name, entry):
+        with self.lock:
+            self.entries[file_name] = entry
+
+    def save(self):
+        with self.lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f, indent=4, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+class ImageDownloadEngine:
+    """
+    Downloads many images concurrently with one pooled session.
+    - bodies are streamed to "<file>.part" in chunks and renamed when complete
+    - an existing ".part" file is resumed with a Range request (If-Range guards against changed files);
+      a failed resume (e.g. 416 for a ".part" that is already complete) drops it and downloads from the start
+    - existing files are revalidated with If-None-Match / If-Modified-Since, or skipped with skip_existing
+    - progress shows images/s and MB/s
+    - with a store (swosyImageContentStore.ImageContentStore) bodies are kept once per sha256 and
+      the file names become links; URLs known from the store manifest are only revalidated and relinked
+    """
+
+    def __init__(self, max_workers=8, timeout=30, chunk_size=64 * 1024, skip_existing=False, session=None, store=None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.skip_existing = skip_existing
+        self.session = session or create_session(max_workers)
+        self.store = store
+        self.lock = threading.Lock()
+        self.bytes_downloaded = 0
+
+    def get_json(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def download_all(self, jobs, directory):
+        """
+        jobs: list of (label, url, file_name) tuples, file_name relative to directory.
+        Returns a dict status -> count.
+        """
+        os.makedirs(directory, exist_ok=True)
+        # With a store the URL manifest replaces the per directory state
+        state = self.store or DownloadState(directory)
+        total = len(jobs)
+        counts = {}
+        self.bytes_downloaded = 0
+        start_time = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.download_one, url, directory, file_name, state): label
+                for label, url, file_name in jobs
+            }
+            for idx, future in enumerate(as_completed(futures), start=1):
+                label = futures[future]
+                status = future.result()
+                counts[status] = counts.get(status, 0) + 1
+                if idx % 50 == 0:
+                    state.save()
+                self.print_progress(idx, total, start_time, label, status)
+
+        state.save()
+        print()  # Move to the next line after completing the loop
+        elapsed_time = time.monotonic() - start_time
+        summary = ", ".join(f"{status}: {count}" for status, count in sorted(counts.items()))
+        print(f"Finished {total} images in {format_time(elapsed_time)} ({self.bytes_downloaded / 1e6:.1f} MB) - {summary}")
+        if self.store:
+            stats = self.store.stats()
+            print(
+                f"Image store: {stats['objects']} images for {stats['links']} files, "
+                f"{stats['stored_bytes'] / 1e6:.1f} MB stored, {stats['saved_bytes'] / 1e6:.1f} MB saved by deduplication"
+            )
+        return counts
+
+    def print_progress(self, idx, total, start_time, label, status):
+        elapsed_time = time.monotonic() - start_time
+        estimated_total_time = (elapsed_time / idx) * total
+        remaining_time = estimated_total_time - elapsed_time
+        with self.lock:
+            megabytes = self.bytes_downloaded / 1e6
+        rate_mb = megabytes / elapsed_time if elapsed_time > 0 else 0.0
+        rate_images = idx / elapsed_time if elapsed_time > 0 else 0.0
+        print(
+            f"\r{idx}/{total} - passed time: {format_time(elapsed_time)} / est. finished in: {format_time(remaining_time)}"
+            f" - {rate_images:.1f} images/s, {rate_mb:.2f} MB/s - current: {label} - image download status: {status}   ",
+            end='',
+        )
+
+    @staticmethod
+    def drop_partial(part_path, state, key, entry):
+        # Forget a ".part" that cannot be resumed, the next request starts without Range
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        entry.pop("partial_validator", None)
+        state.set(key, entry)
+
+    def download_one(self, url, directory, file_name, state):
+        if self.store:
+            return self.download_to_store(url, os.path.join(directory, file_name))
+        path = os.path.join(directory, file_name)
+        part_path = path + PART_SUFFIX
+        entry = state.get(file_name)
+        exists = os.path.exists(path)
+
+        if exists and self.skip_existing:
+            return STATUS_SKIPPED
+
+        headers = {}
+        resume_from = 0
+        if os.path.exists(part_path) and entry.get("partial_validator"):
+            # Continue an interrupted download; If-Range makes the server send the full file if it changed
+            resume_from = os.path.getsize(part_path)
+            headers["Range"] = f"bytes={resume_from}-"
+            headers["If-Range"] = entry["partial_validator"]
+        elif exists:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+            elif not entry.get("etag"):
+                headers["If-Modified-Since"] = formatdate(os.path.getmtime(path), usegmt=True)
+
+        try:
+            with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                if response.status_code == 304:
+                    return STATUS_NOT_MODIFIED
+                if "Range" in headers and not response.ok:
+                    # 416: the ".part" is already complete (crash before the rename) or longer than the file
+                    self.drop_partial(part_path, state, file_name, entry)
+                    if response.status_code == 416:
+                        return self.download_one(url, directory, file_name, state)
+                response.raise_for_status()
+
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                resumed = resume_from > 0 and response.status_code == 206
+                validator = etag or last_modified
+                state.set(file_name, {**entry, "partial_validator": validator})
+
+                with open(part_path, "ab" if resumed else "wb") as photo_file:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        photo_file.write(chunk)
+                        with self.lock:
+                            self.bytes_downloaded += len(chunk)
+        except requests.exceptions.RequestException:
+            return STATUS_NOT_FOUND
+
+        os.replace(part_path, path)
+        state.set(file_name, {"etag": etag, "last_modified": last_modified, "size": os.path.getsize(path)})
+        return STATUS_RESUMED if resumed else STATUS_OK
+
+    def download_to_store(self, url, path):
+        store = self.store
+        part_path = store.partial_path(url)
+        entry = store.get(url)
+        known = entry.get("sha256") and store.has_object(entry["sha256"])
+
+        if known and self.skip_existing:
+            store.link(entry["sha256"], path)
+            return STATUS_SKIPPED
+
+        headers = {}
+        resume_from = 0
+        if os.path.exists(part_path) and entry.get("partial_validator"):
+            resume_from = os.path.getsize(part_path)
+            headers["Range"] = f"bytes={resume_from}-"
+            headers["If-Range"] = entry["partial_validator"]
+        elif known:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                if response.status_code == 304 and known:
+                    store.link(entry["sha256"], path)
+                    return STATUS_NOT_MODIFIED
+                if "Range" in headers and not response.ok:
+                    self.drop_partial(part_path, store, url, entry)
+                    if response.status_code == 416:
+                        return self.download_to_store(url, path)
+                response.raise_for_status()
+
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                resumed = resume_from > 0 and response.status_code == 206
+                store.set(url, {**entry, "partial_validator": etag or last_modified})
+
+                sha256 = hashlib.sha256()
+                if resumed:
+                    with open(part_path, "rb") as part_file:
+                        for chunk in iter(lambda: part_file.read(self.chunk_size), b""):
+                            sha256.update(chunk)
+                with open(part_path, "ab" if resumed else "wb") as photo_file:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        photo_file.write(chunk)
+                        sha256.update(chunk)
+                        with self.lock:
+                            self.bytes_downloaded += len(chunk)
+        except requests.exceptions.RequestException:
+            return STATUS_NOT_FOUND
+
+        digest = sha256.hexdigest()
+        size = os.path.getsize(part_path)
+        is_new = store.add_object(part_path, digest)
+        store.link(digest, path)
+        store.set(url, {"sha256": digest, "etag": etag, "last_modified": last_modified, "size": size})
+        if not is_new:
+            return STATUS_DEDUPLICATED
+        return STATUS_RESUMED if resumed else STATUS_OK
@@ -0,0 +1,91 @@
+import json
+
+try:
+    import ijson
+except ImportError:  # ijson is optional, the built-in fallback streams the array with json.JSONDecoder
+    ijson = None
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\r\n"
+
+
+# Function to iterate over the elements of a top level JSON array without loading the whole file
+def iter_json_array(file_path, chunk_size=CHUNK_SIZE):
+    if ijson is not None:
+        with open(file_path, 'rb') as f:
+            yield from ijson.items(f, 'item', use_float=True)
+    else:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            yield from iter_json_array_fallback(f, chunk_size)
+
+
+# Function to stream a JSON array from a text file, keeping only the current element (plus one chunk) in memory
+def iter_json_array_fallback(f, chunk_size=CHUNK_SIZE):
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in WHITESPACE:
+                position += 1
+            if position < len(buffer):
+                return True
+            if not fill():
+                return False
+
+    if not skip_whitespace() or buffer[position] != '[':
+        raise ValueError("Expected a JSON array")
+    position += 1
+
+    first = True
+    while True:
+        if not skip_whitespace():
+            raise ValueError("Unexpected end of JSON array")
+        if buffer[position] == ']':
+            return
+        if not first:
+            if buffer[position] != ',':
+                raise ValueError(f"Expected ',' between array elements, got {buffer[position]!r}")
+            position += 1
+            if not skip_whitespace():
+                raise ValueError("Unexpected end of JSON array")
+        first = False
+
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The element continues in the next chunk
+                if not fill():
+                    raise
+                continue
+            if end == len(buffer) and not eof and fill():
+                # A number at the end of the buffer might continue in the next chunk
+                continue
+            break
+        position = end
+        yield value
+
+
+# Function to write items as compact JSON Lines, returns the number of written lines
+def write_json_lines(items, output_file_path):
+    count = 0
+    with open(output_file_path, 'w', encoding='utf-8') as f:
+        for item in items:
+            f.write(json.dumps(item, separators=(",", ":"), ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
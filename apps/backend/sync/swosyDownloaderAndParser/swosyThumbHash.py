@@ -0,0 +1,121 @@
+import base64
+import math
+
+# Port of the ThumbHash encoder (https://evanw.github.io/thumbhash/, MIT) without dependencies.
+# The result is the same as rgbaToThumbHash() of the reference implementation, base64 encoded
+# like the image_thumb_hash values in Directus.
+
+MAX_SIZE = 100
+
+
+# Function to round like JavaScript's Math.round (halves are rounded up)
+def js_round(value):
+    return math.floor(value + 0.5)
+
+
+# Function to run the DCT of one channel into its DC and normalized AC terms
+def encode_channel(channel, w, h, nx, ny):
+    dc = 0
+    ac = []
+    scale = 0
+    for cy in range(ny):
+        fy = [math.cos(math.pi / h * cy * (y + 0.5)) for y in range(h)]
+        cx = 0
+        while cx * ny < nx * (ny - cy):
+            # Same summation order as the reference, so the rounding matches bit for bit
+            fx = [math.cos(math.pi / w * cx * (x + 0.5)) for x in range(w)]
+            f = 0
+            for y in range(h):
+                weight = fy[y]
+                offset = y * w
+                for x in range(w):
+                    f += channel[offset + x] * fx[x] * weight
+            f /= w * h
+            if cx or cy:
+                ac.append(f)
+                scale = max(scale, abs(f))
+            else:
+                dc = f
+            cx += 1
+    if scale:
+        ac = [0.5 + 0.5 / scale * f for f in ac]
+    return dc, ac, scale
+
+
+# Function to encode RGBA pixels (w, h <= 100) into a thumb hash
+def rgba_to_thumb_hash(w, h, rgba):
+    if w > MAX_SIZE or h > MAX_SIZE:
+        raise ValueError(f"{w}x{h} doesn't fit in {MAX_SIZE}x{MAX_SIZE}")
+
+    # Determine the average color
+    avg_r = avg_g = avg_b = avg_a = 0
+    for j in range(0, w * h * 4, 4):
+        alpha = rgba[j + 3] / 255
+        avg_r += alpha / 255 * rgba[j]
+        avg_g += alpha / 255 * rgba[j + 1]
+        avg_b += alpha / 255 * rgba[j + 2]
+        avg_a += alpha
+    if avg_a:
+        avg_r /= avg_a
+        avg_g /= avg_a
+        avg_b /= avg_a
+
+    has_alpha = avg_a < w * h
+    l_limit = 5 if has_alpha else 7  # Use fewer luminance bits if there's alpha
+    lx = max(1, js_round(l_limit * w / max(w, h)))
+    ly = max(1, js_round(l_limit * h / max(w, h)))
+
+    # Convert the image from RGBA to LPQA (composite atop the average color)
+    l, p, q, a = [], [], [], []
+    for j in range(0, w * h * 4, 4):
+        alpha = rgba[j + 3] / 255
+        r = avg_r * (1 - alpha) + alpha / 255 * rgba[j]
+        g = avg_g * (1 - alpha) + alpha / 255 * rgba[j + 1]
+        b = avg_b * (1 - alpha) + alpha / 255 * rgba[j + 2]
+        l.append((r + g + b) / 3)
+        p.append((r + g) / 2 - b)
+        q.append(r - g)
+        a.append(alpha)
+
+    l_dc, l_ac, l_scale = encode_channel(l, w, h, max(3, lx), max(3, ly))
+    p_dc, p_ac, p_scale = encode_channel(p, w, h, 3, 3)
+    q_dc, q_ac, q_scale = encode_channel(q, w, h, 3, 3)
+    if has_alpha:
+        a_dc, a_ac, a_scale = encode_channel(a, w, h, 5, 5)
+
+    # Write the constants
+    is_landscape = w > h
+    header24 = (
+        js_round(63 * l_dc)
+        | (js_round(31.5 + 31.5 * p_dc) << 6)
+        | (js_round(31.5 + 31.5 * q_dc) << 12)
+        | (js_round(31 * l_scale) << 18)
+        | (int(has_alpha) << 23)
+    )
+    header16 = (
+        (ly if is_landscape else lx)
+        | (js_round(63 * p_scale) << 3)
+        | (js_round(63 * q_scale) << 9)
+        | (int(is_landscape) << 15)
+    )
+    thumb_hash = [header24 & 255, (header24 >> 8) & 255, header24 >> 16, header16 & 255, header16 >> 8]
+    ac_start = 6 if has_alpha else 5
+    if has_alpha:
+        thumb_hash.append(js_round(15 * a_dc) | (js_round(15 * a_scale) << 4))
+
+    # Write the varying factors
+    channels = [l_ac, p_ac, q_ac, a_ac] if has_alpha else [l_ac, p_ac, q_ac]
+    ac_index = 0
+    for ac in channels:
+        for f in ac:
+            index = ac_start + (ac_index >> 1)
+            if index == len(thumb_hash):
+                thumb_hash.append(0)
+            thumb_hash[index] |= js_round(15 * f) << ((ac_index & 1) << 2)
+            ac_index += 1
+    return bytes(thumb_hash)
+
+
+# Function to encode RGBA pixels into the base64 string stored in image_thumb_hash
+def rgba_to_thumb_hash_base64(w, h, rgba):
+    return base64.b64encode(rgba_to_thumb_hash(w, h, rgba)).decode("ascii")
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""Erfassung mehrerer Feuchtigkeitssensoren an einem oder mehreren ADS1115 in einem Prozess.
+
+Die Kanäle werden über ``SENSOR_CHANNELS`` als JSON-Liste konfiguriert, z.B.::
+
+    [
+        {"address": "0x48", "channel": 0, "plant": "<plant-uuid>", "v_dry": 2.80, "v_wet": 1.20},
+        {"address": "0x48", "channel": 1, "plant": "<plant-uuid>"},
+        {"address": "0x49", "channel": 0, "plant": "<plant-uuid>", "v_dry": 2.75, "v_wet": 1.10}
+    ]
+
+Fehlende Kalibrierwerte fallen auf ``SENSOR_VOLTAGE_DRY``/``SENSOR_VOLTAGE_WET`` zurück.
+Alle ADS1115 teilen sich einen I²C-Bus.
+
+Im Modus ``continuous`` wandelt der ADS1115 fortlaufend mit der eingestellten Datenrate;
+pro Tick wird je Kanal ein Burst von Rohwerten gelesen und gesammelt in Spannungen
+umgerechnet. Mehr Messungen pro Fenster glätten das Rauschen ohne längere Fenster.
+
+Die Umrechnung Spannung -> Feuchtigkeit läuft je Kanal über eine kompilierte Kurve aus
+``calibration.py`` (eigene Kalibrierung oder linear aus ``v_dry``/``v_wet``) und rechnet
+alle Werte eines Ticks in einem NumPy-Aufruf um.
+
+Woher die Spannungen kommen, entscheidet eine ``SampleSource``: die ADS1115 (``AdsSampleSource``),
+Zufallswerte im Debug-Modus (``DebugSampleSource``) oder aufgezeichnete Messreihen
+(``replay_source.ReplaySampleSource``).
+"""
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from calibration import CalibrationCurve, CompiledCurve, compile_curve, linear_curve
+
+DEFAULT_ADS_ADDRESS = 0x48
+ADS_CHANNELS = (0, 1, 2, 3)
+ADC_MODE_SINGLE = "single"
+ADC_MODE_CONTINUOUS = "continuous"
+ADS1115_DATA_RATES = (8, 16, 32, 64, 128, 250, 475, 860)
+# Messbereich (Volt) je Verstärkung, entspricht der Umrechnung in adafruit_ads1x15.
+ADS_PGA_RANGE = {2 / 3: 6.144, 1: 4.096, 2: 2.048, 4: 1.024, 8: 0.512, 16: 0.256}
+
+
+@dataclass(frozen=True)
+class ChannelConfig:
+    address: int
+    channel: int
+    v_dry: float
+    v_wet: float
+    plant: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.address:#04x}/{self.channel}"
+
+
+def moisture_percent(voltage: float, v_dry: float, v_wet: float) -> float:
+    value = (v_dry - voltage) / (v_dry - v_wet) * 100
+    return max(0.0, min(100.0, value))
+
+
+def read_voltage_debug(v_dry: float, v_wet: float) -> float:
+    return random.uniform(min(v_dry, v_wet), max(v_dry, v_wet))
+
+
+def read_sample_debug(v_dry: float, v_wet: float) -> Tuple[float, float]:
+    voltage = read_voltage_debug(v_dry, v_wet)
+    moisture = moisture_percent(voltage, v_dry, v_wet)
+    return voltage, moisture
+
+
+def raw_to_voltages(raw_values: Sequence[int], gain: float) -> np.ndarray:
+    """Rechnet 16-Bit-Rohwerte (``AnalogIn.value``) gesammelt in Volt um."""
+    return np.asarray(raw_values, dtype=np.float64) * (ADS_PGA_RANGE[gain] / 32767)
+
+
+def _parse_address(value) -> int:
+    if isinstance(value, str):
+        return int(value, 0)
+    return int(value)
+
+
+def parse_channel_configs(
+    raw: Optional[str], default_v_dry: float, default_v_wet: float, default_plant: Optional[str] = None
+) -> List[ChannelConfig]:
+    """Liest die Kanal-Konfiguration. Ohne ``raw`` wird nur Kanal 0 an 0x48 gemessen."""
+    if not raw or not raw.strip():
+        return [ChannelConfig(DEFAULT_ADS_ADDRESS, 0, default_v_dry, default_v_wet, default_plant)]
+
+    entries = json.loads(raw)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("SENSOR_CHANNELS must be a non-empty JSON list.")
+
+    configs: List[ChannelConfig] = []
+    for entry in entries:
+        config = ChannelConfig(
+            address=_parse_address(entry.get("address", DEFAULT_ADS_ADDRESS)),
+            channel=int(entry.get("channel", 0)),
+            v_dry=float(entry.get("v_dry", default_v_dry)),
+            v_wet=float(entry.get("v_wet", default_v_wet)),
+            plant=entry.get("plant") or None,
+        )
+        if config.channel not in ADS_CHANNELS:
+            raise ValueError(f"Invalid ADS1115 channel {config.channel} in SENSOR_CHANNELS.")
+        if config.v_dry == config.v_wet:
+            raise ValueError(f"v_dry and v_wet must differ for channel {config.key}.")
+        configs.append(config)
+
+    keys = [config.key for config in configs]
+    if len(set(keys)) != len(keys):
+        raise ValueError("SENSOR_CHANNELS contains the same address/channel more than once.")
+    return configs
+
+
+class SampleSource:
+    """Liefert je Tick die Spannungen eines Kanals (eine oder, im Burst-Modus, mehrere)."""
+
+    name = "source"
+
+    def read_voltages(self, config: ChannelConfig) -> np.ndarray:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class DebugSampleSource(SampleSource):
+    """Zufällige Spannungen zwischen ``v_dry`` und ``v_wet``."""
+
+    name = "debug"
+
+    def __init__(self, burst_samples: int = 1) -> None:
+        self.burst_samples = burst_samples
+
+    def read_voltages(self, config: ChannelConfig) -> np.ndarray:
+        return np.array([read_voltage_debug(config.v_dry, config.v_wet) for _ in range(self.burst_samples)])
+
+
+class AdsSampleSource(SampleSource):
+    """Liest die Kanäle über einen gemeinsamen I²C-Bus von einem oder mehreren ADS1115."""
+
+    name = "ads1115"
+
+    def __init__(
+        self,
+        configs: List[ChannelConfig],
+        gain: int,
+        mode: str,
+        data_rate: Optional[int],
+        burst_samples: int,
+    ) -> None:
+        self.configs = configs
+        self.gain = gain
+        self.mode = mode
+        self.data_rate = data_rate
+        self.burst_samples = burst_samples
+        self.ads_by_address: Dict[int, object] = {}
+        self._inputs: Dict[str, object] = {}
+        self._open_hardware()
+
+    def _open_hardware(self) -> None:
+        import board
+        import busio
+        import adafruit_ads1x15.ads1115 as ADS
+        from adafruit_ads1x15.ads1x15 import Mode
+        from adafruit_ads1x15.analog_in import AnalogIn
+
+        i2c = busio.I2C(board.SCL, board.SDA)
+        for config in self.configs:
+            ads = self.ads_by_address.get(config.address)
+            if ads is None:
+                ads = ADS.ADS1115(i2c, address=config.address)
+                ads.gain = self.gain
+                if self.data_rate is not None:
+                    ads.data_rate = self.data_rate
+                if self.mode == ADC_MODE_CONTINUOUS:
+                    ads.mode = Mode.CONTINUOUS
+                self.ads_by_address[config.address] = ads
+            self._inputs[config.key] = AnalogIn(ads, config.channel)
+
+    def _read_burst(self, config: ChannelConfig) -> np.ndarray:
+        """Liest ``burst_samples`` Rohwerte im Abstand einer Wandlung und rechnet sie gesammelt um."""
+        analog_in = self._inputs[config.key]
+        conversion_seconds = 1 / self.data_rate
+        raw_values = []
+        for index in range(self.burst_samples):
+            if index:
+                # Schneller gelesen würde nur dieselbe Wandlung mehrfach liefern.
+                time.sleep(conversion_seconds)
+            raw_values.append(analog_in.value)
+        return raw_to_voltages(raw_values, self.gain)
+
+    def read_voltages(self, config: ChannelConfig) -> np.ndarray:
+        if self.mode == ADC_MODE_CONTINUOUS:
+            return self._read_burst(config)
+        return np.array([self._inputs[config.key].voltage])
+
+
+class AcquisitionEngine:
+    """Liest alle konfigurierten Kanäle nacheinander aus einer ``SampleSource`` und rechnet sie um."""
+
+    def __init__(
+        self,
+        configs: List[ChannelConfig],
+        debug: bool = False,
+        gain: int = 1,
+        mode: str = ADC_MODE_SINGLE,
+        data_rate: Optional[int] = None,
+        burst_samples: int = 1,
+        calibrations: Optional[Dict[str, CalibrationCurve]] = None,
+        temperature: Optional[float] = None,
+        source: Optional[SampleSource] = None,
+    ) -> None:
+        if mode not in (ADC_MODE_SINGLE, ADC_MODE_CONTINUOUS):
+            raise ValueError(f"Unknown ADC mode '{mode}'.")
+        if mode == ADC_MODE_CONTINUOUS and data_rate is None:
+            data_rate = ADS1115_DATA_RATES[-1]
+        if data_rate is not None and data_rate not in ADS1115_DATA_RATES:
+            raise ValueError(f"ADS1115 data rate must be one of {ADS1115_DATA_RATES}.")
+        self.configs = configs
+        self.debug = debug
+        self.gain = gain
+        self.mode = mode
+        self.data_rate = data_rate
+        self.burst_samples = max(1, burst_samples) if mode == ADC_MODE_CONTINUOUS else 1
+        self.temperature = temperature
+        calibrations = calibrations or {}
+        self.calibrated_keys = [config.key for config in configs if config.key in calibrations]
+        self._curves: Dict[str, CompiledCurve] = {
+            config.key: compile_curve(calibrations.get(config.key) or linear_curve(config.v_dry, config.v_wet))
+            for config in configs
+        }
+        # Für die erreichte Abtastrate seit dem letzten take_rate_stats()
+        self._samples = 0
+        self._busy_seconds = 0.0
+        self._rate_since = time.monotonic()
+        if source is None:
+            if debug:
+                source = DebugSampleSource(self.burst_samples)
+            else:
+                source = AdsSampleSource(configs, gain, mode, data_rate, self.burst_samples)
+        self.source = source
+
+    def read_all(self) -> List[Tuple[ChannelConfig, float, float]]:
+        """Liefert (Kanal, Spannung, Feuchtigkeit) je Messung; im Burst-Modus mehrere pro Kanal."""
+        started = time.monotonic()
+        readings = []
+        for config in self.configs:
+            voltages = self.source.read_voltages(config)
+            moistures = self._curves[config.key](voltages, self.temperature)
+            for voltage, moisture in zip(voltages.tolist(), moistures.tolist()):
+                readings.append((config, voltage, moisture))
+        self._busy_seconds += time.monotonic() - started
+        self._samples += len(readings)
+        return readings
+
+    def take_rate_stats(self) -> Dict[str, float]:
+        """Erreichte Messungen pro Sekunde (gesamt und während der Lesevorgänge) seit dem letzten Aufruf."""
+        now = time.monotonic()
+        elapsed = now - self._rate_since
+        stats = {
+            "samples": self._samples,
+            "samples_per_second": self._samples / elapsed if elapsed > 0 else 0.0,
+            "burst_samples_per_second": self._samples / self._busy_seconds if self._busy_seconds > 0 else 0.0,
+        }
+        self._samples = 0
+        self._busy_seconds = 0.0
+        self._rate_since = now
+        return stats
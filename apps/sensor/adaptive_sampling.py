@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Adaptive Abtastrate anhand der Feuchtigkeitsänderung.
+
+Pro Tick wird die Änderungsrate der (geglätteten) Feuchtigkeit in Prozentpunkten pro Minute
+bestimmt, gemessen gegen den Wert von vor mindestens ``rate_horizon_seconds``. So verstärkt ein kurzes
+Intervall das Rauschen einzelner Messungen nicht zu einer scheinbar schnellen Änderung. Überschreitet
+sie bei einem Kanal ``rate_threshold``, wird sofort mit ``min_interval`` abgetastet und für
+``hold_seconds`` das kurze Fenster ``active_window_seconds`` genutzt. Bleiben die Werte ruhig,
+verdoppelt sich das Intervall (``backoff_factor``) pro Tick bis ``max_interval``.
+"""
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Optional, Tuple
+
+
+class AdaptiveSampler:
+    def __init__(
+        self,
+        min_interval: float,
+        max_interval: float,
+        rate_threshold: float,
+        window_seconds: float,
+        active_window_seconds: float,
+        hold_seconds: float,
+        backoff_factor: float = 2.0,
+        smoothing: float = 0.5,
+        rate_horizon_seconds: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("Expected 0 < min_interval <= max_interval.")
+        if backoff_factor <= 1:
+            raise ValueError("backoff_factor must be greater than 1.")
+        if not 0 < smoothing <= 1:
+            raise ValueError("smoothing must be in (0, 1].")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.rate_threshold = rate_threshold
+        self.calm_window_seconds = window_seconds
+        self.active_window_seconds = min(active_window_seconds, window_seconds)
+        self.hold_seconds = hold_seconds
+        self.backoff_factor = backoff_factor
+        self.smoothing = smoothing
+        self.rate_horizon_seconds = rate_horizon_seconds
+        self.clock = clock
+
+        self.interval_seconds = min_interval
+        self._active_until: Optional[float] = None
+        # Geglättete Feuchtigkeit je Kanal als (Zeitpunkt, Wert), ältester Eintrag ist der Bezugswert
+        self._history: Dict[str, Deque[Tuple[float, float]]] = {}
+        self.last_rate = 0.0
+        # Zähler seit dem letzten Aufruf von take_stats()
+        self._ticks_active = 0
+        self._ticks_calm = 0
+        self._max_rate = 0.0
+
+    @property
+    def active(self) -> bool:
+        return self._active_until is not None and self.clock() < self._active_until
+
+    @property
+    def window_seconds(self) -> float:
+        return self.active_window_seconds if self.active else self.calm_window_seconds
+
+    def update(self, readings: Iterable[Tuple[str, float]]) -> float:
+        """Verbucht die Feuchtigkeit ``(kanal, moisture)`` eines Ticks und gibt das nächste Intervall zurück."""
+        now = self.clock()
+        # Im Burst-Modus liefert ein Tick mehrere Werte je Kanal, verglichen wird ihr Mittelwert
+        sums: Dict[str, Tuple[float, int]] = {}
+        for key, moisture in readings:
+            total, count = sums.get(key, (0.0, 0))
+            sums[key] = (total + moisture, count + 1)
+
+        rate = 0.0
+        for key, (total, count) in sums.items():
+            moisture = total / count
+            history = self._history.setdefault(key, deque())
+            if not history:
+                history.append((now, moisture))
+                continue
+            smoothed = history[-1][1] + self.smoothing * (moisture - history[-1][1])
+            history.append((now, smoothed))
+            # Bezugswert: der jüngste Eintrag, der mindestens rate_horizon_seconds alt ist
+            while len(history) > 2 and now - history[1][0] >= self.rate_horizon_seconds:
+                history.popleft()
+            reference_at, reference = history[0]
+            # Solange noch kein so alter Wert vorliegt, zählt trotzdem der volle Horizont
+            rate = max(rate, abs(smoothed - reference) / max(now - reference_at, self.rate_horizon_seconds) * 60)
+
+        self.last_rate = rate
+        self._max_rate = max(self._max_rate, rate)
+        if rate >= self.rate_threshold:
+            self._active_until = now + self.hold_seconds
+            self.interval_seconds = self.min_interval
+        elif not self.active:
+            self.interval_seconds = min(self.interval_seconds * self.backoff_factor, self.max_interval)
+
+        if self.active:
+            self._ticks_active += 1
+        else:
+            self._ticks_calm += 1
+        return self.interval_seconds
+
+    def take_stats(self) -> Dict[str, float]:
+        """Liefert aktive/ruhige Ticks und die höchste Änderungsrate seit dem letzten Aufruf und setzt sie zurück."""
+        stats = {
+            "ticks_active": self._ticks_active,
+            "ticks_calm": self._ticks_calm,
+            "max_rate_per_minute": self._max_rate,
+            "interval_seconds": self.interval_seconds,
+            "window_seconds": self.window_seconds,
+        }
+        self._ticks_active = 0
+        self._ticks_calm = 0
+        self._max_rate = 0.0
+        return stats
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""Kalibrierkurven je Sensor, vektorisiert mit NumPy.
+
+Statt einer linearen Interpolation zwischen ``V_DRY`` und ``V_WET`` kann jeder Kanal eine
+eigene Kurve bekommen. Die Tabelle liegt als JSON in ``SENSOR_CALIBRATION_PATH``::
+
+    {
+        "0x48/0": {"kind": "piecewise", "points": [[1.20, 100], [1.65, 70], [2.30, 25], [2.80, 0]]},
+        "0x48/1": {"kind": "polynomial", "coefficients": [-12.1, 8.4, 118.0], "voltage_range": [1.1, 2.9],
+                   "temperature_coefficient": -0.0021, "reference_temperature": 20.0}
+    }
+
+``piecewise`` interpoliert linear zwischen Stützpunkten (Spannung, Feuchtigkeit %),
+``polynomial`` wertet ein Polynom der Spannung aus (Koeffizienten höchste Potenz zuerst).
+Der Temperaturterm korrigiert die Spannung vorab um ``temperature_coefficient`` Volt pro
+Grad Abweichung von ``reference_temperature``. Kanäle ohne Eintrag nutzen die lineare
+Kurve aus ``v_dry``/``v_wet``. Kurven werden einmal kompiliert und gecacht und rechnen
+ganze Arrays (Burst, Backfill) in einem Aufruf um.
+
+Kurven aus Referenzläufen anpassen (CSV mit Spalte ``voltage``, optional ``temperature``,
+z.B. die Ausgabe von ``timeseries_store.py``)::
+
+    python calibration.py fit 0x48/0 --reference 0:dry.csv --reference 100:wet.csv --reference 45:half.csv
+    python calibration.py show
+    python calibration.py recompute /app/history 0x48/0 > backfill.csv
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+CALIBRATION_PATH = os.getenv(
+    "SENSOR_CALIBRATION_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibration", "calibration.json"),
+)
+KIND_PIECEWISE = "piecewise"
+KIND_POLYNOMIAL = "polynomial"
+
+Temperature = Union[None, float, np.ndarray]
+CompiledCurve = Callable[[np.ndarray, Temperature], np.ndarray]
+
+
+@dataclass(frozen=True)
+class CalibrationCurve:
+    kind: str
+    # piecewise: ((Spannung, Feuchtigkeit), ...) aufsteigend nach Spannung
+    points: Tuple[Tuple[float, float], ...] = ()
+    # polynomial: Koeffizienten, höchste Potenz zuerst
+    coefficients: Tuple[float, ...] = ()
+    voltage_range: Optional[Tuple[float, float]] = None
+    temperature_coefficient: float = 0.0
+    reference_temperature: float = 20.0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CalibrationCurve":
+        kind = data.get("kind", KIND_PIECEWISE)
+        temperature = {
+            "temperature_coefficient": float(data.get("temperature_coefficient", 0.0)),
+            "reference_temperature": float(data.get("reference_temperature", 20.0)),
+        }
+        if kind == KIND_PIECEWISE:
+            points = tuple(sorted((float(voltage), float(moisture)) for voltage, moisture in data["points"]))
+            if len(points) < 2:
+                raise ValueError("A piecewise calibration needs at least two points.")
+            if len({voltage for voltage, _ in points}) != len(points):
+                raise ValueError("Piecewise calibration points must have distinct voltages.")
+            return cls(kind, points=points, **temperature)
+        if kind == KIND_POLYNOMIAL:
+            coefficients = tuple(float(value) for value in data["coefficients"])
+            if not coefficients:
+                raise ValueError("A polynomial calibration needs coefficients.")
+            voltage_range = data.get("voltage_range")
+            return cls(
+                kind,
+                coefficients=coefficients,
+                voltage_range=(float(voltage_range[0]), float(voltage_range[1])) if voltage_range else None,
+                **temperature,
+            )
+        raise ValueError(f"Unknown calibration kind '{kind}'.")
+
+    def to_dict(self) -> dict:
+        data: dict = {"kind": self.kind}
+        if self.kind == KIND_PIECEWISE:
+            data["points"] = [list(point) for point in self.points]
+        else:
+            data["coefficients"] = list(self.coefficients)
+            if self.voltage_range:
+                data["voltage_range"] = list(self.voltage_range)
+        if self.temperature_coefficient:
+            data["temperature_coefficient"] = self.temperature_coefficient
+            data["reference_temperature"] = self.reference_temperature
+        return data
+
+
+def linear_curve(v_dry: float, v_wet: float) -> CalibrationCurve:
+    """Entspricht ``moisture_percent``: 0 % bei ``v_dry``, 100 % bei ``v_wet``, dazwischen linear."""
+    return CalibrationCurve(KIND_PIECEWISE, points=tuple(sorted(((v_dry, 0.0), (v_wet, 100.0)))))
+
+
+@lru_cache(maxsize=None)
+def compile_curve(curve: CalibrationCurve) -> CompiledCurve:
+    """Baut einmal je Kurve eine Funktion Spannungen -> Feuchtigkeit (%) für ganze Arrays."""
+    if curve.kind == KIND_PIECEWISE:
+        xs = np.array([voltage for voltage, _ in curve.points])
+        ys = np.array([moisture for _, moisture in curve.points])
+
+        def evaluate(voltages: np.ndarray) -> np.ndarray:
+            # np.interp hält die Randwerte außerhalb der Stützpunkte.
+            return np.interp(voltages, xs, ys)
+
+    else:
+        coefficients = np.array(curve.coefficients)
+        low, high = curve.voltage_range or (-np.inf, np.inf)
+
+        def evaluate(voltages: np.ndarray) -> np.ndarray:
+            return np.polyval(coefficients, np.clip(voltages, low, high))
+
+    coefficient = curve.temperature_coefficient
+    reference = curve.reference_temperature
+
+    def apply(voltages: np.ndarray, temperature: Temperature = None) -> np.ndarray:
+        voltages = np.asarray(voltages, dtype=np.float64)
+        if coefficient and temperature is not None:
+            voltages = voltages - coefficient * (np.asarray(temperature, dtype=np.float64) - reference)
+        return np.clip(evaluate(voltages), 0.0, 100.0)
+
+    return apply
+
+
+def load_calibrations(path: str = CALIBRATION_PATH) -> Dict[str, CalibrationCurve]:
+    """Liest die Kalibriertabelle; ohne Datei gibt es keine Kurven je Kanal."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        data = json.load(file)
+    return {key: CalibrationCurve.from_dict(entry) for key, entry in data.items()}
+
+
+def save_calibrations(curves: Dict[str, CalibrationCurve], path: str = CALIBRATION_PATH) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({key: curve.to_dict() for key, curve in sorted(curves.items())}, file, indent=4)
+        file.write("\n")
+
+
+def fit_curve(
+    references: Sequence[Tuple[float, np.ndarray, Optional[np.ndarray]]], kind: str, degree: int = 2
+) -> CalibrationCurve:
+    """Passt eine Kurve an Referenzläufe (Feuchtigkeit %, Spannungen, Temperaturen oder None) an."""
+    if len(references) < 2:
+        raise ValueError("At least two reference runs (e.g. dry and wet) are needed.")
+
+    # Temperaturkoeffizient: mittlere Steigung Spannung/Temperatur innerhalb der Läufe.
+    slopes, temperatures = [], []
+    for _, voltages, run_temperatures in references:
+        if run_temperatures is not None and len(run_temperatures) > 1 and np.ptp(run_temperatures) > 0:
+            slopes.append(np.polyfit(run_temperatures, voltages, 1)[0])
+            temperatures.append(run_temperatures)
+    temperature_coefficient = float(np.mean(slopes)) if slopes else 0.0
+    reference_temperature = float(np.mean(np.concatenate(temperatures))) if temperatures else 20.0
+
+    def compensated(voltages: np.ndarray, run_temperatures: Optional[np.ndarray]) -> np.ndarray:
+        if temperature_coefficient and run_temperatures is not None:
+            return voltages - temperature_coefficient * (run_temperatures - reference_temperature)
+        return voltages
+
+    temperature = {
+        "temperature_coefficient": round(temperature_coefficient, 6),
+        "reference_temperature": round(reference_temperature, 2),
+    }
+    if kind == KIND_PIECEWISE:
+        points = tuple(
+            sorted(
+                (round(float(np.median(compensated(voltages, run_temperatures))), 4), float(moisture))
+                for moisture, voltages, run_temperatures in references
+            )
+        )
+        # Gleiche (gerundete) Spannung für verschiedene Feuchtigkeiten würde from_dict beim Start ablehnen.
+        voltages_seen: Dict[float, float] = {}
+        for voltage, moisture in points:
+            if voltage in voltages_seen:
+                raise ValueError(
+                    f"The reference runs for {voltages_seen[voltage]:g} % and {moisture:g} % both have a median "
+                    f"voltage of {voltage} V; a piecewise calibration needs distinct voltages."
+                )
+            voltages_seen[voltage] = moisture
+        return CalibrationCurve(KIND_PIECEWISE, points=points, **temperature)
+    if kind == KIND_POLYNOMIAL:
+        if len(references) <= degree:
+            raise ValueError(f"A degree {degree} polynomial needs at least {degree + 1} reference runs.")
+        voltages = np.concatenate([compensated(v, t) for _, v, t in references])
+        targets = np.concatenate([np.full(len(v), moisture) for moisture, v, _ in references])
+        coefficients = tuple(round(float(value), 6) for value in np.polyfit(voltages, targets, degree))
+        voltage_range = (round(float(voltages.min()), 4), round(float(voltages.max()), 4))
+        return CalibrationCurve(KIND_POLYNOMIAL, coefficients=coefficients, voltage_range=voltage_range, **temperature)
+    raise ValueError(f"Unknown calibration kind '{kind}'.")
+
+
+def read_reference_csv(path: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    with open(path, newline="", encoding="utf-8") as file:
+        rows = list(csv.DictReader(file))
+    if not rows or "voltage" not in rows[0]:
+        raise ValueError(f"{path} needs a 'voltage' column.")
+    voltages = np.array([float(row["voltage"]) for row in rows])
+    temperatures = None
+    if rows[0].get("temperature") not in (None, ""):
+        temperatures = np.array([float(row["temperature"]) for row in rows])
+    return voltages, temperatures
+
+
+def _fit(args: argparse.Namespace) -> None:
+    references = []
+    for reference in args.reference:
+        moisture, _, path = reference.partition(":")
+        voltages, temperatures = read_reference_csv(path)
+        references.append((float(moisture), voltages, temperatures))
+    curve = fit_curve(references, args.kind, args.degree)
+    # Nur speichern, was der Agent beim Start auch wieder laden kann.
+    curve = CalibrationCurve.from_dict(curve.to_dict())
+
+    curves = load_calibrations(args.path)
+    curves[args.channel] = curve
+    save_calibrations(curves, args.path)
+    print(f"Saved {curve.kind} calibration for {args.channel} to {args.path}: {json.dumps(curve.to_dict())}")
+    for moisture, voltages, temperatures in references:
+        fitted = compile_curve(curve)(voltages, temperatures)
+        print(f"  reference {moisture:5.1f} %: fitted mean {fitted.mean():5.1f} %, stddev {fitted.std():.2f}")
+
+
+def _show(args: argparse.Namespace) -> None:
+    curves = load_calibrations(args.path)
+    if not curves:
+        print(f"No calibrations in {args.path}.")
+    for key, curve in sorted(curves.items()):
+        print(f"{key}: {json.dumps(curve.to_dict())}")
+
+
+def _recompute(args: argparse.Namespace) -> None:
+    """Rechnet die Rohwerte der lokalen Historie mit der aktuellen Kurve neu um (Backfill)."""
+    from timeseries_store import TIER_RAW, ChannelHistory, _channel_directory_name, _read_capacities
+
+    curve = load_calibrations(args.path).get(args.channel)
+    if curve is None:
+        print(f"No calibration for {args.channel} in {args.path}.")
+        sys.exit(1)
+    directory = os.path.join(args.history, _channel_directory_name(args.channel))
+    raw_capacity, tier_capacities = _read_capacities(directory)
+    history = ChannelHistory(directory, raw_capacity, tier_capacities)
+    rows = history.read(TIER_RAW)
+    history.close()
+    timestamps = np.array([row["timestamp"] for row in rows])
+    voltages = np.array([row["voltage"] for row in rows])
+    moistures = compile_curve(curve)(voltages, args.temperature)
+    print("timestamp,voltage,moisture")
+    for timestamp, voltage, moisture in zip(timestamps, voltages, moistures):
+        print(f"{timestamp},{voltage},{moisture:.2f}")
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description="Per-sensor calibration curves.")
+    parser.add_argument("--path", default=CALIBRATION_PATH, help="Calibration table (JSON).")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fit = commands.add_parser("fit", help="Fit a curve from reference runs and store it.")
+    fit.add_argument("channel", help="Channel key, e.g. 0x48/0.")
+    fit.add_argument(
+        "--reference", action="append", required=True, metavar="MOISTURE:CSV",
+        help="Reference run at a known moisture, e.g. 0:dry.csv. Repeat for every level.",
+    )
+    fit.add_argument("--kind", choices=[KIND_PIECEWISE, KIND_POLYNOMIAL], default=KIND_PIECEWISE)
+    fit.add_argument("--degree", type=int, default=2, help="Polynomial degree.")
+    fit.set_defaults(handler=_fit)
+
+    show = commands.add_parser("show", help="Print the stored calibrations.")
+    show.set_defaults(handler=_show)
+
+    recompute = commands.add_parser("recompute", help="Recompute moisture from the local raw history as CSV.")
+    recompute.add_argument("history", help="History directory, e.g. /app/history.")
+    recompute.add_argument("channel")
+    recompute.add_argument("--temperature", type=float, help="Temperature in °C for the temperature term.")
+    recompute.set_defaults(handler=_recompute)
+
+    args = parser.parse_args(argv[1:])
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Report-by-Exception für Fensterwerte.
+
+Ein Fenster wird nur hochgeladen, wenn sich die Feuchtigkeit seit dem letzten Upload um
+mindestens ``deadband`` Prozentpunkte geändert hat oder seit dem letzten Upload
+``heartbeat_seconds`` vergangen sind. Die Anzahl der dazwischen verworfenen Fenster
+wird mit dem nächsten Upload als ``suppressed_windows`` mitgeschickt.
+"""
+import time
+from typing import Callable, Dict, Optional
+
+
+class DeadbandFilter:
+    def __init__(
+        self,
+        deadband: float,
+        heartbeat_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.deadband = deadband
+        self.heartbeat_seconds = heartbeat_seconds
+        self.clock = clock
+        self._last_value: Dict[str, float] = {}
+        self._last_reported_at: Dict[str, float] = {}
+        self._suppressed: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.deadband > 0
+
+    def check(self, key: str, value: float) -> Optional[int]:
+        """Gibt die Anzahl unterdrückter Fenster zurück, wenn ``value`` gemeldet werden soll, sonst None."""
+        now = self.clock()
+        last_value = self._last_value.get(key)
+        report = (
+            not self.enabled
+            or last_value is None
+            or abs(value - last_value) >= self.deadband
+            or now - self._last_reported_at[key] >= self.heartbeat_seconds
+        )
+        if not report:
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return None
+
+        suppressed = self._suppressed.pop(key, 0)
+        self._last_value[key] = value
+        self._last_reported_at[key] = now
+        return suppressed
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""Gemeinsamer Directus-Client für die Sensor-Skripte.
+
+Eine ``requests.Session`` hält die Verbindung (inkl. TLS) offen, sodass nicht jeder Upload
+einen neuen Handshake kostet. Größere Request-Bodies werden gzip-komprimiert, der
+Authorization-Header wird einmal pro Token gebaut und für alle Requests wiederverwendet.
+"""
+import gzip
+import json
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Spätestens nach dieser Zeit wird das Token proaktiv erneuert.
+TOKEN_MAX_AGE_SECONDS = 30 * 60
+# Puffer vor dem vom Server gemeldeten Ablauf.
+TOKEN_EXPIRY_MARGIN_SECONDS = 30
+
+
+def is_duplicate_response(response: requests.Response) -> bool:
+    """Erkennt die Directus-Antwort auf einen bereits vorhandenen ``dedupe_key``."""
+    if response.status_code != 400:
+        return False
+    try:
+        errors = response.json().get("errors", [])
+    except ValueError:
+        return False
+    return any(error.get("extensions", {}).get("code") == "RECORD_NOT_UNIQUE" for error in errors)
+
+
+def is_retryable_status(status_code: int) -> bool:
+    """Serverfehler, abgelaufenes Token (401) und Überlast (429) können beim erneuten Senden klappen.
+
+    Andere 4xx (Validierung, unbekannte Pflanze, ...) lehnt Directus auch beim nächsten Versuch ab.
+    """
+    return status_code >= 500 or status_code in (401, 429)
+
+
+class LatencyStats:
+    """Einfache laufende Statistik über die Request-Dauer in Millisekunden."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+
+    def record(self, elapsed_ms: float) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.last_ms = elapsed_ms
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+
+class DirectusClient:
+    def __init__(
+        self,
+        base_url: str,
+        email: Optional[str],
+        password: Optional[str],
+        verify_tls: bool = True,
+        timeout: float = 20,
+        gzip_min_bytes: int = 512,
+        retries: int = 3,
+        pool_maxsize: int = 4,
+        log: Optional[Callable[[str], None]] = None,
+        on_request: Optional[Callable[[str, str, int, float, int], None]] = None,
+        static_token: Optional[str] = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.email = email
+        self.password = password
+        self.timeout = timeout
+        self.gzip_min_bytes = gzip_min_bytes
+        self.log = log or print
+        # Wird nach jedem Request mit (method, path, status, Sekunden, Retries) aufgerufen.
+        self.on_request = on_request
+        self.latency = LatencyStats()
+        self.login_count = 0
+
+        self.token: Optional[str] = None
+        self.token_expires_at: Optional[float] = None
+        self.token_acquired_at: Optional[float] = None
+        self._auth_headers: dict = {}
+        self._token_lock = threading.Lock()
+        # Festes Token ohne Login, z.B. für das lokale Ingest-Gateway ("" = ohne Authorization-Header).
+        self.static_token = static_token
+        if static_token is not None:
+            self.token = static_token
+            self._auth_headers = {"Authorization": f"Bearer {static_token}"} if static_token else {}
+
+        # Nur Verbindungsfehler, 502/503 (Proxy erreicht Directus nicht) und 429 (Gateway ausgelastet, mit
+        # Retry-After) werden wiederholt; bei Lese-Timeouts könnte der Request bereits verarbeitet worden sein.
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            status_forcelist=(429, 502, 503),
+            allowed_methods=None,
+            backoff_factor=0.5,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.verify = verify_tls
+        self.session.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip"})
+
+    @property
+    def has_credentials(self) -> bool:
+        return bool(self.base_url and self.email and self.password)
+
+    def _encode_body(self, payload: Any) -> tuple:
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if len(body) >= self.gzip_min_bytes:
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+        return body, headers
+
+    def _send(
+        self,
+        method: str,
+        path: str,
+        payload: Any = None,
+        authenticated: bool = True,
+        content_type: Optional[str] = None,
+    ) -> requests.Response:
+        if payload is None:
+            data, headers = None, {}
+        elif isinstance(payload, bytes):
+            # Bereits kodierter Body (z.B. Binärformat), wird unverändert gesendet.
+            data, headers = payload, {"Content-Type": content_type or "application/octet-stream"}
+        else:
+            data, headers = self._encode_body(payload)
+        if authenticated:
+            headers.update(self._auth_headers)
+        started = time.perf_counter()
+        response = self.session.request(
+            method, f"{self.base_url}{path}", data=data, headers=headers, timeout=self.timeout
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.latency.record(elapsed_ms)
+        if self.on_request:
+            retry_state = getattr(response.raw, "retries", None)
+            retries = len(getattr(retry_state, "history", None) or ())
+            self.on_request(method, path, response.status_code, elapsed_ms / 1000, retries)
+        self.log(
+            f"Directus {method} {path} -> {response.status_code} in {elapsed_ms:.1f} ms "
+            f"(avg {self.latency.avg_ms:.1f} ms over {self.latency.count} requests)"
+        )
+        return response
+
+    def login(self) -> str:
+        if not self.email or not self.password:
+            raise RuntimeError("Directus email/password must be set for Directus login.")
+
+        response = self._send(
+            "POST", "/auth/login", {"email": self.email, "password": self.password}, authenticated=False
+        )
+        response.raise_for_status()
+        data = response.json().get("data", {})
+        token = data.get("access_token")
+        if not token:
+            raise RuntimeError("Directus login failed: missing access_token.")
+        now = time.time()
+        expires = data.get("expires")
+        # Directus liefert "expires" in Millisekunden.
+        self.token_expires_at = (
+            now + float(expires) / 1000 - TOKEN_EXPIRY_MARGIN_SECONDS if isinstance(expires, (int, float)) else None
+        )
+        self.token_acquired_at = now
+        self.login_count += 1
+        self.token = token
+        self._auth_headers = {"Authorization": f"Bearer {token}"}
+        return token
+
+    def token_needs_refresh(self, now: Optional[float] = None) -> bool:
+        if self.static_token is not None:
+            return False
+        if not self.token:
+            return True
+        now = time.time() if now is None else now
+        if self.token_expires_at is not None and now >= self.token_expires_at:
+            return True
+        return self.token_acquired_at is not None and now - self.token_acquired_at >= TOKEN_MAX_AGE_SECONDS
+
+    def refresh_due_at(self) -> Optional[float]:
+        """Zeitpunkt (Unix-Zeit), ab dem ``token_needs_refresh`` greift; None ohne Token."""
+        if not self.token or self.token_acquired_at is None:
+            return None
+        due_at = self.token_acquired_at + TOKEN_MAX_AGE_SECONDS
+        if self.token_expires_at is not None:
+            due_at = min(due_at, self.token_expires_at)
+        return due_at
+
+    def refresh_token(self) -> str:
+        """Loggt unabhängig vom Alter des Tokens neu ein, z.B. für eine proaktive Erneuerung."""
+        with self._token_lock:
+            return self.login()
+
+    def get_token(self) -> str:
+        with self._token_lock:
+            if self.token_needs_refresh():
+                if self.token:
+                    self.log("Directus token abgelaufen oder zu alt. Erneuere Token.")
+                self.login()
+            return self.token
+
+    def invalidate_token(self, token: Optional[str]) -> None:
+        """Verwirft das Token, falls es noch das aktuelle ist (401 vom Server)."""
+        with self._token_lock:
+            if self.static_token is None and self.token == token:
+                self.token = None
+                self._auth_headers = {}
+
+    def request(
+        self, method: str, path: str, payload: Any = None, content_type: Optional[str] = None
+    ) -> requests.Response:
+        """Authentifizierter Request; bei 401 wird einmal neu eingeloggt und wiederholt."""
+        token = self.get_token()
+        response = self._send(method, path, payload, content_type=content_type)
+        if response.status_code == 401:
+            self.invalidate_token(token)
+            self.get_token()
+            response = self._send(method, path, payload, content_type=content_type)
+        return response
+
+    def create_items(self, collection: str, payload: Any) -> requests.Response:
+        """Legt ein Item (dict) oder mehrere Items (list) in ``collection`` an."""
+        return self.request("POST", f"/items/{collection}", payload)
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Minimaler Directus-Ersatz für Last- und Funktionstests des Sensors.
+
+Beantwortet ``POST /auth/login``, ``POST /items/<collection>`` und den binären Ingest-Endpunkt
+``POST /sensor-ingest/measurements`` wie Directus (inkl. gzip-Bodies, Keep-Alive und
+``RECORD_NOT_UNIQUE`` bei doppeltem ``dedupe_key``) und hält keine Daten außer den Dedupe-Keys. ``GET /stub/stats`` liefert Zähler für Benchmarks.
+
+    python directus_stub.py --port 18055 --latency-ms 20
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import struct
+import time
+import uuid
+from typing import Any, Dict, Optional, Set, Tuple
+
+from offline_spool import DEDUPE_KEY_FIELD
+from wire_format import decode_measurements
+
+REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found"}
+
+
+class DirectusStub:
+    def __init__(self, latency_seconds: float = 0.0, token_ttl_ms: int = 15 * 60 * 1000) -> None:
+        self.latency_seconds = latency_seconds
+        self.token_ttl_ms = token_ttl_ms
+        self.started_at = time.time()
+        self.requests = 0
+        self.logins = 0
+        self.items = 0
+        self.duplicates = 0
+        self.bytes_received = 0
+        self._dedupe_keys: Set[str] = set()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "uptime_seconds": time.time() - self.started_at,
+            "requests": self.requests,
+            "logins": self.logins,
+            "items": self.items,
+            "duplicates": self.duplicates,
+            "bytes_received": self.bytes_received,
+        }
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.bytes_received += len(body)
+                if headers.get("content-encoding") == "gzip":
+                    body = gzip.decompress(body)
+
+                status, payload = await self.route(method, target.split("?", 1)[0], headers, body)
+                data = b"" if payload is None else json.dumps(payload, separators=(",", ":")).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode("latin-1")
+                    + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> Tuple[int, Optional[Any]]:
+        if method == "GET" and path.endswith("/stub/stats"):
+            return 200, {"data": self.stats()}
+        self.requests += 1
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+
+        if method == "POST" and path.endswith("/auth/login"):
+            self.logins += 1
+            token = {"access_token": uuid.uuid4().hex, "refresh_token": uuid.uuid4().hex, "expires": self.token_ttl_ms}
+            return 200, {"data": token}
+        if method == "POST" and "/items/" in path:
+            if not headers.get("authorization", "").startswith("Bearer "):
+                return 401, {"errors": [{"message": "Invalid token.", "extensions": {"code": "INVALID_TOKEN"}}]}
+            items = json.loads(body)
+            return self.create_items(items if isinstance(items, list) else [items], isinstance(items, list))
+        if method == "POST" and path.endswith("/sensor-ingest/measurements"):
+            if not headers.get("authorization", "").startswith("Bearer "):
+                return 401, {"errors": [{"message": "Invalid token.", "extensions": {"code": "INVALID_TOKEN"}}]}
+            try:
+                items = decode_measurements(body)
+            except (ValueError, struct.error) as exc:
+                return 400, {"errors": [{"message": str(exc), "extensions": {"code": "INVALID_PAYLOAD"}}]}
+            return self.create_items(items, True)
+        return 404, {"errors": [{"message": "Route doesn't exist.", "extensions": {"code": "ROUTE_NOT_FOUND"}}]}
+
+    def create_items(self, items: list, as_list: bool) -> Tuple[int, Any]:
+        # Wie Directus: ein doppelter Key lässt den ganzen Request (eine Transaktion) scheitern.
+        keys = [item.get(DEDUPE_KEY_FIELD) for item in items if item.get(DEDUPE_KEY_FIELD)]
+        if any(key in self._dedupe_keys for key in keys) or len(set(keys)) != len(keys):
+            self.duplicates += 1
+            return 400, {
+                "errors": [
+                    {
+                        "message": f'Value for field "{DEDUPE_KEY_FIELD}" has to be unique.',
+                        "extensions": {"code": "RECORD_NOT_UNIQUE", "field": DEDUPE_KEY_FIELD},
+                    }
+                ]
+            }
+        self._dedupe_keys.update(keys)
+        self.items += len(items)
+        return 200, {"data": items if as_list else items[0]}
+
+
+async def serve(host: str, port: int, stub: DirectusStub, ready: Optional[Any] = None) -> None:
+    server = await asyncio.start_server(stub.handle_connection, host, port, backlog=4096)
+    if ready is not None:
+        ready.set()
+    async with server:
+        await server.serve_forever()
+
+
+def run_stub(host: str, port: int, latency_seconds: float = 0.0, ready: Optional[Any] = None) -> None:
+    """Einstiegspunkt für einen eigenen Prozess (``multiprocessing.Process``)."""
+    try:
+        asyncio.run(serve(host, port, DirectusStub(latency_seconds), ready))
+    except KeyboardInterrupt:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Directus stand-in for sensor load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18055)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Artificial delay per request.")
+    args = parser.parse_args()
+    print(f"Directus stub listening on http://{args.host}:{args.port}")
+    run_stub(args.host, args.port, args.latency_ms / 1000)
+
+
+if __name__ == "__main__":
+    main()
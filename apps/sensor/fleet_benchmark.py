@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""Lasttest: viele simulierte Sensor-Agenten gegen Directus oder den lokalen Stub.
+
+Jeder Agent nutzt den Debug-Pfad der Erfassung (``read_sample_debug``), die normale
+Fenster-Statistik und einen eigenen ``DirectusClient``. Die Agenten laufen als asyncio-Tasks,
+optional verteilt auf mehrere Prozesse; blockierende HTTP-Aufrufe gehen in einen Thread-Pool
+je Prozess. Ohne ``--url`` wird ``directus_stub.py`` in einem eigenen Prozess gestartet.
+
+Ausgegeben werden Durchsatz, p50/p99 der Upload-Latenz und CPU-Zeit/Speicher pro Agent.
+Die Ergebnisse landen als JSON in ``benchmarks/`` und lassen sich mit ``--compare`` gegen
+einen früheren Lauf prüfen (Exit-Code 1 bei Regression)::
+
+    python fleet_benchmark.py --agents 1000 --processes 4 --duration 60
+    python fleet_benchmark.py --agents 1000 --processes 4 --compare benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import datetime as dt
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from acquisition import ADS_CHANNELS, DEFAULT_ADS_ADDRESS, AcquisitionEngine, ChannelConfig
+from deadband_filter import DeadbandFilter
+from directus_client import DirectusClient
+from directus_stub import run_stub
+from measure_and_upload import ADMIN_EMAIL, ADMIN_PASSWORD, DIRECTUS_COLLECTION, V_DRY, V_WET, close_window
+from sampling_scheduler import MonotonicScheduler
+from window_stats import WindowAggregator
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+# Kennzahlen für --compare: (Schlüssel, True wenn größer besser ist)
+COMPARED_METRICS = (
+    ("measurements_per_second", True),
+    ("upload_latency_ms_p50", False),
+    ("upload_latency_ms_p99", False),
+    ("cpu_ms_per_agent_second", False),
+    ("rss_kb_per_agent", False),
+)
+
+
+def percentile(values: List[float], percent: float) -> Optional[float]:
+    """Perzentil mit linearer Interpolation über eine unsortierte Liste."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * percent / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _quiet(message: str) -> None:
+    pass
+
+
+class SimulatedAgent:
+    """Ein Sensor mit ``channels`` Kanälen, der alle ``window`` Sekunden ein Fenster hochlädt."""
+
+    def __init__(self, index: int, url: str, args: argparse.Namespace, executor: ThreadPoolExecutor) -> None:
+        configs = [
+            ChannelConfig(DEFAULT_ADS_ADDRESS + index % 4, ADS_CHANNELS[channel % len(ADS_CHANNELS)], V_DRY, V_WET)
+            for channel in range(args.channels)
+        ]
+        self.engine = AcquisitionEngine(configs, debug=True)
+        self.aggregators = {config.key: WindowAggregator() for config in configs}
+        self.deadband = DeadbandFilter(0, 0)
+        self.client = DirectusClient(
+            url, ADMIN_EMAIL, ADMIN_PASSWORD, verify_tls=False, timeout=args.timeout, pool_maxsize=1, log=_quiet
+        )
+        self.scheduler = MonotonicScheduler(args.sample_interval)
+        self.window_seconds = args.window
+        self.executor = executor
+        self.latencies: List[float] = []
+        self.end_to_end: List[float] = []
+        self.uploads = 0
+        self.measurements = 0
+        self.failures = 0
+        self._pending: set = set()
+
+    def _post(self, payloads: List[dict]) -> Tuple[bool, float]:
+        started = time.perf_counter()
+        try:
+            response = self.client.create_items(DIRECTUS_COLLECTION, payloads if len(payloads) > 1 else payloads[0])
+            ok = response.ok
+        except requests.RequestException:
+            ok = False
+        return ok, time.perf_counter() - started
+
+    async def _upload(self, payloads: List[dict]) -> None:
+        queued_at = time.perf_counter()
+        ok, seconds = await asyncio.get_running_loop().run_in_executor(self.executor, self._post, payloads)
+        self.end_to_end.append(time.perf_counter() - queued_at)
+        if ok:
+            self.latencies.append(seconds)
+            self.uploads += 1
+            self.measurements += len(payloads)
+        else:
+            self.failures += 1
+
+    async def run(self, stop_at: float) -> None:
+        # Agenten zeitlich verteilen, sonst laden alle im selben Moment hoch.
+        await asyncio.sleep(random.uniform(0, self.window_seconds))
+        window_started_at: Optional[float] = None
+        while time.monotonic() < stop_at:
+            await asyncio.sleep(self.scheduler.seconds_until_next())
+            tick = self.scheduler.advance()
+            for config, voltage, moisture in self.engine.read_all():
+                self.aggregators[config.key].add(voltage, moisture)
+            if window_started_at is None:
+                window_started_at = tick
+            if tick - window_started_at < self.window_seconds:
+                continue
+            window_started_at = tick
+            payloads = close_window(self.engine.configs, self.aggregators, self.deadband)
+            task = asyncio.ensure_future(self._upload(payloads))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+        if self._pending:
+            await asyncio.wait(list(self._pending))
+        self.client.close()
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _rss_kb() -> int:
+    """Aktueller Speicherbedarf des Prozesses (Linux), sonst das bisherige Maximum."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+async def _run_agents(first_index: int, count: int, url: str, args: argparse.Namespace) -> Dict:
+    executor = ThreadPoolExecutor(max_workers=args.upload_threads, thread_name_prefix="upload")
+    rss_before = _rss_kb()
+    cpu_before = _cpu_seconds()
+    agents = [SimulatedAgent(first_index + offset, url, args, executor) for offset in range(count)]
+    stop_at = time.monotonic() + args.duration
+    started = time.monotonic()
+    await asyncio.gather(*(agent.run(stop_at) for agent in agents))
+    elapsed = time.monotonic() - started
+    executor.shutdown(wait=True)
+    return {
+        "agents": count,
+        "elapsed_seconds": elapsed,
+        "cpu_seconds": _cpu_seconds() - cpu_before,
+        "rss_kb": max(0, _rss_kb() - rss_before),
+        "uploads": sum(agent.uploads for agent in agents),
+        "measurements": sum(agent.measurements for agent in agents),
+        "failures": sum(agent.failures for agent in agents),
+        "missed_ticks": sum(agent.scheduler.missed_ticks_total for agent in agents),
+        "latencies": [value for agent in agents for value in agent.latencies],
+        "end_to_end": [value for agent in agents for value in agent.end_to_end],
+    }
+
+
+def run_worker(first_index: int, count: int, url: str, args: argparse.Namespace) -> Dict:
+    """Einstiegspunkt je Prozess."""
+    return asyncio.run(_run_agents(first_index, count, url, args))
+
+
+def _split(total: int, parts: int) -> List[Tuple[int, int]]:
+    base, extra = divmod(total, parts)
+    ranges, start = [], 0
+    for part in range(parts):
+        count = base + (1 if part < extra else 0)
+        if count:
+            ranges.append((start, count))
+        start += count
+    return ranges
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value * 1000, 3)
+
+
+def summarize(workers: List[Dict], args: argparse.Namespace, url: str, stub_stats: Optional[Dict]) -> Dict:
+    agents = sum(worker["agents"] for worker in workers)
+    elapsed = max(worker["elapsed_seconds"] for worker in workers)
+    latencies = [value for worker in workers for value in worker["latencies"]]
+    end_to_end = [value for worker in workers for value in worker["end_to_end"]]
+    uploads = sum(worker["uploads"] for worker in workers)
+    measurements = sum(worker["measurements"] for worker in workers)
+    cpu_seconds = sum(worker["cpu_seconds"] for worker in workers)
+    return {
+        "created_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "config": {
+            "agents": agents,
+            "processes": len(workers),
+            "channels": args.channels,
+            "duration_seconds": args.duration,
+            "sample_interval_seconds": args.sample_interval,
+            "window_seconds": args.window,
+            "upload_threads": args.upload_threads,
+            "url": url,
+            "stub_latency_ms": args.stub_latency_ms if not args.url else None,
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "uploads": uploads,
+        "measurements": measurements,
+        "failures": sum(worker["failures"] for worker in workers),
+        "missed_ticks": sum(worker["missed_ticks"] for worker in workers),
+        "uploads_per_second": round(uploads / elapsed, 3),
+        "measurements_per_second": round(measurements / elapsed, 3),
+        "upload_latency_ms_p50": _ms(percentile(latencies, 50)),
+        "upload_latency_ms_p99": _ms(percentile(latencies, 99)),
+        "upload_latency_ms_max": _ms(max(latencies) if latencies else None),
+        "end_to_end_ms_p50": _ms(percentile(end_to_end, 50)),
+        "end_to_end_ms_p99": _ms(percentile(end_to_end, 99)),
+        "cpu_seconds": round(cpu_seconds, 3),
+        "cpu_ms_per_agent_second": round(cpu_seconds * 1000 / agents / elapsed, 4),
+        "rss_kb_per_agent": round(sum(worker["rss_kb"] for worker in workers) / agents, 2),
+        "server": stub_stats,
+    }
+
+
+def compare(result: Dict, baseline: Dict, max_regression_percent: float) -> bool:
+    """Druckt die Abweichungen zur Baseline; False, wenn eine Kennzahl zu stark schlechter ist."""
+    ok = True
+    if baseline.get("config") != result["config"]:
+        print("  Warning: the baseline was recorded with a different configuration.")
+    for key, higher_is_better in COMPARED_METRICS:
+        current, previous = result.get(key), baseline.get(key)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous * 100
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > max_regression_percent:
+            flag = "  REGRESSION"
+            ok = False
+        print(f"  {key:<28} {previous:>12} -> {current:>12} ({change:+.1f}%){flag}")
+    return ok
+
+
+def _start_stub(port: int, latency_ms: float) -> multiprocessing.Process:
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(
+        target=run_stub, args=("127.0.0.1", port, latency_ms / 1000, ready), name="directus-stub", daemon=True
+    )
+    process.start()
+    if not ready.wait(10):
+        process.terminate()
+        raise RuntimeError("Directus stub did not start.")
+    return process
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simulate a fleet of sensor agents against Directus.")
+    parser.add_argument("--agents", type=int, default=200)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--channels", type=int, default=1, help="Channels (payloads per window) per agent.")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run.")
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument("--window", type=float, default=5.0, help="Seconds per upload window.")
+    parser.add_argument("--upload-threads", type=int, default=64, help="HTTP worker threads per process.")
+    parser.add_argument("--timeout", type=float, default=20)
+    parser.add_argument("--url", help="Directus base URL. Without it a local stub is started.")
+    parser.add_argument("--stub-port", type=int, default=18056)
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0)
+    parser.add_argument("--output", help="Result file (default: benchmarks/fleet_<agents>_<timestamp>.json).")
+    parser.add_argument("--compare", help="Previous result file to compare against.")
+    parser.add_argument("--max-regression-percent", type=float, default=10.0)
+    args = parser.parse_args()
+
+    stub = None
+    url = args.url
+    if not url:
+        stub = _start_stub(args.stub_port, args.stub_latency_ms)
+        url = f"http://127.0.0.1:{args.stub_port}"
+
+    print(f"Running {args.agents} agents in {args.processes} process(es) for {args.duration:.0f}s against {url}")
+    try:
+        ranges = _split(args.agents, max(1, args.processes))
+        if len(ranges) == 1:
+            workers = [run_worker(ranges[0][0], ranges[0][1], url, args)]
+        else:
+            with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+                futures = [pool.submit(run_worker, first, count, url, args) for first, count in ranges]
+                workers = [future.result() for future in futures]
+        stub_stats = None
+        if stub is not None:
+            stub_stats = requests.get(f"{url}/stub/stats", timeout=5).json()["data"]
+    finally:
+        if stub is not None:
+            stub.terminate()
+            stub.join()
+
+    result = summarize(workers, args, url, stub_stats)
+    print(json.dumps({key: value for key, value in result.items() if key not in ("host", "config")}, indent=4))
+
+    output = args.output or os.path.join(
+        BENCHMARK_DIR, f"fleet_{args.agents}_{dt.datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(result, file, indent=4)
+    print(f"Saved results to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+        print(f"Compared to {args.compare}:")
+        if not compare(result, baseline, args.max_regression_percent):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""Lokales Ingest-Gateway zwischen den Sensoren und Directus.
+
+Die Sensoren (``SENSOR_GATEWAY_URL``) senden ihre Messungen wie an Directus, aber ohne eigenen Login:
+``POST /items/<collection>`` (JSON, auch gzip) oder ``POST /sensor-ingest/measurements`` (Binärformat aus
+``wire_format.py``). Das Gateway
+
+- hält eine einzige, gepoolte und authentifizierte Verbindung zu Directus (``DirectusClient``),
+- sammelt die Messungen aller Sensoren und schreibt sie gebündelt, sobald ``GATEWAY_BATCH_SIZE`` Messungen
+  vorliegen oder die älteste ``GATEWAY_LINGER_SECONDS`` wartet,
+- antwortet einem Sensor erst, wenn seine Messungen in Directus gespeichert sind (sonst 503, der Sensor
+  legt sie in seinen Offline-Spool),
+- reicht dauerhafte Ablehnungen einzelner Messungen (4xx außer 401/429, z.B. Validierung oder eine
+  unbekannte ``plant``) mit Status und Fehler von Directus an den Sensor weiter, der sie verwirft. Nur
+  Serverfehler, 401, 429 und Verbindungsfehler pausieren das Schreiben,
+- wehrt Last ab: 429 mit ``Retry-After``, wenn mehr als ``GATEWAY_MAX_PENDING`` Messungen warten (Directus
+  zu langsam), 503, solange Directus nach Fehlern pausiert wird.
+
+Lehnt Directus einen Batch ab (z.B. ``RECORD_NOT_UNIQUE`` eines erneut gesendeten ``dedupe_key``), werden
+die Messungen einzeln geschrieben und Duplikate übersprungen. ``GET /gateway/stats`` liefert Zähler.
+
+Testen gegen den Directus-Ersatz::
+
+    python directus_stub.py --port 18055 --latency-ms 50
+    DIRECTUS_URL=http://127.0.0.1:18055 python ingest_gateway.py
+    SENSOR_GATEWAY_URL=http://127.0.0.1:8090 SENSOR_DEBUG=true python measure_and_upload.py
+"""
+import asyncio
+import datetime as dt
+import gzip
+import json
+import math
+import os
+import struct
+import time
+from typing import Any, Dict, List, Tuple
+
+from directus_client import DirectusClient, is_duplicate_response, is_retryable_status
+from wire_format import CONTENT_TYPE as WIRE_CONTENT_TYPE, decode_measurements, encode_measurements
+
+GATEWAY_HOST = os.getenv("GATEWAY_HOST", "0.0.0.0")
+GATEWAY_PORT = int(os.getenv("GATEWAY_PORT", "8090"))
+# Leer: keine Authentifizierung der Sensoren (nur im internen Docker-Netz sinnvoll).
+GATEWAY_TOKEN = os.getenv("SENSOR_GATEWAY_TOKEN", "")
+GATEWAY_BATCH_SIZE = max(1, int(os.getenv("GATEWAY_BATCH_SIZE", "500")))
+GATEWAY_LINGER_SECONDS = float(os.getenv("GATEWAY_LINGER_SECONDS", "1"))
+GATEWAY_MAX_PENDING = max(1, int(os.getenv("GATEWAY_MAX_PENDING", "5000")))
+# Pause nach einem fehlgeschlagenen Schreiben, verdoppelt sich bis GATEWAY_BACKOFF_MAX_SECONDS.
+GATEWAY_BACKOFF_SECONDS = float(os.getenv("GATEWAY_BACKOFF_SECONDS", "2"))
+GATEWAY_BACKOFF_MAX_SECONDS = float(os.getenv("GATEWAY_BACKOFF_MAX_SECONDS", "60"))
+# "json" (POST /items) oder "binary" (Ingest-Endpunkt der Directus-Extension) Richtung Directus.
+GATEWAY_WIRE_FORMAT = os.getenv("GATEWAY_WIRE_FORMAT", "json").strip().lower()
+SENSOR_INGEST_PATH = "/sensor-ingest/measurements"
+
+DIRECTUS_URL = os.getenv("DIRECTUS_URL", "http://flower-pi-directus:8055").rstrip("/")
+DIRECTUS_COLLECTION = os.getenv("DIRECTUS_COLLECTION", "sensor_measurements")
+ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "admin@example.com")
+ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")
+DIRECTUS_VERIFY_TLS = os.getenv("DIRECTUS_VERIFY_TLS", "false").strip().lower() in {"1", "true", "yes", "on"}
+GATEWAY_DEBUG = os.getenv("GATEWAY_DEBUG", "false").strip().lower() in {"1", "true", "yes", "on"}
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    401: "Unauthorized",
+    403: "Forbidden",
+    404: "Not Found",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    503: "Service Unavailable",
+}
+MAX_BODY_BYTES = 4 * 1024 * 1024
+
+
+def log(message: str) -> None:
+    now = dt.datetime.now().astimezone().isoformat(timespec="seconds")
+    print(f"[{now}] {message}")
+
+
+def error_payload(code: str, message: str) -> Dict[str, Any]:
+    return {"errors": [{"message": message, "extensions": {"code": code}}]}
+
+
+class Rejection:
+    """Dauerhafte Ablehnung einer Messung durch Directus, wird unverändert an den Sensor weitergegeben."""
+
+    __slots__ = ("status", "payload")
+
+    def __init__(self, status: int, payload: Any) -> None:
+        self.status = status
+        self.payload = payload
+
+    @classmethod
+    def from_response(cls, response) -> "Rejection":
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict) or "errors" not in payload:
+            payload = error_payload("INVALID_PAYLOAD", response.text[:500])
+        return cls(response.status_code, payload)
+
+
+class PendingRequest:
+    """Messungen eines Sensor-Requests und das Future, das nach dem Schreiben erfüllt wird."""
+
+    __slots__ = ("items", "future", "queued_at")
+
+    def __init__(self, items: List[dict], future: asyncio.Future, queued_at: float) -> None:
+        self.items = items
+        self.future = future
+        self.queued_at = queued_at
+
+
+class IngestGateway:
+    def __init__(
+        self,
+        client: DirectusClient,
+        collection: str = DIRECTUS_COLLECTION,
+        batch_size: int = GATEWAY_BATCH_SIZE,
+        linger_seconds: float = GATEWAY_LINGER_SECONDS,
+        max_pending: int = GATEWAY_MAX_PENDING,
+        wire_format: str = GATEWAY_WIRE_FORMAT,
+        token: str = GATEWAY_TOKEN,
+    ) -> None:
+        self.client = client
+        self.collection = collection
+        self.batch_size = batch_size
+        self.linger_seconds = linger_seconds
+        self.max_pending = max_pending
+        self.wire_format = wire_format
+        self.token = token
+
+        self._queue: List[PendingRequest] = []
+        self._queued_items = 0
+        self._in_flight_items = 0
+        self._wakeup = asyncio.Event()
+        self._backoff_seconds = 0.0
+        self._paused_until = 0.0
+        self._last_write_seconds = 0.0
+
+        self.started_at = time.time()
+        self.counters: Dict[str, int] = {
+            "requests": 0,
+            "measurements_accepted": 0,
+            "measurements_written": 0,
+            "duplicates_skipped": 0,
+            "measurements_failed": 0,
+            "measurements_rejected": 0,
+            "directus_requests": 0,
+            "rejected_429": 0,
+            "rejected_503": 0,
+        }
+
+    @property
+    def pending_items(self) -> int:
+        return self._queued_items + self._in_flight_items
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "uptime_seconds": time.time() - self.started_at,
+            "pending": self.pending_items,
+            "directus_logins": self.client.login_count,
+            "directus_avg_ms": self.client.latency.avg_ms,
+            "paused_seconds": max(0.0, self._paused_until - time.monotonic()),
+        }
+
+    def retry_after_seconds(self) -> int:
+        """Schätzung, wann wieder Platz ist: so viele Batches, wie gerade warten, à letzter Schreibdauer."""
+        batches = math.ceil(self.pending_items / self.batch_size)
+        return max(1, math.ceil(batches * max(self._last_write_seconds, 0.1) + self.linger_seconds))
+
+    async def submit(self, items: List[dict], single: bool = False) -> Tuple[int, Any, Dict[str, str]]:
+        self.counters["requests"] += 1
+        now = time.monotonic()
+        if now < self._paused_until:
+            self.counters["rejected_503"] += 1
+            retry_after = str(max(1, math.ceil(self._paused_until - now)))
+            return 503, error_payload("SERVICE_UNAVAILABLE", "Directus unavailable, retry later."), {
+                "Retry-After": retry_after
+            }
+        if self.pending_items + len(items) > self.max_pending:
+            self.counters["rejected_429"] += 1
+            return 429, error_payload("REQUESTS_EXCEEDED", "Gateway queue full, retry later."), {
+                "Retry-After": str(self.retry_after_seconds())
+            }
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append(PendingRequest(items, future, now))
+        self._queued_items += len(items)
+        self.counters["measurements_accepted"] += len(items)
+        self._wakeup.set()
+
+        outcome = await future
+        if outcome is None:
+            # Wie Directus: ein einzelnes Objekt kommt als Objekt zurück.
+            return 200, {"data": items[0] if single else items}, {}
+        if isinstance(outcome, Rejection):
+            # Der Sensor sendet einen abgelehnten Batch einzeln nach und verwirft nur die abgelehnten Messungen.
+            return outcome.status, outcome.payload, {}
+        return 503, error_payload("SERVICE_UNAVAILABLE", "Measurements could not be stored in Directus."), {
+            "Retry-After": str(max(1, math.ceil(self._backoff_seconds)))
+        }
+
+    def _take_batch(self) -> List[PendingRequest]:
+        # Ganze Requests, mindestens einer, bis die Batch-Größe erreicht ist.
+        batch: List[PendingRequest] = []
+        count = 0
+        while self._queue and (not batch or count + len(self._queue[0].items) <= self.batch_size):
+            pending = self._queue.pop(0)
+            batch.append(pending)
+            count += len(pending.items)
+        self._queued_items -= count
+        self._in_flight_items += count
+        return batch
+
+    async def run_writer(self) -> None:
+        """Einziger Schreiber: immer höchstens ein Request gleichzeitig an Directus."""
+        while True:
+            while not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            while self._queued_items < self.batch_size:
+                # Die Wartezeit zählt ab dem ältesten wartenden Request, auch nach einem Teil-Batch.
+                remaining = self._queue[0].queued_at + self.linger_seconds - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = self._take_batch()
+            items = [item for pending in batch for item in pending.items]
+            started = time.monotonic()
+            try:
+                failed, rejected = await asyncio.to_thread(self.write, items)
+            except Exception as exc:
+                log(f"Writing {len(items)} measurements to Directus failed: {exc}")
+                failed, rejected = set(range(len(items))), {}
+            self._last_write_seconds = time.monotonic() - started
+            self._in_flight_items -= len(items)
+            self.counters["measurements_failed"] += len(failed)
+            self.counters["measurements_rejected"] += len(rejected)
+
+            if failed:
+                self._backoff_seconds = min(
+                    max(self._backoff_seconds * 2, GATEWAY_BACKOFF_SECONDS), GATEWAY_BACKOFF_MAX_SECONDS
+                )
+                self._paused_until = time.monotonic() + self._backoff_seconds
+            else:
+                self._backoff_seconds = 0.0
+
+            offset = 0
+            for pending in batch:
+                indexes = range(offset, offset + len(pending.items))
+                offset += len(pending.items)
+                if pending.future.done():
+                    continue
+                # None: gespeichert, False: später erneut senden, Rejection: dauerhaft abgelehnt
+                outcome: Any = None
+                if any(index in failed for index in indexes):
+                    outcome = False
+                else:
+                    outcome = next((rejected[index] for index in indexes if index in rejected), None)
+                pending.future.set_result(outcome)
+
+            if failed and self._queue:
+                # Directus pausieren lassen, wartende Requests warten mit.
+                await asyncio.sleep(self._backoff_seconds)
+
+    def post(self, items: List[dict]):
+        self.counters["directus_requests"] += 1
+        if self.wire_format == "binary":
+            try:
+                body = encode_measurements(items)
+            except ValueError:
+                pass
+            else:
+                return self.client.request("POST", SENSOR_INGEST_PATH, body, content_type=WIRE_CONTENT_TYPE)
+        return self.client.create_items(self.collection, items if len(items) > 1 else items[0])
+
+    def write(self, items: List[dict]) -> Tuple[set, Dict[int, Rejection]]:
+        """Schreibt die Messungen (im Thread).
+
+        Gibt die Indizes der später erneut zu sendenden Messungen und die dauerhaft abgelehnten zurück.
+        """
+        response = self.post(items)
+        if response.ok:
+            self.counters["measurements_written"] += len(items)
+            return set(), {}
+        if is_retryable_status(response.status_code):
+            log(f"Directus could not store {len(items)} measurements: {response.status_code} {response.text[:200]}")
+            return set(range(len(items))), {}
+        if len(items) == 1:
+            if is_duplicate_response(response):
+                self.counters["duplicates_skipped"] += 1
+                return set(), {}
+            log(f"Directus rejected measurement {items[0].get('dedupe_key')}: {response.status_code} {response.text[:200]}")
+            return set(), {0: Rejection.from_response(response)}
+
+        # Ein Eintrag lässt den ganzen Batch scheitern (eine Transaktion): einzeln schreiben.
+        failed = set()
+        rejected: Dict[int, Rejection] = {}
+        for index, item in enumerate(items):
+            response = self.post([item])
+            if response.ok:
+                self.counters["measurements_written"] += 1
+            elif is_duplicate_response(response):
+                self.counters["duplicates_skipped"] += 1
+            elif is_retryable_status(response.status_code):
+                log(f"Directus could not store measurement {item.get('dedupe_key')}: {response.status_code}")
+                failed.update(range(index, len(items)))
+                break
+            else:
+                log(f"Directus rejected measurement {item.get('dedupe_key')}: {response.status_code} {response.text[:200]}")
+                rejected[index] = Rejection.from_response(response)
+        return failed, rejected
+
+    def parse_items(self, path: str, body: bytes) -> Tuple[List[dict], bool]:
+        """Liefert die Messungen und ob der Body ein einzelnes Objekt war."""
+        if path.endswith(SENSOR_INGEST_PATH):
+            return decode_measurements(body), False
+        items = json.loads(body)
+        if isinstance(items, dict):
+            return [items], True
+        if isinstance(items, list) and all(isinstance(item, dict) for item in items):
+            return items, False
+        raise ValueError("Expected a measurement object or a list of measurements.")
+
+    async def route(
+        self, method: str, path: str, headers: Dict[str, str], body: bytes
+    ) -> Tuple[int, Any, Dict[str, str]]:
+        if method == "GET" and path == "/gateway/stats":
+            return 200, {"data": self.stats()}, {}
+        if method == "GET" and path == "/server/ping":
+            return 200, None, {}
+        if method != "POST" or not (path.endswith(SENSOR_INGEST_PATH) or path == f"/items/{self.collection}"):
+            return 404, error_payload("ROUTE_NOT_FOUND", "Route doesn't exist."), {}
+        if self.token and headers.get("authorization") != f"Bearer {self.token}":
+            return 401, error_payload("INVALID_TOKEN", "Invalid gateway token."), {}
+        try:
+            items, single = self.parse_items(path, body)
+        except (ValueError, struct.error) as exc:
+            return 400, error_payload("INVALID_PAYLOAD", str(exc)), {}
+        if not items:
+            return 200, {"data": []}, {}
+        return await self.submit(items, single)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    status, payload, extra_headers = 413, error_payload("REQUEST_TOO_LARGE", "Body too large."), {}
+                    headers["connection"] = "close"
+                else:
+                    body = await reader.readexactly(length)
+                    if headers.get("content-encoding") == "gzip":
+                        body = gzip.decompress(body)
+                    status, payload, extra_headers = await self.route(
+                        method, target.split("?", 1)[0], headers, body
+                    )
+
+                data = b"" if payload is None else json.dumps(payload, separators=(",", ":")).encode("utf-8")
+                head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", "Content-Type: application/json"]
+                head += [f"{name}: {value}" for name, value in extra_headers.items()]
+                head.append(f"Content-Length: {len(data)}")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+                await writer.drain()
+                if GATEWAY_DEBUG:
+                    log(f"{method} {target} -> {status}")
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, OSError):
+            pass
+        finally:
+            writer.close()
+
+
+async def log_stats(gateway: IngestGateway, interval_seconds: float = 60) -> None:
+    while True:
+        await asyncio.sleep(interval_seconds)
+        stats = gateway.stats()
+        log(
+            "Gateway: {measurements_accepted} accepted, {measurements_written} written, "
+            "{duplicates_skipped} duplicates, {measurements_failed} failed, {measurements_rejected} rejected, "
+            "{pending} pending, "
+            "{directus_requests} Directus requests, {rejected_429}x 429, {rejected_503}x 503".format(**stats)
+        )
+
+
+async def serve(host: str = GATEWAY_HOST, port: int = GATEWAY_PORT) -> None:
+    client = DirectusClient(
+        DIRECTUS_URL,
+        ADMIN_EMAIL,
+        ADMIN_PASSWORD,
+        verify_tls=DIRECTUS_VERIFY_TLS,
+        timeout=20,
+        pool_maxsize=1,
+        log=log if GATEWAY_DEBUG else (lambda message: None),
+    )
+    gateway = IngestGateway(client)
+    server = await asyncio.start_server(gateway.handle_connection, host, port, backlog=1024)
+    log(
+        f"Ingest gateway listening on http://{host}:{port}, writing to {DIRECTUS_URL} "
+        f"(batch {gateway.batch_size}, linger {gateway.linger_seconds}s, max pending {gateway.max_pending})"
+    )
+    async with server:
+        await asyncio.gather(server.serve_forever(), gateway.run_writer(), log_stats(gateway))
+
+
+def main() -> None:
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
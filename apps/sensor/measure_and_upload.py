@@ -1,21 +1,104 @@
 #!/usr/bin/env python3
 import datetime as dt
+import math
 import os
+import tempfile
 import time
-from collections import deque
-from statistics import mean
-from typing import Deque, Dict, Optional, Tuple
-
-import random
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 import requests
 
+from adaptive_sampling import AdaptiveSampler
+from acquisition import AcquisitionEngine, ChannelConfig, parse_channel_configs
+from calibration import CALIBRATION_PATH, load_calibrations
+from deadband_filter import DeadbandFilter
+from directus_client import DirectusClient, is_duplicate_response, is_retryable_status
+from metrics import MetricsRegistry, start_metrics_server
+from offline_spool import DEDUPE_KEY_FIELD, OfflineSpool, SpoolDrainer
+from replay_source import ReplaySampleSource, configs_for_trace
+from sampling_scheduler import MonotonicScheduler
+from timeseries_store import TimeSeriesStore
+from window_stats import WindowAggregator
+from wire_format import CONTENT_TYPE as WIRE_CONTENT_TYPE, encode_measurements
+
 V_DRY = float(os.getenv("SENSOR_VOLTAGE_DRY", "2.80"))
 V_WET = float(os.getenv("SENSOR_VOLTAGE_WET", "1.20"))
 SAMPLE_INTERVAL_SECONDS = float(os.getenv("SENSOR_SAMPLE_INTERVAL_SECONDS", "5"))
 AVERAGE_WINDOW_SECONDS = int(
     os.getenv("SENSOR_AVERAGE_WINDOW_SECONDS", os.getenv("SENSOR_SAMPLE_DURATION_SECONDS", "60"))
 )
+# Adaptive Abtastung (SENSOR_SAMPLING_MODE=adaptive): schnell mit SENSOR_SAMPLE_INTERVAL_SECONDS, solange sich
+# die Feuchtigkeit um mindestens SENSOR_ADAPTIVE_RATE_THRESHOLD Prozentpunkte pro Minute ändert, sonst
+# exponentiell langsamer bis SENSOR_ADAPTIVE_MAX_INTERVAL_SECONDS. Während Änderungen werden Fenster von
+# SENSOR_ADAPTIVE_ACTIVE_WINDOW_SECONDS sofort hochgeladen, in ruhigen Phasen Fenster von
+# SENSOR_ADAPTIVE_CALM_WINDOW_SECONDS (Standard: fünf maximale Intervalle, mindestens AVERAGE_WINDOW_SECONDS).
+SAMPLING_MODE = os.getenv("SENSOR_SAMPLING_MODE", "fixed").strip().lower()
+ADAPTIVE_MAX_INTERVAL_SECONDS = float(os.getenv("SENSOR_ADAPTIVE_MAX_INTERVAL_SECONDS", "60"))
+ADAPTIVE_RATE_THRESHOLD = float(os.getenv("SENSOR_ADAPTIVE_RATE_THRESHOLD", "1.0"))
+ADAPTIVE_ACTIVE_WINDOW_SECONDS = float(os.getenv("SENSOR_ADAPTIVE_ACTIVE_WINDOW_SECONDS", "15"))
+ADAPTIVE_CALM_WINDOW_SECONDS = float(
+    os.getenv("SENSOR_ADAPTIVE_CALM_WINDOW_SECONDS", str(max(AVERAGE_WINDOW_SECONDS, 5 * ADAPTIVE_MAX_INTERVAL_SECONDS)))
+)
+ADAPTIVE_HOLD_SECONDS = float(os.getenv("SENSOR_ADAPTIVE_HOLD_SECONDS", "300"))
+ADAPTIVE_BACKOFF_FACTOR = float(os.getenv("SENSOR_ADAPTIVE_BACKOFF_FACTOR", "2"))
+# ADC-Modus: "single" (eine Wandlung pro Tick) oder "continuous" (Burst von SENSOR_ADC_BURST_SAMPLES
+# Rohwerten je Kanal und Tick bei SENSOR_ADC_DATA_RATE Wandlungen pro Sekunde, Standard 860).
+ADC_MODE = os.getenv("SENSOR_ADC_MODE", "single").strip().lower()
+ADC_DATA_RATE = int(os.getenv("SENSOR_ADC_DATA_RATE")) if os.getenv("SENSOR_ADC_DATA_RATE") else None
+ADC_BURST_SAMPLES = max(1, int(os.getenv("SENSOR_ADC_BURST_SAMPLES", "16"))) if ADC_MODE == "continuous" else 1
+# Größe des Ringpuffers je Kanal für den Median (0 deaktiviert ihn). Standard: Messungen pro Fenster. Adaptiv
+# kann ein ruhiges Fenster nach einer Änderung noch mit dem kürzesten Intervall (SENSOR_SAMPLE_INTERVAL_SECONDS)
+# abgetastet werden, daher zählt dann das längste Fenster bei diesem Intervall.
+LONGEST_WINDOW_SECONDS = (
+    max(AVERAGE_WINDOW_SECONDS, ADAPTIVE_CALM_WINDOW_SECONDS) if SAMPLING_MODE == "adaptive" else AVERAGE_WINDOW_SECONDS
+)
+PERCENTILE_BUFFER_SIZE = int(
+    os.getenv(
+        "SENSOR_PERCENTILE_BUFFER_SIZE",
+        str((math.ceil(LONGEST_WINDOW_SECONDS / SAMPLE_INTERVAL_SECONDS) + 1) * ADC_BURST_SAMPLES),
+    )
+)
+# Umgebungstemperatur (°C) für den Temperaturterm der Kalibrierkurven; leer = keine Korrektur.
+SENSOR_TEMPERATURE_CELSIUS = (
+    float(os.getenv("SENSOR_TEMPERATURE_CELSIUS")) if os.getenv("SENSOR_TEMPERATURE_CELSIUS") else None
+)
+# Report-by-Exception: Ein Fenster wird nur hochgeladen, wenn sich moisture_avg um mindestens
+# REPORT_DEADBAND_PERCENT Prozentpunkte geändert hat oder REPORT_HEARTBEAT_SECONDS seit dem letzten
+# Upload vergangen sind. 0 lädt jedes Fenster hoch.
+REPORT_DEADBAND_PERCENT = float(os.getenv("SENSOR_REPORT_DEADBAND_PERCENT", "0"))
+REPORT_HEARTBEAT_SECONDS = float(os.getenv("SENSOR_REPORT_HEARTBEAT_SECONDS", "3600"))
+# Batching: mehrere Fenster sammeln und als ein Array-POST senden.
+# Ein Batch wird gesendet, sobald UPLOAD_BATCH_SIZE Fenster vorliegen oder das älteste
+# Fenster UPLOAD_BATCH_LINGER_SECONDS wartet. Eine Batch-Größe von 1 deaktiviert das Batching;
+# die Payloads aller Kanäle eines Fensters gehen aber immer gemeinsam in einen Request.
+UPLOAD_BATCH_SIZE = max(1, int(os.getenv("SENSOR_UPLOAD_BATCH_SIZE", "1")))
+UPLOAD_BATCH_LINGER_SECONDS = float(os.getenv("SENSOR_UPLOAD_BATCH_LINGER_SECONDS", "300"))
+# Offline-Spool: fehlgeschlagene Uploads werden lokal gespeichert und im Hintergrund erneut gesendet.
+SPOOL_PATH = os.getenv(
+    "SENSOR_SPOOL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool", "sensor_spool.sqlite3")
+)
+SPOOL_DRAIN_BATCH_SIZE = max(1, int(os.getenv("SENSOR_SPOOL_DRAIN_BATCH_SIZE", "50")))
+SPOOL_BACKOFF_MAX_SECONDS = float(os.getenv("SENSOR_SPOOL_BACKOFF_MAX_SECONDS", "600"))
+# Lokale Historie (memory-mapped Ringdateien): Rohwerte der letzten SENSOR_HISTORY_RAW_HOURS Stunden
+# sowie Minuten-, Stunden- und Tagesaggregate. Ein leerer Pfad deaktiviert die Historie.
+HISTORY_PATH = os.getenv(
+    "SENSOR_HISTORY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "history")
+)
+HISTORY_RAW_HOURS = float(os.getenv("SENSOR_HISTORY_RAW_HOURS", "24"))
+HISTORY_MINUTE_DAYS = float(os.getenv("SENSOR_HISTORY_MINUTE_DAYS", "7"))
+HISTORY_HOUR_DAYS = float(os.getenv("SENSOR_HISTORY_HOUR_DAYS", "365"))
+HISTORY_DAY_DAYS = float(os.getenv("SENSOR_HISTORY_DAY_DAYS", "3650"))
+# Port für den Prometheus-Endpunkt /metrics, 0 (Standard) deaktiviert ihn.
+METRICS_PORT = int(os.getenv("SENSOR_METRICS_PORT", "0"))
+# Ohne explizite Adresse nur lokal erreichbar; der Endpunkt hat keine Authentifizierung.
+METRICS_HOST = os.getenv("SENSOR_METRICS_HOST", "127.0.0.1")
+# Maximal so viele Upload-Jobs dürfen gleichzeitig ausstehen, weitere gehen direkt in den Spool.
+UPLOAD_MAX_PENDING = max(1, int(os.getenv("SENSOR_UPLOAD_MAX_PENDING", "4")))
+# "json" (POST /items) oder "binary" (kompaktes Format aus wire_format.py an den Ingest-Endpunkt)
+WIRE_FORMAT = os.getenv("SENSOR_WIRE_FORMAT", "json").strip().lower()
+SENSOR_INGEST_PATH = "/sensor-ingest/measurements"
 
 DIRECTUS_URL = os.getenv("DIRECTUS_URL", "http://flower-pi-directus:8055").rstrip("/")
 DIRECTUS_URL = "https://127.0.0.1/flower-pi/api"
@@ -28,14 +111,19 @@ DIRECTUS_VERIFY_TLS = os.getenv("DIRECTUS_VERIFY_TLS", "false").strip().lower()
     "yes",
     "on",
 }
+# Mehrere Kanäle/ADS1115 als JSON-Liste, siehe acquisition.py. Ohne Angabe: Kanal 0 an 0x48.
+SENSOR_CHANNELS = os.getenv("SENSOR_CHANNELS", "")
+DIRECTUS_PLANT_ID = os.getenv("DIRECTUS_PLANT_ID") or None
+# Lokales Ingest-Gateway (ingest_gateway.py): Ist es gesetzt, senden die Sensoren dorthin statt direkt an
+# Directus, ohne eigenen Login. SENSOR_GATEWAY_TOKEN muss zum Token des Gateways passen (leer = ohne).
+SENSOR_GATEWAY_URL = os.getenv("SENSOR_GATEWAY_URL", "").strip().rstrip("/")
+SENSOR_GATEWAY_TOKEN = os.getenv("SENSOR_GATEWAY_TOKEN", "")
+# Wiedergabe einer aufgezeichneten Messreihe (CSV oder History-Ringdateien, siehe replay_source.py) statt der
+# ADS1115, auf einer virtuellen Uhr mit SENSOR_REPLAY_SPEED-facher Geschwindigkeit (0 = ohne Warten).
+SENSOR_REPLAY_PATH = os.getenv("SENSOR_REPLAY_PATH", "").strip()
+SENSOR_REPLAY_SPEED = float(os.getenv("SENSOR_REPLAY_SPEED", "1000"))
 SENSOR_DEBUG = os.getenv("SENSOR_DEBUG", "false").strip().lower() in {"1", "true", "yes", "on"}
 
-# Token and timing state
-_DIRECTUS_TOKEN: Optional[str] = None
-_DIRECTUS_TOKEN_EXPIRES_AT: Optional[float] = None
-# Zeitpunkt, an dem das Token angefragt/erhalten wurde. Wir erneuern das Token spätestens alle 30 Minuten.
-_DIRECTUS_TOKEN_ACQUIRED_AT: Optional[float] = None
-
 
 def log(message: str, *args, **kwargs) -> None:
     """Loggt eine Nachricht mit der aktuellen lokalen Zeit vorangestellt.
@@ -49,134 +137,508 @@ def log(message: str, *args, **kwargs) -> None:
 # Ersetze die statische Start-Print-Ausgabe durch log
 log("Starting sensor measurement script...")
 
-
-def moisture_percent(voltage: float, v_dry: float, v_wet: float) -> float:
-    value = (v_dry - voltage) / (v_dry - v_wet) * 100
-    return max(0.0, min(100.0, value))
-
-
-def read_sample(channel) -> Tuple[float, float]:
-    voltage = channel.voltage
-    moisture = moisture_percent(voltage, V_DRY, V_WET)
-    return voltage, moisture
+METRICS = MetricsRegistry()
+READ_SECONDS = METRICS.histogram("flowerpi_sensor_read_seconds", "Duration of one read of all ADC channels.")
+AGGREGATE_SECONDS = METRICS.histogram(
+    "flowerpi_sensor_aggregate_seconds", "Duration of building the window statistics of all channels."
+)
+UPLOAD_SECONDS = METRICS.histogram(
+    "flowerpi_sensor_upload_seconds", "Duration of uploading one batch of measurements, including fallbacks."
+)
+LOGIN_SECONDS = METRICS.histogram("flowerpi_sensor_login_seconds", "Duration of Directus logins.")
+UPLOAD_FAILURES = METRICS.counter(
+    "flowerpi_sensor_upload_failures_total", "Measurements that could not be uploaded."
+)
+UPLOAD_REJECTED = METRICS.counter(
+    "flowerpi_sensor_upload_rejected_total", "Measurements dropped because Directus rejected them permanently (4xx)."
+)
+SAMPLES_TOTAL = METRICS.counter("flowerpi_sensor_samples_total", "ADC readings taken over all channels.")
+HTTP_RETRIES = METRICS.counter(
+    "flowerpi_sensor_http_retries_total", "Directus requests retried after connection errors, 502/503 or 401."
+)
 
 
-def read_sample_debug() -> Tuple[float, float]:
-    voltage = random.uniform(min(V_DRY, V_WET), max(V_DRY, V_WET))
-    moisture = moisture_percent(voltage, V_DRY, V_WET)
-    return voltage, moisture
+def observe_directus_request(method: str, path: str, status: int, seconds: float, retries: int) -> None:
+    if path == "/auth/login":
+        LOGIN_SECONDS.observe(seconds)
+    elif status == 401:
+        # DirectusClient.request() wiederholt nach einem 401 einmal mit neuem Token.
+        retries += 1
+    if retries:
+        HTTP_RETRIES.inc(retries)
+
+
+# Gemeinsame, gepoolte Verbindung zu Directus (bzw. zum Gateway) inkl. Token-Verwaltung.
+DIRECTUS_CLIENT = DirectusClient(
+    SENSOR_GATEWAY_URL or DIRECTUS_URL,
+    ADMIN_EMAIL,
+    ADMIN_PASSWORD,
+    verify_tls=DIRECTUS_VERIFY_TLS,
+    timeout=20,
+    log=log,
+    on_request=observe_directus_request,
+    static_token=SENSOR_GATEWAY_TOKEN if SENSOR_GATEWAY_URL else None,
+)
+METRICS.counter(
+    "flowerpi_sensor_token_refreshes_total", "Directus logins, including token refreshes.",
+    func=lambda: DIRECTUS_CLIENT.login_count,
+)
 
 
-def build_window_stats(samples: Deque[Tuple[float, float, float]]) -> Dict[str, float]:
-    voltages = [sample[1] for sample in samples]
-    moistures = [sample[2] for sample in samples]
-    return {
-        "voltage_avg": mean(voltages),
-        "voltage_min": min(voltages),
-        "voltage_max": max(voltages),
-        "moisture_avg": mean(moistures),
-        "samples": len(samples),
-    }
+def build_window_stats(aggregator: WindowAggregator) -> Dict[str, float]:
+    return aggregator.stats()
 
 
 def login_directus() -> str:
     if not ADMIN_EMAIL or not ADMIN_PASSWORD:
         raise RuntimeError("ADMIN_EMAIL/ADMIN_PASSWORD must be set for Directus login.")
-
-    url = f"{DIRECTUS_URL}/auth/login"
-    payload = {"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD}
-    response = requests.post(url, json=payload, timeout=20, verify=DIRECTUS_VERIFY_TLS)
-    response.raise_for_status()
-    data = response.json().get("data", {})
-    token = data.get("access_token")
-    if not token:
-        raise RuntimeError("Directus login failed: missing access_token.")
-    expires = data.get("expires")
-    if isinstance(expires, (int, float)):
-        global _DIRECTUS_TOKEN_EXPIRES_AT
-        _DIRECTUS_TOKEN_EXPIRES_AT = time.time() + float(expires) - 30
-    # Set the acquisition time so we can force refresh after a max age (30 minutes)
-    global _DIRECTUS_TOKEN_ACQUIRED_AT
-    _DIRECTUS_TOKEN_ACQUIRED_AT = time.time()
-    return token
+    return DIRECTUS_CLIENT.login()
 
 
 def get_directus_token() -> str:
-    global _DIRECTUS_TOKEN
-    # Wenn wir bereits ein Token haben, prüfen wir auf Ablaufbedingungen.
-    if _DIRECTUS_TOKEN:
-        now = time.time()
-        # 1) Falls der Server eine Ablaufzeit zurückgegeben hat und sie erreicht ist, erneuern.
-        if _DIRECTUS_TOKEN_EXPIRES_AT is not None and now >= _DIRECTUS_TOKEN_EXPIRES_AT:
-            log("Directus token abgelaufen laut Server. Erneuere Token.")
-            _DIRECTUS_TOKEN = login_directus()
-            return _DIRECTUS_TOKEN
-        # 2) Falls das Token älter oder gleich 30 Minuten ist, erneuern wir proaktiv.
-        if _DIRECTUS_TOKEN_ACQUIRED_AT is not None and (now - _DIRECTUS_TOKEN_ACQUIRED_AT) >= 30 * 60:
-            log("Directus token ist 30 Minuten alt. Erneuere Token proaktiv.")
-            _DIRECTUS_TOKEN = login_directus()
-            return _DIRECTUS_TOKEN
-        # Sonst: gültiges Token verwenden
-        return _DIRECTUS_TOKEN
-    # Kein Token vorhanden -> neu einloggen
-    _DIRECTUS_TOKEN = login_directus()
-    return _DIRECTUS_TOKEN
+    # Erneuert das Token, wenn der Server-Ablauf erreicht oder es 30 Minuten alt ist.
+    return DIRECTUS_CLIENT.get_token()
+
+
+# Antworten, mit denen Gateway oder Proxy Last abwehren.
+BACKPRESSURE_STATUS_CODES = (429, 503)
+
+
+def post_measurements(payloads: List[dict]) -> requests.Response:
+    """Sendet die Payloads in einem Request, je nach ``SENSOR_WIRE_FORMAT`` als JSON oder binär."""
+    if WIRE_FORMAT == "binary":
+        try:
+            body = encode_measurements(payloads)
+        except ValueError as exc:
+            log(f"Measurements do not fit the binary format ({exc}), sending JSON instead.")
+        else:
+            return DIRECTUS_CLIENT.request("POST", SENSOR_INGEST_PATH, body, content_type=WIRE_CONTENT_TYPE)
+    return DIRECTUS_CLIENT.create_items(DIRECTUS_COLLECTION, payloads if len(payloads) > 1 else payloads[0])
 
 
 def upload_measurement(payload: dict) -> None:
-    token = get_directus_token()
-    url = f"{DIRECTUS_URL}/items/{DIRECTUS_COLLECTION}"
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.post(
-        url, json=payload, headers=headers, timeout=20, verify=DIRECTUS_VERIFY_TLS
-    )
+    response = post_measurements([payload])
+    if is_duplicate_response(response):
+        # Bereits bei einem früheren Versuch gespeichert (z.B. Antwort ging verloren).
+        log(f"Measurement {payload.get(DEDUPE_KEY_FIELD)} already stored, skipping.")
+        return
     response.raise_for_status()
 
 
+def upload_measurements(payloads: List[dict]) -> List[dict]:
+    """Lädt mehrere Messungen mit einem einzigen Array-POST hoch.
+
+    Lehnt Directus den Batch ab (HTTP-Fehler), werden die Payloads einzeln gesendet, damit
+    ein fehlerhafter Eintrag nicht den ganzen Batch verwirft. Gibt die Payloads zurück,
+    die nicht hochgeladen werden konnten und erneut gesendet werden sollen; dauerhaft
+    abgelehnte Payloads (4xx außer 401/429) werden verworfen statt gespoolt.
+    """
+    if not payloads:
+        return []
+    with UPLOAD_SECONDS.time():
+        failed = _upload_measurements(payloads)
+    UPLOAD_FAILURES.inc(len(failed))
+    return failed
+
+
+def _upload_single(payload: dict) -> List[dict]:
+    try:
+        upload_measurement(payload)
+        return []
+    except requests.HTTPError as exc:
+        if exc.response is not None and not is_retryable_status(exc.response.status_code):
+            # Erneutes Senden würde genauso abgelehnt und den Spool blockieren.
+            log(f"Measurement rejected permanently, dropping it: {exc}. Payload: {payload}")
+            UPLOAD_REJECTED.inc()
+            return []
+        log(f"Failed to upload measurement: {exc}. Payload: {payload}")
+    except Exception as exc:
+        log(f"Failed to upload measurement: {exc}. Payload: {payload}")
+    return [payload]
+
+
+def _upload_measurements(payloads: List[dict]) -> List[dict]:
+    if len(payloads) == 1:
+        return _upload_single(payloads[0])
+
+    try:
+        response = post_measurements(payloads)
+        response.raise_for_status()
+        return []
+    except requests.HTTPError as exc:
+        if exc.response is not None and exc.response.status_code in BACKPRESSURE_STATUS_CODES:
+            # Gateway/Directus überlastet: nicht einzeln nachsenden, sondern später aus dem Spool.
+            log(f"Batch upload of {len(payloads)} measurements deferred: {exc}")
+            return list(payloads)
+        log(f"Batch upload of {len(payloads)} measurements rejected: {exc}. Falling back to single uploads.")
+    except Exception as exc:
+        log(f"Failed to upload batch of {len(payloads)} measurements: {exc}")
+        return list(payloads)
+
+    failed: List[dict] = []
+    for payload in payloads:
+        failed.extend(_upload_single(payload))
+    return failed
+
+
+class MeasurementBatcher:
+    """Sammelt Fenster (je ein Payload pro Kanal), bis die Batch-Größe oder die Linger-Zeit erreicht ist."""
+
+    def __init__(self, batch_size: int, linger_seconds: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.batch_size = batch_size
+        self.linger_seconds = linger_seconds
+        self.clock = clock
+        self._payloads: List[dict] = []
+        self._windows = 0
+        self._first_added_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return self._windows
+
+    @property
+    def first_added_at(self) -> Optional[float]:
+        """Monotoner Zeitpunkt des ältesten Fensters im Batch."""
+        return self._first_added_at
+
+    def add(self, payloads: List[dict]) -> None:
+        """Fügt die Payloads eines Fensters hinzu."""
+        if not self._windows:
+            self._first_added_at = self.clock()
+        self._payloads.extend(payloads)
+        self._windows += 1
+
+    def is_due(self) -> bool:
+        if not self._windows:
+            return False
+        if self._windows >= self.batch_size:
+            return True
+        return self.clock() - self._first_added_at >= self.linger_seconds
+
+    def take(self) -> List[dict]:
+        """Entnimmt alle gesammelten Payloads."""
+        payloads, self._payloads = self._payloads, []
+        self._windows = 0
+        self._first_added_at = None
+        return payloads
+
+
+class BackgroundUploader:
+    """Lädt Batches in einem eigenen Thread hoch, damit die Abtastung nie auf das Netzwerk wartet.
+
+    Ein einzelner Worker hält die Reihenfolge der Batches ein. Stehen bereits
+    ``max_pending`` Jobs aus (Directus langsam), wird der Batch direkt an ``on_failed``
+    übergeben (Spool) statt die Warteschlange im Speicher wachsen zu lassen.
+    """
+
+    def __init__(
+        self,
+        upload: Callable[[List[dict]], List[dict]],
+        on_failed: Callable[[List[dict]], None],
+        max_pending: int,
+    ) -> None:
+        self.upload = upload
+        self.on_failed = on_failed
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="uploader")
+        self._pending: Set[Future] = set()
+
+    @property
+    def pending_count(self) -> int:
+        return sum(1 for future in self._pending if not future.done())
+
+    def submit(self, payloads: List[dict]) -> bool:
+        self._pending = {future for future in self._pending if not future.done()}
+        if len(self._pending) >= self.max_pending:
+            log(f"{len(self._pending)} uploads still pending, spooling {len(payloads)} measurements instead.")
+            self.on_failed(payloads)
+            return False
+        self._pending.add(self._executor.submit(self._run, payloads))
+        return True
+
+    def close(self) -> None:
+        """Wartet, bis alle ausstehenden Uploads fertig sind."""
+        self._executor.shutdown(wait=True)
+
+    def _run(self, payloads: List[dict]) -> None:
+        try:
+            failed = self.upload(payloads)
+        except Exception as exc:
+            log(f"Failed to upload {len(payloads)} measurements: {exc}")
+            failed = payloads
+        uploaded = len(payloads) - len(failed)
+        if uploaded:
+            log(f"Uploaded {uploaded} of {len(payloads)} measurements.")
+        self.on_failed(failed)
+
+
+def build_payload(config: ChannelConfig, measurements: Dict[str, float], measured_at: str) -> dict:
+    payload = {
+        "measured_at": measured_at,
+        "moisture_percentage": round(measurements["moisture_avg"], 1),
+        "voltage_current": round(measurements["voltage_avg"], 3),
+        "voltage_min": round(measurements["voltage_min"], 3),
+        "voltage_max": round(measurements["voltage_max"], 3),
+        "voltage_stddev": round(measurements["voltage_stddev"], 4),
+        "moisture_stddev": round(measurements["moisture_stddev"], 2),
+        "status": "published",
+        DEDUPE_KEY_FIELD: uuid.uuid4().hex,
+    }
+    if measurements.get("moisture_median") is not None:
+        payload["moisture_median"] = round(measurements["moisture_median"], 1)
+        payload["voltage_median"] = round(measurements["voltage_median"], 3)
+    if config.plant:
+        payload["plant"] = config.plant
+    return payload
+
+
+def open_history_store(path: str = HISTORY_PATH) -> Optional[TimeSeriesStore]:
+    if not path:
+        return None
+    raw_capacity = math.ceil(HISTORY_RAW_HOURS * 3600 / SAMPLE_INTERVAL_SECONDS) * ADC_BURST_SAMPLES
+    tier_capacities = {
+        "minute": math.ceil(HISTORY_MINUTE_DAYS * 24 * 60),
+        "hour": math.ceil(HISTORY_HOUR_DAYS * 24),
+        "day": math.ceil(HISTORY_DAY_DAYS),
+    }
+    log(f"Keeping local history in {path} ({raw_capacity} raw samples per channel).")
+    return TimeSeriesStore(path, raw_capacity, tier_capacities)
+
+
+def open_replay_source() -> Optional[ReplaySampleSource]:
+    if not SENSOR_REPLAY_PATH:
+        return None
+    source = ReplaySampleSource.from_path(SENSOR_REPLAY_PATH, SENSOR_REPLAY_SPEED)
+    log(
+        f"Replaying {SENSOR_REPLAY_PATH} at {f'{SENSOR_REPLAY_SPEED:g}x' if SENSOR_REPLAY_SPEED else 'maximum'} speed: "
+        f"{dt.datetime.fromtimestamp(source.start_time, dt.timezone.utc).isoformat()} - "
+        f"{dt.datetime.fromtimestamp(source.end_time, dt.timezone.utc).isoformat()}"
+    )
+    return source
+
+
+def open_engine(source: Optional[ReplaySampleSource] = None) -> AcquisitionEngine:
+    if source is not None and not SENSOR_CHANNELS.strip():
+        channel_configs = configs_for_trace(source.traces, V_DRY, V_WET, DIRECTUS_PLANT_ID)
+    else:
+        channel_configs = parse_channel_configs(SENSOR_CHANNELS, V_DRY, V_WET, DIRECTUS_PLANT_ID)
+    if source is not None:
+        source.check_channels(channel_configs)
+    engine = AcquisitionEngine(
+        channel_configs,
+        debug=SENSOR_DEBUG,
+        mode=ADC_MODE,
+        data_rate=ADC_DATA_RATE,
+        burst_samples=ADC_BURST_SAMPLES,
+        calibrations=load_calibrations(CALIBRATION_PATH),
+        temperature=SENSOR_TEMPERATURE_CELSIUS,
+        source=source,
+    )
+    log(
+        f"Measuring {len(channel_configs)} channels: {', '.join(config.key for config in channel_configs)} "
+        f"(source {engine.source.name}, ADC mode {engine.mode}, data rate {engine.data_rate or 'default'}, "
+        f"burst {engine.burst_samples})"
+    )
+    if engine.calibrated_keys:
+        log(f"Using calibration curves from {CALIBRATION_PATH} for {', '.join(engine.calibrated_keys)}")
+    return engine
+
+
+def replay_storage_paths() -> Tuple[str, str]:
+    """Spool- und History-Pfad für die Wiedergabe.
+
+    Ohne ausdrückliches ``SENSOR_SPOOL_PATH``/``SENSOR_HISTORY_PATH`` liegen beide in einem temporären
+    Verzeichnis, damit die wiedergegebenen Messungen weder die echte Historie überschreiben noch im Spool
+    des Geräts landen.
+    """
+    spool_path, history_path = SPOOL_PATH, HISTORY_PATH
+    if "SENSOR_SPOOL_PATH" in os.environ and "SENSOR_HISTORY_PATH" in os.environ:
+        return spool_path, history_path
+    directory = tempfile.mkdtemp(prefix="sensor-replay-")
+    if "SENSOR_SPOOL_PATH" not in os.environ:
+        spool_path = os.path.join(directory, "sensor_spool.sqlite3")
+    if "SENSOR_HISTORY_PATH" not in os.environ:
+        history_path = os.path.join(directory, "history")
+    log(f"Replay keeps its spool in {spool_path} and its history in {history_path or '(disabled)'}.")
+    return spool_path, history_path
+
+
+def open_spool(path: str = SPOOL_PATH) -> Tuple[OfflineSpool, Callable[[List[dict]], None]]:
+    """Öffnet den Offline-Spool, startet den Drainer und liefert eine Funktion zum Spoolen."""
+    spool = OfflineSpool(path)
+    drainer = SpoolDrainer(
+        spool,
+        upload_measurements,
+        log,
+        batch_size=SPOOL_DRAIN_BATCH_SIZE,
+        backoff_max_seconds=SPOOL_BACKOFF_MAX_SECONDS,
+    )
+    drainer.start()
+    if len(spool):
+        log(f"Found {len(spool)} spooled measurements from a previous run.")
+
+    def spool_failed(failed: List[dict]) -> None:
+        if failed:
+            spool.append(failed)
+            log(f"Spooled {len(failed)} measurements to {path} ({len(spool)} pending).")
+            drainer.wake()
+
+    return spool, spool_failed
+
+
+def close_window(
+    channel_configs: List[ChannelConfig],
+    aggregators: Dict[str, WindowAggregator],
+    deadband: DeadbandFilter,
+    wall_time: Callable[[], float] = time.time,
+) -> List[dict]:
+    """Baut die Payloads aller Kanäle für das abgelaufene Fenster und setzt die Aggregatoren zurück."""
+    measured_at = dt.datetime.fromtimestamp(wall_time(), dt.timezone.utc).isoformat()
+    payloads = []
+    for config in channel_configs:
+        aggregator = aggregators[config.key]
+        if not len(aggregator):
+            continue
+        with AGGREGATE_SECONDS.time():
+            measurements = build_window_stats(aggregator)
+        aggregator.reset()
+        suppressed = deadband.check(config.key, measurements["moisture_avg"])
+        if suppressed is None:
+            continue
+        payload = build_payload(config, measurements, measured_at)
+        if deadband.enabled:
+            payload["suppressed_windows"] = suppressed
+        payloads.append(payload)
+    return payloads
+
+
+def open_adaptive_sampler(clock: Callable[[], float] = time.monotonic) -> Optional[AdaptiveSampler]:
+    if SAMPLING_MODE != "adaptive":
+        return None
+    log(
+        f"Adaptive sampling: {SAMPLE_INTERVAL_SECONDS}-{ADAPTIVE_MAX_INTERVAL_SECONDS} s, "
+        f"threshold {ADAPTIVE_RATE_THRESHOLD} %/min, window {ADAPTIVE_ACTIVE_WINDOW_SECONDS} s while changing, "
+        f"{ADAPTIVE_CALM_WINDOW_SECONDS} s otherwise."
+    )
+    return AdaptiveSampler(
+        min_interval=SAMPLE_INTERVAL_SECONDS,
+        max_interval=max(SAMPLE_INTERVAL_SECONDS, ADAPTIVE_MAX_INTERVAL_SECONDS),
+        rate_threshold=ADAPTIVE_RATE_THRESHOLD,
+        window_seconds=ADAPTIVE_CALM_WINDOW_SECONDS,
+        active_window_seconds=ADAPTIVE_ACTIVE_WINDOW_SECONDS,
+        hold_seconds=ADAPTIVE_HOLD_SECONDS,
+        backoff_factor=ADAPTIVE_BACKOFF_FACTOR,
+        clock=clock,
+    )
+
+
+def log_sampling_stats(
+    scheduler_stats: Dict[str, float], engine: AcquisitionEngine, sampler: Optional[AdaptiveSampler] = None
+) -> None:
+    log(
+        f"Sampling: {scheduler_stats['ticks']} ticks, {scheduler_stats['missed_ticks']} missed, "
+        f"jitter avg {scheduler_stats['jitter_avg_ms']:.1f} ms / max {scheduler_stats['jitter_max_ms']:.1f} ms"
+    )
+    if sampler is not None:
+        adaptive = sampler.take_stats()
+        log(
+            f"Adaptive: {adaptive['ticks_active']} active / {adaptive['ticks_calm']} calm ticks, "
+            f"max change {adaptive['max_rate_per_minute']:.2f} %/min, "
+            f"interval {adaptive['interval_seconds']:.1f} s, window {adaptive['window_seconds']:.0f} s"
+        )
+    rate = engine.take_rate_stats()
+    log(
+        f"ADC: {rate['samples']} samples, {rate['samples_per_second']:.1f} samples/s overall, "
+        f"{rate['burst_samples_per_second']:.1f} samples/s while reading"
+    )
+
+
+def run_agent(
+    engine: AcquisitionEngine,
+    scheduler: MonotonicScheduler,
+    deadband: DeadbandFilter,
+    batcher: MeasurementBatcher,
+    uploader: BackgroundUploader,
+    history: Optional[TimeSeriesStore] = None,
+    sampler: Optional[AdaptiveSampler] = None,
+    clock=time,
+    keep_running: Callable[[], bool] = lambda: True,
+) -> None:
+    """Abtast-, Fenster- und Upload-Schleife.
+
+    ``clock`` liefert ``monotonic()`` und ``time()``: das Modul ``time`` oder eine ``VirtualClock`` für die
+    Wiedergabe. Scheduler, Deadband, Batcher und Sampler müssen mit derselben Uhr erzeugt sein.
+    """
+    channel_configs = engine.configs
+    aggregators = {config.key: WindowAggregator(PERCENTILE_BUFFER_SIZE) for config in channel_configs}
+
+    window_started_at = clock.monotonic()
+    while keep_running():
+        tick = scheduler.wait_next()
+        timestamp = clock.time()
+        with READ_SECONDS.time():
+            readings = engine.read_all()
+        SAMPLES_TOTAL.inc(len(readings))
+        for config, voltage, moisture in readings:
+            aggregators[config.key].add(voltage, moisture)
+            if history is not None:
+                history.add(config.key, timestamp, voltage, moisture)
+        if sampler is not None:
+            scheduler.set_interval(sampler.update((config.key, moisture) for config, _, moisture in readings))
+
+        window_seconds = sampler.window_seconds if sampler is not None else AVERAGE_WINDOW_SECONDS
+        if tick - window_started_at >= window_seconds:
+            if history is not None:
+                history.flush()
+            payloads = close_window(channel_configs, aggregators, deadband, clock.time)
+            if payloads:
+                batcher.add(payloads)
+                log(f"Queued window ({len(batcher)}/{UPLOAD_BATCH_SIZE}): {payloads}")
+            else:
+                log("Window unchanged within deadband, nothing to upload.")
+            window_started_at = tick
+            log_sampling_stats(scheduler.take_stats(), engine, sampler)
+
+        # Während Änderungen wartet kein Fenster auf den Rest des Batches
+        if batcher.is_due() or (sampler is not None and sampler.active and len(batcher)):
+            uploader.submit(batcher.take())
+
+    # Ende der Wiedergabe: angefangenen Batch noch senden
+    if len(batcher):
+        uploader.submit(batcher.take())
+    uploader.close()
+
+
 def main() -> None:
-    channel = None
-    if not SENSOR_DEBUG:
-        import board
-        import busio
-        import adafruit_ads1x15.ads1115 as ADS
-        from adafruit_ads1x15.analog_in import AnalogIn
-
-        i2c = busio.I2C(board.SCL, board.SDA)
-        ads = ADS.ADS1115(i2c)
-        ads.gain = 1
-        channel = AnalogIn(ads, 0)
-
-    samples: Deque[Tuple[float, float, float]] = deque()
-    window_started_at = time.time()
-    while True:
-        timestamp = time.time()
-        if SENSOR_DEBUG:
-            voltage, moisture = read_sample_debug()
-        else:
-            voltage, moisture = read_sample(channel)
-        samples.append((timestamp, voltage, moisture))
-
-        if timestamp - window_started_at >= AVERAGE_WINDOW_SECONDS and samples:
-            measurements = build_window_stats(samples)
-            payload = {
-                "measured_at": dt.datetime.now(dt.timezone.utc).isoformat(),
-                "moisture_percentage": round(measurements["moisture_avg"], 1),
-                "voltage_current": round(measurements["voltage_avg"], 3),
-                "voltage_min": round(measurements["voltage_min"], 3),
-                "voltage_max": round(measurements["voltage_max"], 3),
-                "status": "published",
-            }
-
-            try:
-                upload_measurement(payload)
-                log(f"Uploaded measurement: {payload}")
-            except Exception as exc:
-                log(f"Failed to upload measurement: {exc}. Payload: {payload}")
-            samples.clear()
-            window_started_at = time.time()
-
-        log(f"Sleep for {SAMPLE_INTERVAL_SECONDS} seconds...")
-        time.sleep(SAMPLE_INTERVAL_SECONDS)
+    source = open_replay_source()
+    clock = source.clock if source is not None else time
+    engine = open_engine(source)
+    spool_path, history_path = replay_storage_paths() if source is not None else (SPOOL_PATH, HISTORY_PATH)
+    spool, spool_failed = open_spool(spool_path)
+
+    deadband = DeadbandFilter(REPORT_DEADBAND_PERCENT, REPORT_HEARTBEAT_SECONDS, clock=clock.monotonic)
+    history = open_history_store(history_path)
+    batcher = MeasurementBatcher(UPLOAD_BATCH_SIZE, UPLOAD_BATCH_LINGER_SECONDS, clock=clock.monotonic)
+    uploader = BackgroundUploader(upload_measurements, spool_failed, UPLOAD_MAX_PENDING)
+    scheduler = MonotonicScheduler(SAMPLE_INTERVAL_SECONDS, clock=clock.monotonic, sleep=clock.sleep)
+    sampler = open_adaptive_sampler(clock.monotonic)
+
+    METRICS.counter(
+        "flowerpi_sensor_missed_ticks_total", "Sampling ticks skipped because an iteration overran.",
+        func=lambda: scheduler.missed_ticks_total,
+    )
+    METRICS.gauge("flowerpi_sensor_spool_depth", "Measurements waiting in the offline spool.", func=lambda: len(spool))
+    METRICS.gauge("flowerpi_sensor_batch_depth", "Windows waiting in the upload batch.", func=lambda: len(batcher))
+    METRICS.gauge(
+        "flowerpi_sensor_pending_uploads", "Upload jobs queued or running.", func=lambda: uploader.pending_count
+    )
+    if METRICS_PORT:
+        start_metrics_server(METRICS, METRICS_PORT, METRICS_HOST)
+        log(f"Serving metrics on {METRICS_HOST}:{METRICS_PORT} at /metrics")
+
+    keep_running = (lambda: not source.finished) if source is not None else (lambda: True)
+    run_agent(engine, scheduler, deadband, batcher, uploader, history, sampler, clock, keep_running)
+    if source is not None:
+        log(f"Replay finished, {len(spool)} measurements left in the spool.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Sensor-Agent auf Basis von asyncio.
+
+Abtasten, Aggregieren, Upload und Token-Erneuerung laufen als eigene Tasks in einer
+Event-Loop und sind über begrenzte ``asyncio.Queue``s verbunden:
+
+* ``sample`` liest die ADCs zu festen Deadlines in einem eigenen Lese-Thread,
+* ``aggregate`` führt die Fenster-Statistik und die lokale Historie und schließt die Fenster,
+* ``upload`` sammelt Fenster zu Batches und lädt sie hoch (blockierende HTTP-Aufrufe im Thread),
+* ``token`` erneuert das Directus-Token kurz vor Ablauf, damit kein Upload auf einen Login wartet.
+
+Ist eine Queue voll, wartet keine Stufe auf die nächste: Messungen werden verworfen und
+gezählt, fertige Fenster landen direkt im Offline-Spool. Konfiguration und Payloads sind
+dieselben wie bei ``measure_and_upload.py``, mit Ausnahme der adaptiven Abtastung
+(``SENSOR_SAMPLING_MODE=adaptive``) und der Wiedergabe (``SENSOR_REPLAY_PATH``). Diese gibt es nur im
+synchronen Agenten; ist eine davon gesetzt, bricht dieser Agent beim Start ab.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from acquisition import AcquisitionEngine, ChannelConfig
+from deadband_filter import DeadbandFilter
+from measure_and_upload import (
+    AVERAGE_WINDOW_SECONDS,
+    DIRECTUS_CLIENT,
+    METRICS,
+    METRICS_HOST,
+    METRICS_PORT,
+    PERCENTILE_BUFFER_SIZE,
+    READ_SECONDS,
+    REPORT_DEADBAND_PERCENT,
+    REPORT_HEARTBEAT_SECONDS,
+    SAMPLE_INTERVAL_SECONDS,
+    SAMPLES_TOTAL,
+    SAMPLING_MODE,
+    SENSOR_REPLAY_PATH,
+    UPLOAD_BATCH_LINGER_SECONDS,
+    UPLOAD_BATCH_SIZE,
+    MeasurementBatcher,
+    close_window,
+    log,
+    log_sampling_stats,
+    open_engine,
+    open_history_store,
+    open_spool,
+    upload_measurements,
+)
+from metrics import start_metrics_server
+from sampling_scheduler import MonotonicScheduler
+from timeseries_store import TimeSeriesStore
+from window_stats import WindowAggregator
+
+# Ticks, die zwischen Abtastung und Aggregation gepuffert werden.
+READINGS_QUEUE_SIZE = max(1, int(os.getenv("SENSOR_READINGS_QUEUE_SIZE", "64")))
+# Fertige Fenster, die auf den Upload warten, bevor sie in den Spool gehen.
+UPLOAD_QUEUE_SIZE = max(1, int(os.getenv("SENSOR_UPLOAD_QUEUE_SIZE", "16")))
+# So viele Sekunden vor dem Ablauf wird das Token erneuert.
+TOKEN_REFRESH_LEAD_SECONDS = float(os.getenv("SENSOR_TOKEN_REFRESH_LEAD_SECONDS", "60"))
+TOKEN_REFRESH_RETRY_MAX_SECONDS = 300
+
+DROPPED_READINGS = METRICS.counter(
+    "flowerpi_sensor_dropped_readings_total", "ADC readings dropped because the aggregation queue was full."
+)
+
+
+async def sample(
+    engine: AcquisitionEngine,
+    scheduler: MonotonicScheduler,
+    readings: asyncio.Queue,
+    read_executor: ThreadPoolExecutor,
+) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(scheduler.seconds_until_next())
+        tick = scheduler.advance()
+        timestamp = time.time()
+        started = time.perf_counter()
+        # Der I²C-Zugriff blockiert (im Burst-Modus mehrere Millisekunden) und läuft daher im Thread.
+        batch = await loop.run_in_executor(read_executor, engine.read_all)
+        READ_SECONDS.observe(time.perf_counter() - started)
+        SAMPLES_TOTAL.inc(len(batch))
+        try:
+            readings.put_nowait((tick, timestamp, batch))
+        except asyncio.QueueFull:
+            DROPPED_READINGS.inc(len(batch))
+            log(f"Aggregation is falling behind, dropped {len(batch)} readings.")
+
+
+async def aggregate(
+    engine: AcquisitionEngine,
+    scheduler: MonotonicScheduler,
+    readings: asyncio.Queue,
+    windows: asyncio.Queue,
+    history: Optional[TimeSeriesStore],
+    spool_failed: Callable[[List[dict]], None],
+) -> None:
+    channel_configs: List[ChannelConfig] = engine.configs
+    aggregators: Dict[str, WindowAggregator] = {
+        config.key: WindowAggregator(PERCENTILE_BUFFER_SIZE) for config in channel_configs
+    }
+    deadband = DeadbandFilter(REPORT_DEADBAND_PERCENT, REPORT_HEARTBEAT_SECONDS)
+    window_started_at: Optional[float] = None
+    while True:
+        tick, timestamp, batch = await readings.get()
+        if window_started_at is None:
+            window_started_at = tick
+        for config, voltage, moisture in batch:
+            aggregators[config.key].add(voltage, moisture)
+            if history is not None:
+                history.add(config.key, timestamp, voltage, moisture)
+
+        if tick - window_started_at < AVERAGE_WINDOW_SECONDS:
+            continue
+        if history is not None:
+            history.flush()
+        payloads = close_window(channel_configs, aggregators, deadband)
+        window_started_at = tick
+        log_sampling_stats(scheduler.take_stats(), engine)
+        if not payloads:
+            log("Window unchanged within deadband, nothing to upload.")
+            continue
+        try:
+            windows.put_nowait(payloads)
+            log(f"Queued window ({windows.qsize()} waiting): {payloads}")
+        except asyncio.QueueFull:
+            log(f"{windows.qsize()} windows already waiting for upload, spooling this one instead.")
+            spool_failed(payloads)
+
+
+async def upload(windows: asyncio.Queue, spool_failed: Callable[[List[dict]], None]) -> None:
+    batcher = MeasurementBatcher(UPLOAD_BATCH_SIZE, UPLOAD_BATCH_LINGER_SECONDS)
+    METRICS.gauge("flowerpi_sensor_batch_depth", "Windows waiting in the upload batch.", func=lambda: len(batcher))
+    while True:
+        if len(batcher):
+            # Nur so lange auf weitere Fenster warten, wie die Linger-Zeit noch erlaubt.
+            timeout = max(0.0, batcher.linger_seconds - (time.monotonic() - batcher.first_added_at))
+            try:
+                batcher.add(await asyncio.wait_for(windows.get(), timeout))
+            except asyncio.TimeoutError:
+                pass
+        else:
+            batcher.add(await windows.get())
+
+        if not batcher.is_due():
+            continue
+        payloads = batcher.take()
+        try:
+            failed = await asyncio.to_thread(upload_measurements, payloads)
+        except Exception as exc:
+            log(f"Failed to upload {len(payloads)} measurements: {exc}")
+            failed = payloads
+        uploaded = len(payloads) - len(failed)
+        if uploaded:
+            log(f"Uploaded {uploaded} of {len(payloads)} measurements.")
+        spool_failed(failed)
+
+
+async def refresh_token() -> None:
+    """Erneuert das Token vor Ablauf, statt den nächsten Upload mit dem Login zu belasten."""
+    retry_seconds = 5.0
+    while True:
+        due_at = DIRECTUS_CLIENT.refresh_due_at()
+        if due_at is not None:
+            await asyncio.sleep(max(0.0, due_at - TOKEN_REFRESH_LEAD_SECONDS - time.time()))
+        try:
+            await asyncio.to_thread(DIRECTUS_CLIENT.refresh_token)
+            retry_seconds = 5.0
+        except Exception as exc:
+            log(f"Directus token refresh failed, retrying in {retry_seconds:.0f}s: {exc}")
+            await asyncio.sleep(retry_seconds)
+            retry_seconds = min(retry_seconds * 2, TOKEN_REFRESH_RETRY_MAX_SECONDS)
+
+
+def check_supported_settings() -> None:
+    """Bricht ab, wenn Einstellungen gesetzt sind, die nur ``measure_and_upload.py`` umsetzt."""
+    unsupported = []
+    if SAMPLING_MODE != "fixed":
+        unsupported.append(f"SENSOR_SAMPLING_MODE={SAMPLING_MODE}")
+    if SENSOR_REPLAY_PATH:
+        unsupported.append("SENSOR_REPLAY_PATH")
+    if unsupported:
+        raise SystemExit(
+            f"{', '.join(unsupported)} is not supported by measure_and_upload_async.py, use measure_and_upload.py."
+        )
+
+
+async def run() -> None:
+    check_supported_settings()
+    engine = open_engine()
+    spool, spool_failed = open_spool()
+    history = open_history_store()
+    scheduler = MonotonicScheduler(SAMPLE_INTERVAL_SECONDS)
+    readings: asyncio.Queue = asyncio.Queue(maxsize=READINGS_QUEUE_SIZE)
+    windows: asyncio.Queue = asyncio.Queue(maxsize=UPLOAD_QUEUE_SIZE)
+    read_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="adc")
+
+    METRICS.counter(
+        "flowerpi_sensor_missed_ticks_total", "Sampling ticks skipped because an iteration overran.",
+        func=lambda: scheduler.missed_ticks_total,
+    )
+    METRICS.gauge("flowerpi_sensor_spool_depth", "Measurements waiting in the offline spool.", func=lambda: len(spool))
+    METRICS.gauge(
+        "flowerpi_sensor_readings_queue_depth", "Ticks waiting for aggregation.", func=lambda: readings.qsize()
+    )
+    METRICS.gauge("flowerpi_sensor_upload_queue_depth", "Windows waiting for upload.", func=lambda: windows.qsize())
+    if METRICS_PORT:
+        start_metrics_server(METRICS, METRICS_PORT, METRICS_HOST)
+        log(f"Serving metrics on {METRICS_HOST}:{METRICS_PORT} at /metrics")
+
+    tasks = [
+        asyncio.create_task(sample(engine, scheduler, readings, read_executor), name="sample"),
+        asyncio.create_task(aggregate(engine, scheduler, readings, windows, history, spool_failed), name="aggregate"),
+        asyncio.create_task(upload(windows, spool_failed), name="upload"),
+    ]
+    if DIRECTUS_CLIENT.has_credentials and DIRECTUS_CLIENT.static_token is None:
+        tasks.append(asyncio.create_task(refresh_token(), name="token"))
+    # Endet ein Task mit einem Fehler, soll der Container neu starten statt still weiterzulaufen.
+    done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    for task in done:
+        task.result()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
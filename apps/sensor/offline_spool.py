@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Lokaler, dauerhafter Zwischenspeicher für Messungen, die nicht hochgeladen werden konnten.
+
+Die Payloads landen in einer SQLite-Datei (WAL-Modus) und werden von einem Hintergrund-Thread
+gebündelt erneut an Directus gesendet. Jeder Payload trägt einen ``dedupe_key``; derselbe
+Schlüssel wird nur einmal gespeichert und Directus verwirft doppelte Einträge über ein
+Unique-Feld, sodass ein erneutes Senden idempotent ist.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+DEDUPE_KEY_FIELD = "dedupe_key"
+
+
+class OfflineSpool:
+    """Append-only Warteschlange auf SQLite-Basis."""
+
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # Im WAL-Modus mit synchronous=NORMAL wird nicht bei jedem Commit gesynct;
+        # zusätzlich bündelt append() mehrere Payloads in einer Transaktion.
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS spool (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                dedupe_key TEXT NOT NULL UNIQUE,
+                payload TEXT NOT NULL,
+                spooled_at REAL NOT NULL
+            )
+            """
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def append(self, payloads: List[dict]) -> int:
+        """Speichert Payloads in einer Transaktion. Bereits vorhandene Schlüssel werden ignoriert."""
+        if not payloads:
+            return 0
+        now = time.time()
+        rows = [(payload[DEDUPE_KEY_FIELD], json.dumps(payload), now) for payload in payloads]
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                cursor = self._connection.executemany(
+                    "INSERT OR IGNORE INTO spool (dedupe_key, payload, spooled_at) VALUES (?, ?, ?)",
+                    rows,
+                )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+        return cursor.rowcount
+
+    def peek(self, limit: int) -> List[Tuple[str, dict]]:
+        """Liefert die ältesten ``limit`` Einträge, ohne sie zu entfernen."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT dedupe_key, payload FROM spool ORDER BY seq LIMIT ?", (limit,)
+            ).fetchall()
+        return [(key, json.loads(payload)) for key, payload in rows]
+
+    def remove(self, dedupe_keys: List[str]) -> None:
+        if not dedupe_keys:
+            return
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                self._connection.executemany(
+                    "DELETE FROM spool WHERE dedupe_key = ?", [(key,) for key in dedupe_keys]
+                )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class SpoolDrainer(threading.Thread):
+    """Sendet den Spool im Hintergrund in Batches erneut und wartet bei Fehlern exponentiell länger.
+
+    ``upload`` bekommt eine Liste von Payloads und gibt die Payloads zurück, die nicht
+    hochgeladen werden konnten (siehe ``upload_measurements``).
+    """
+
+    def __init__(
+        self,
+        spool: OfflineSpool,
+        upload: Callable[[List[dict]], List[dict]],
+        log: Callable[[str], None],
+        batch_size: int = 50,
+        idle_seconds: float = 30.0,
+        backoff_initial_seconds: float = 5.0,
+        backoff_max_seconds: float = 600.0,
+    ) -> None:
+        super().__init__(name="spool-drainer", daemon=True)
+        self.spool = spool
+        self.upload = upload
+        self.log = log
+        self.batch_size = batch_size
+        self.idle_seconds = idle_seconds
+        self.backoff_initial_seconds = backoff_initial_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    def wake(self) -> None:
+        """Weckt den Drainer, z.B. nachdem neue Payloads gespoolt wurden."""
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+
+    def _wait(self, seconds: float) -> None:
+        self._wakeup.wait(seconds)
+        self._wakeup.clear()
+
+    def drain_once(self) -> Optional[bool]:
+        """Sendet einen Batch. Gibt None zurück, wenn der Spool leer ist, sonst ob etwas hochgeladen wurde."""
+        entries = self.spool.peek(self.batch_size)
+        if not entries:
+            return None
+        failed = self.upload([payload for _, payload in entries])
+        failed_keys = {payload.get(DEDUPE_KEY_FIELD) for payload in failed}
+        uploaded_keys = [key for key, _ in entries if key not in failed_keys]
+        self.spool.remove(uploaded_keys)
+        if uploaded_keys:
+            self.log(f"Replayed {len(uploaded_keys)} spooled measurements, {len(self.spool)} remaining.")
+        return bool(uploaded_keys)
+
+    def run(self) -> None:
+        backoff: Optional[float] = None
+        while not self._stopped.is_set():
+            try:
+                progressed = self.drain_once()
+            except Exception as exc:
+                self.log(f"Spool replay failed: {exc}")
+                progressed = False
+
+            if progressed is None:
+                backoff = None
+                self._wait(self.idle_seconds)
+            elif progressed:
+                backoff = None
+            else:
+                backoff = self.backoff_initial_seconds if backoff is None else min(backoff * 2, self.backoff_max_seconds)
+                self.log(f"Spool replay made no progress, retrying in {backoff:.0f} seconds.")
+                # Neue Spool-Einträge dürfen den Backoff nicht verkürzen, nur stop() bricht ab.
+                self._stopped.wait(backoff)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Spielt eine aufgezeichnete Messreihe schneller als in Echtzeit durch die Agenten-Schleife.
+
+Abtastung, Fensterstatistik, Deadband, adaptive Abtastung und Batching laufen unverändert
+(``measure_and_upload.run_agent``, konfiguriert über dieselben ``SENSOR_*``-Variablen), nur auf der
+virtuellen Uhr aus ``replay_source.py``. Hochgeladen wird in eine Liste statt an Directus, mit
+``--upload`` über den normalen Upload-Pfad. Die Payloads landen ohne ``dedupe_key`` als JSON Lines
+in ``--output``; ``--compare`` prüft sie gegen einen früheren Lauf (Exit-Code 1 bei Abweichung)::
+
+    python replay_benchmark.py history/0x48_0 --speed 0 --output benchmarks/replay_day.jsonl
+    python replay_benchmark.py messreihe.csv --speed 1000 --compare benchmarks/replay_day.jsonl
+"""
+import argparse
+import json
+import resource
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import measure_and_upload
+from deadband_filter import DeadbandFilter
+from measure_and_upload import (
+    AVERAGE_WINDOW_SECONDS,
+    REPORT_DEADBAND_PERCENT,
+    REPORT_HEARTBEAT_SECONDS,
+    SAMPLE_INTERVAL_SECONDS,
+    UPLOAD_BATCH_LINGER_SECONDS,
+    UPLOAD_BATCH_SIZE,
+    BackgroundUploader,
+    MeasurementBatcher,
+    open_adaptive_sampler,
+    open_engine,
+    run_agent,
+    upload_measurements,
+)
+from offline_spool import DEDUPE_KEY_FIELD
+from replay_source import ReplaySampleSource
+from sampling_scheduler import MonotonicScheduler
+
+
+def _quiet(message: str, *args, **kwargs) -> None:
+    pass
+
+
+class CollectingUploader:
+    """Upload-Funktion für ``BackgroundUploader``, die die Payloads sammelt und optional weiterreicht."""
+
+    def __init__(self, upload: Optional[Callable[[List[dict]], List[dict]]] = None) -> None:
+        self.upload = upload
+        self.payloads: List[dict] = []
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, payloads: List[dict]) -> List[dict]:
+        with self._lock:
+            self.payloads.extend(payloads)
+            self.requests += 1
+        return self.upload(payloads) if self.upload else []
+
+
+def comparable(payload: dict) -> dict:
+    return {key: value for key, value in payload.items() if key != DEDUPE_KEY_FIELD}
+
+
+def compare_payloads(payloads: List[dict], path: str) -> bool:
+    """Druckt die erste Abweichung zu einem früheren Lauf; False, wenn es eine gibt."""
+    with open(path, encoding="utf-8") as file:
+        expected = [json.loads(line) for line in file if line.strip()]
+    actual = [comparable(payload) for payload in payloads]
+    for index, (got, want) in enumerate(zip(actual, expected)):
+        if got != want:
+            print(f"  Payload {index} differs:\n    expected {want}\n    got      {got}")
+            return False
+    if len(actual) != len(expected):
+        print(f"  Expected {len(expected)} payloads, got {len(actual)}.")
+        return False
+    print(f"  All {len(actual)} payloads match.")
+    return True
+
+
+def run_replay(args: argparse.Namespace) -> Dict:
+    source = ReplaySampleSource.from_path(args.trace, args.speed)
+    clock = source.clock
+    engine = open_engine(source)
+
+    collector = CollectingUploader(upload_measurements if args.upload else None)
+    failed: List[dict] = []
+    uploader = BackgroundUploader(collector, failed.extend, max_pending=1_000_000)
+    scheduler = MonotonicScheduler(SAMPLE_INTERVAL_SECONDS, clock=clock.monotonic, sleep=clock.sleep)
+    deadband = DeadbandFilter(REPORT_DEADBAND_PERCENT, REPORT_HEARTBEAT_SECONDS, clock=clock.monotonic)
+    batcher = MeasurementBatcher(UPLOAD_BATCH_SIZE, UPLOAD_BATCH_LINGER_SECONDS, clock=clock.monotonic)
+    sampler = open_adaptive_sampler(clock.monotonic)
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    run_agent(engine, scheduler, deadband, batcher, uploader, None, sampler, clock, lambda: not source.finished)
+    elapsed = time.perf_counter() - started
+    cpu_seconds = time.process_time() - cpu_started
+
+    virtual_seconds = clock.monotonic()
+    payloads = collector.payloads
+    return {
+        "payloads": payloads,
+        "result": {
+            "trace": args.trace,
+            "channels": [config.key for config in engine.configs],
+            "speed": args.speed,
+            "sample_interval_seconds": SAMPLE_INTERVAL_SECONDS,
+            "window_seconds": AVERAGE_WINDOW_SECONDS,
+            "virtual_seconds": round(virtual_seconds, 3),
+            "elapsed_seconds": round(elapsed, 3),
+            "speedup": round(virtual_seconds / elapsed, 1) if elapsed else None,
+            "ticks": scheduler.ticks_total,
+            "windows_uploaded": len(payloads),
+            "upload_requests": collector.requests,
+            "failed": len(failed),
+            "ticks_per_second": round(scheduler.ticks_total / elapsed, 1) if elapsed else None,
+            "cpu_seconds": round(cpu_seconds, 3),
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a recorded trace through the sensor agent pipeline.")
+    parser.add_argument("trace", help="CSV file, history directory, channel directory or raw.ring file.")
+    parser.add_argument("--speed", type=float, default=1000.0, help="Virtual seconds per real second (0 = no waiting).")
+    parser.add_argument("--upload", action="store_true", help="Upload to Directus instead of collecting the payloads.")
+    parser.add_argument("--output", help="Write the payloads (without dedupe_key) as JSON Lines.")
+    parser.add_argument("--compare", help="Payloads of a previous run to compare against.")
+    parser.add_argument("--verbose", action="store_true", help="Keep the per-window log of the agent.")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        # run_agent loggt jedes Fenster; bei tausendfacher Geschwindigkeit würde das die Messung dominieren.
+        measure_and_upload.log = _quiet
+
+    replay = run_replay(args)
+    print(json.dumps(replay["result"], indent=4))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            for payload in replay["payloads"]:
+                file.write(json.dumps(comparable(payload)) + "\n")
+        print(f"Saved {len(replay['payloads'])} payloads to {args.output}")
+
+    if args.compare:
+        print(f"Compared to {args.compare}:")
+        if not compare_payloads(replay["payloads"], args.compare):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Wiedergabe aufgezeichneter Messreihen als ``SampleSource``, auf einer virtuellen Uhr.
+
+Eine Messreihe besteht aus (Zeitstempel, Spannung) je Kanal und kommt aus
+
+- einer CSV-Datei mit den Spalten ``timestamp`` (Unix-Sekunden oder ISO 8601), ``voltage`` und
+  optional ``channel`` (z.B. ``0x48/0``; ohne Spalte gilt die Reihe für alle Kanäle), z.B. die
+  Ausgabe von ``python timeseries_store.py <history> 0x48/0 raw``, oder
+- der lokalen Historie (``timeseries_store.py``): ein History-Verzeichnis mit einem Unterverzeichnis
+  je Kanal, ein Kanalverzeichnis oder direkt eine ``raw.ring``-Datei.
+
+Die ``VirtualClock`` beginnt beim ersten Zeitstempel und läuft ``speed``-mal schneller als die echte
+Zeit (``speed`` 0: ohne Warten). Scheduler, Fenster, Deadband und Batching bekommen diese Uhr, die
+Verarbeitung selbst bleibt unverändert. Pro Tick liefert ``ReplaySampleSource`` alle aufgezeichneten
+Spannungen seit dem letzten Tick, ohne neue Werte die letzte bekannte Spannung.
+"""
+import csv
+import datetime as dt
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from acquisition import ChannelConfig, SampleSource, _parse_address
+from timeseries_store import HEADER, MAGIC, RAW_RECORD, TIER_RAW
+
+RING_FILE_NAME = f"{TIER_RAW}.ring"
+
+# Zeitstempel und Spannungen eines Kanals, aufsteigend sortiert
+Trace = Tuple[np.ndarray, np.ndarray]
+
+
+class VirtualClock:
+    """Uhr für die Wiedergabe: ``monotonic``/``time``/``sleep`` wie im Modul ``time``, aber beschleunigt."""
+
+    def __init__(self, start_time: float, speed: float = 1000.0) -> None:
+        if speed < 0:
+            raise ValueError("speed must not be negative.")
+        self.start_time = start_time
+        self.speed = speed
+        self._elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def monotonic(self) -> float:
+        return self._elapsed
+
+    def time(self) -> float:
+        return self.start_time + self._elapsed
+
+    def sleep(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        if self.speed:
+            time.sleep(seconds / self.speed)
+        with self._lock:
+            self._elapsed += seconds
+
+
+def _parse_timestamp(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        parsed = dt.datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=dt.timezone.utc)
+        return parsed.timestamp()
+
+
+def _channel_key(value: str) -> str:
+    """Normalisiert ``0x48/0`` oder den Verzeichnisnamen ``0x48_0`` zum Kanal-Key."""
+    address, _, channel = value.replace("_", "/").rpartition("/")
+    return ChannelConfig(_parse_address(address), int(channel), 0.0, 1.0).key
+
+
+def _to_trace(timestamps: List[float], voltages: List[float]) -> Trace:
+    timestamps_array = np.asarray(timestamps, dtype=np.float64)
+    voltages_array = np.asarray(voltages, dtype=np.float64)
+    order = np.argsort(timestamps_array, kind="stable")
+    return timestamps_array[order], voltages_array[order]
+
+
+def read_csv_trace(path: str) -> Dict[Optional[str], Trace]:
+    columns: Dict[Optional[str], Tuple[List[float], List[float]]] = {}
+    with open(path, newline="") as file:
+        reader = csv.DictReader(file)
+        if not reader.fieldnames or "timestamp" not in reader.fieldnames or "voltage" not in reader.fieldnames:
+            raise ValueError(f"{path}: expected the columns timestamp and voltage.")
+        for row in reader:
+            channel = row.get("channel")
+            key = _channel_key(channel) if channel else None
+            timestamps, voltages = columns.setdefault(key, ([], []))
+            timestamps.append(_parse_timestamp(row["timestamp"]))
+            voltages.append(float(row["voltage"]))
+    return {key: _to_trace(*values) for key, values in columns.items()}
+
+
+def read_ring_trace(path: str) -> Trace:
+    """Liest die Rohwerte einer ``raw.ring``-Datei vom ältesten zum neuesten."""
+    with open(path, "rb") as file:
+        data = file.read()
+    magic, _, record_size, capacity, next_index, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or record_size != RAW_RECORD.size:
+        raise ValueError(f"{path} is not a raw history ring.")
+    records = np.frombuffer(
+        data, dtype=np.dtype([("timestamp", "<f8"), ("voltage", "<f4"), ("moisture", "<f4")]),
+        count=capacity, offset=HEADER.size,
+    )
+    start = (next_index - count) % capacity
+    records = np.roll(records, -start)[:count]
+    return _to_trace(records["timestamp"].tolist(), records["voltage"].tolist())
+
+
+def load_trace(path: str) -> Dict[Optional[str], Trace]:
+    """Lädt eine Messreihe; Keys sind Kanal-Keys oder None für eine Reihe ohne Kanal."""
+    if os.path.isdir(path):
+        ring_path = os.path.join(path, RING_FILE_NAME)
+        if os.path.exists(ring_path):
+            return {None: read_ring_trace(ring_path)}
+        traces = {
+            _channel_key(name): read_ring_trace(os.path.join(path, name, RING_FILE_NAME))
+            for name in sorted(os.listdir(path))
+            if os.path.exists(os.path.join(path, name, RING_FILE_NAME))
+        }
+        if not traces:
+            raise ValueError(f"{path} contains no {RING_FILE_NAME} files.")
+        return traces
+    if path.endswith(".ring"):
+        return {None: read_ring_trace(path)}
+    return read_csv_trace(path)
+
+
+def configs_for_trace(
+    traces: Dict[Optional[str], Trace], default_v_dry: float, default_v_wet: float, default_plant: Optional[str] = None
+) -> List[ChannelConfig]:
+    """Kanäle der Messreihe, falls ``SENSOR_CHANNELS`` nicht gesetzt ist."""
+    keys = [key for key in traces if key is not None] or ["0x48/0"]
+    configs = []
+    for key in keys:
+        address, _, channel = key.rpartition("/")
+        configs.append(ChannelConfig(_parse_address(address), int(channel), default_v_dry, default_v_wet, default_plant))
+    return configs
+
+
+class ReplaySampleSource(SampleSource):
+    name = "replay"
+
+    def __init__(self, traces: Dict[Optional[str], Trace], clock: VirtualClock) -> None:
+        traces = {key: trace for key, trace in traces.items() if len(trace[0])}
+        if not traces:
+            raise ValueError("The trace contains no samples.")
+        self.traces = traces
+        self.clock = clock
+        self.start_time = min(trace[0][0] for trace in traces.values())
+        self.end_time = max(trace[0][-1] for trace in traces.values())
+        # Index des nächsten noch nicht gelieferten Werts je Kanal
+        self._positions: Dict[str, int] = {}
+
+    @classmethod
+    def from_path(cls, path: str, speed: float = 1000.0) -> "ReplaySampleSource":
+        traces = load_trace(path)
+        start_time = min(trace[0][0] for trace in traces.values() if len(trace[0]))
+        return cls(traces, VirtualClock(start_time, speed))
+
+    @property
+    def finished(self) -> bool:
+        return self.clock.time() > self.end_time
+
+    def check_channels(self, configs: List[ChannelConfig]) -> None:
+        missing = [config.key for config in configs if config.key not in self.traces and None not in self.traces]
+        if missing:
+            raise ValueError(f"The trace has no samples for {', '.join(missing)}.")
+
+    def read_voltages(self, config: ChannelConfig) -> np.ndarray:
+        timestamps, voltages = self.traces.get(config.key) or self.traces[None]
+        position = self._positions.get(config.key, 0)
+        end = int(np.searchsorted(timestamps, self.clock.time(), side="right"))
+        self._positions[config.key] = max(position, end)
+        if end > position:
+            return voltages[position:end]
+        # Kein neuer Wert seit dem letzten Tick: letzte bekannte Spannung halten
+        return voltages[max(0, end - 1): max(1, end)]
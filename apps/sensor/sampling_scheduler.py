@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Taktgeber für die Sensor-Schleifen auf Basis von ``time.monotonic()``.
+
+Statt nach jeder Messung eine feste Zeit zu schlafen, wird auf feste Deadlines
+(start + n * interval) gewartet. Dauert eine Iteration länger als ein Intervall,
+werden die verpassten Ticks übersprungen und gezählt, damit der Takt nicht driftet.
+"""
+import time
+from typing import Callable, Dict, Optional
+
+
+class MonotonicScheduler:
+    def __init__(
+        self,
+        interval_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        if interval_seconds <= 0:
+            raise ValueError("interval_seconds must be greater than 0.")
+        self.interval_seconds = interval_seconds
+        self.clock = clock
+        self.sleep = sleep
+        self._next_deadline: Optional[float] = None
+
+        # Gesamtzähler seit dem Start
+        self.ticks_total = 0
+        self.missed_ticks_total = 0
+        # Zähler seit dem letzten Aufruf von take_stats()
+        self._ticks = 0
+        self._missed_ticks = 0
+        self._jitter_sum = 0.0
+        self._jitter_max = 0.0
+
+    def wait_next(self) -> float:
+        """Blockiert bis zur nächsten Deadline und gibt deren monotonen Zeitpunkt zurück."""
+        delay = self.seconds_until_next()
+        if delay > 0:
+            self.sleep(delay)
+        return self.advance()
+
+    def seconds_until_next(self) -> float:
+        """Wartezeit bis zur nächsten Deadline, ohne zu schlafen (für asyncio-Schleifen)."""
+        if self._next_deadline is None:
+            return 0.0
+        return max(0.0, self._next_deadline - self.clock())
+
+    def advance(self) -> float:
+        """Verbucht den Tick nach dem Warten und gibt die Deadline zurück."""
+        now = self.clock()
+        if self._next_deadline is None:
+            self._next_deadline = now
+
+        missed = int((now - self._next_deadline) // self.interval_seconds)
+        if missed > 0:
+            self._next_deadline += missed * self.interval_seconds
+            self._missed_ticks += missed
+            self.missed_ticks_total += missed
+
+        jitter = now - self._next_deadline
+        self._jitter_sum += jitter
+        self._jitter_max = max(self._jitter_max, jitter)
+        self._ticks += 1
+        self.ticks_total += 1
+
+        deadline = self._next_deadline
+        self._next_deadline += self.interval_seconds
+        return deadline
+
+    def set_interval(self, interval_seconds: float) -> None:
+        """Ändert das Intervall ab der nächsten Deadline (letzte Deadline + neues Intervall)."""
+        if interval_seconds <= 0:
+            raise ValueError("interval_seconds must be greater than 0.")
+        if self._next_deadline is not None:
+            self._next_deadline += interval_seconds - self.interval_seconds
+        self.interval_seconds = interval_seconds
+
+    def take_stats(self) -> Dict[str, float]:
+        """Liefert Ticks, verpasste Ticks und Jitter seit dem letzten Aufruf und setzt sie zurück."""
+        stats = {
+            "ticks": self._ticks,
+            "missed_ticks": self._missed_ticks,
+            "jitter_avg_ms": (self._jitter_sum / self._ticks * 1000) if self._ticks else 0.0,
+            "jitter_max_ms": self._jitter_max * 1000,
+        }
+        self._ticks = 0
+        self._missed_ticks = 0
+        self._jitter_sum = 0.0
+        self._jitter_max = 0.0
+        return stats
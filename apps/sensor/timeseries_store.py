@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""Lokale Messhistorie auf dem Pi in memory-mapped Ringdateien.
+
+Pro Kanal gibt es eine Ringdatei mit Rohwerten und je eine mit 1-Minuten-, 1-Stunden- und
+1-Tages-Aggregaten (min/max/avg). Die Dateien haben eine feste Größe; ist ein Ring voll,
+überschreibt der neueste Eintrag den ältesten. So bleibt die Historie für Diagnose und
+Backfill lokal verfügbar, ohne Directus abzufragen.
+
+Auslesen, z.B. die Stundenwerte von Kanal 0x48/0 als CSV::
+
+    python timeseries_store.py /app/history 0x48/0 hour
+"""
+import fcntl
+import mmap
+import os
+import re
+import struct
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+MAGIC = b"FPTS"
+VERSION = 1
+# magic, version, record size, capacity, next write index, record count
+HEADER = struct.Struct("<4sHHIII")
+
+# timestamp, voltage, moisture
+RAW_RECORD = struct.Struct("<dff")
+# bucket start, count, voltage min/max/sum, moisture min/max/sum
+ROLLUP_RECORD = struct.Struct("<dIffdffd")
+
+TIER_RAW = "raw"
+LOCK_FILE_NAME = ".lock"
+ROLLUP_TIERS = {"minute": 60, "hour": 3600, "day": 86400}
+
+
+class MmapRing:
+    """Ringpuffer fester Größe für Records gleicher Länge in einer memory-mapped Datei."""
+
+    def __init__(self, path: str, record: struct.Struct, capacity: int) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be greater than 0.")
+        self.path = path
+        self.record = record
+        self.capacity = capacity
+        size = HEADER.size + record.size * capacity
+
+        exists = os.path.exists(path)
+        self._file = open(path, "r+b" if exists else "w+b")
+        if not exists or os.path.getsize(path) != size or not self._header_matches():
+            # Neue Datei oder geänderte Größe: Ring neu anlegen.
+            self._file.truncate(size)
+            self._file.seek(0)
+            self._file.write(HEADER.pack(MAGIC, VERSION, record.size, capacity, 0, 0))
+            self._file.flush()
+        self._map = mmap.mmap(self._file.fileno(), size)
+        _, _, _, _, self._next, self._count = HEADER.unpack_from(self._map, 0)
+
+    def _header_matches(self) -> bool:
+        self._file.seek(0)
+        data = self._file.read(HEADER.size)
+        if len(data) != HEADER.size:
+            return False
+        magic, version, record_size, capacity, _, _ = HEADER.unpack(data)
+        return magic == MAGIC and version == VERSION and record_size == self.record.size and capacity == self.capacity
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, *values) -> None:
+        self.record.pack_into(self._map, HEADER.size + self._next * self.record.size, *values)
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, self.record.size, self.capacity, self._next, self._count)
+
+    def __iter__(self) -> Iterator[tuple]:
+        """Liefert die Records vom ältesten zum neuesten."""
+        start = (self._next - self._count) % self.capacity
+        for offset in range(self._count):
+            index = (start + offset) % self.capacity
+            yield self.record.unpack_from(self._map, HEADER.size + index * self.record.size)
+
+    def __reversed__(self) -> Iterator[tuple]:
+        """Liefert die Records vom neuesten zum ältesten."""
+        for offset in range(1, self._count + 1):
+            index = (self._next - offset) % self.capacity
+            yield self.record.unpack_from(self._map, HEADER.size + index * self.record.size)
+
+    def last(self) -> Optional[tuple]:
+        return next(reversed(self), None)
+
+    def flush(self) -> None:
+        self._map.flush()
+
+    def close(self) -> None:
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+
+
+class _Bucket:
+    __slots__ = ("start", "count", "v_min", "v_max", "v_sum", "m_min", "m_max", "m_sum")
+
+    def __init__(self, start: float) -> None:
+        self.start = start
+        self.count = 0
+        self.v_min = self.m_min = float("inf")
+        self.v_max = self.m_max = float("-inf")
+        self.v_sum = self.m_sum = 0.0
+
+    def add(self, voltage: float, moisture: float) -> None:
+        self.count += 1
+        self.v_min = min(self.v_min, voltage)
+        self.v_max = max(self.v_max, voltage)
+        self.v_sum += voltage
+        self.m_min = min(self.m_min, moisture)
+        self.m_max = max(self.m_max, moisture)
+        self.m_sum += moisture
+
+    def as_record(self) -> tuple:
+        return (self.start, self.count, self.v_min, self.v_max, self.v_sum, self.m_min, self.m_max, self.m_sum)
+
+
+class ChannelHistory:
+    def __init__(self, directory: str, raw_capacity: int, tier_capacities: Dict[str, int]) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.raw = MmapRing(os.path.join(directory, f"{TIER_RAW}.ring"), RAW_RECORD, raw_capacity)
+        self.tiers = {
+            tier: MmapRing(os.path.join(directory, f"{tier}.ring"), ROLLUP_RECORD, tier_capacities[tier])
+            for tier in ROLLUP_TIERS
+        }
+        # Das laufende Intervall je Stufe liegt nur im Speicher und wird beim Wechsel geschrieben.
+        # Nach einem Neustart wird es aus den Rohwerten wiederhergestellt.
+        self._buckets: Dict[str, Optional[_Bucket]] = {tier: self._restore_bucket(tier) for tier in ROLLUP_TIERS}
+
+    def _restore_bucket(self, tier: str) -> Optional[_Bucket]:
+        """Baut das offene Intervall einer Stufe aus den neuesten Rohwerten nach.
+
+        Reicht der Rohwert-Ring nicht bis zum Beginn des Intervalls zurück (z.B. ein Tag bei weniger als
+        24 Stunden Rohwerten), enthält es nur die noch vorhandenen Werte.
+        """
+        newest = self.raw.last()
+        if newest is None:
+            return None
+        seconds = ROLLUP_TIERS[tier]
+        start = newest[0] - newest[0] % seconds
+        written = self.tiers[tier].last()
+        if written is not None and written[0] >= start:
+            return None
+        bucket = _Bucket(start)
+        for timestamp, voltage, moisture in reversed(self.raw):
+            if timestamp < start:
+                break
+            bucket.add(voltage, moisture)
+        return bucket
+
+    def add(self, timestamp: float, voltage: float, moisture: float) -> None:
+        self.raw.append(timestamp, voltage, moisture)
+        for tier, seconds in ROLLUP_TIERS.items():
+            start = timestamp - timestamp % seconds
+            bucket = self._buckets[tier]
+            if bucket is None or bucket.start != start:
+                if bucket is not None and bucket.count:
+                    self.tiers[tier].append(*bucket.as_record())
+                bucket = self._buckets[tier] = _Bucket(start)
+            bucket.add(voltage, moisture)
+
+    def read(self, tier: str, since: Optional[float] = None) -> List[Dict[str, float]]:
+        if tier == TIER_RAW:
+            return [
+                {"timestamp": ts, "voltage": voltage, "moisture": moisture}
+                for ts, voltage, moisture in self.raw
+                if since is None or ts >= since
+            ]
+        records = list(self.tiers[tier])
+        bucket = self._buckets[tier]
+        if bucket is not None and bucket.count:
+            records.append(bucket.as_record())
+        return [
+            {
+                "timestamp": start,
+                "samples": count,
+                "voltage_min": v_min,
+                "voltage_max": v_max,
+                "voltage_avg": v_sum / count,
+                "moisture_min": m_min,
+                "moisture_max": m_max,
+                "moisture_avg": m_sum / count,
+            }
+            for start, count, v_min, v_max, v_sum, m_min, m_max, m_sum in records
+            if since is None or start >= since
+        ]
+
+    def flush(self) -> None:
+        self.raw.flush()
+        for ring in self.tiers.values():
+            ring.flush()
+
+    def close(self) -> None:
+        self.raw.close()
+        for ring in self.tiers.values():
+            ring.close()
+
+
+def _channel_directory_name(key: str) -> str:
+    return re.sub(r"[^0-9A-Za-z_-]", "_", key)
+
+
+class TimeSeriesStore:
+    """Historie für alle Kanäle, ein Unterverzeichnis pro Kanal.
+
+    Die Ringdateien haben keine eigene Synchronisation, daher hält der Store eine exklusive Sperre auf
+    ``LOCK_FILE_NAME``; ein zweiter Prozess mit demselben Verzeichnis bricht beim Start ab.
+    """
+
+    def __init__(self, directory: str, raw_capacity: int, tier_capacities: Dict[str, int]) -> None:
+        self.directory = directory
+        self.raw_capacity = raw_capacity
+        self.tier_capacities = tier_capacities
+        self._channels: Dict[str, ChannelHistory] = {}
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(os.path.join(directory, LOCK_FILE_NAME), "a")
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError(f"History {directory} is already in use by another process.") from None
+
+    def channel(self, key: str) -> ChannelHistory:
+        history = self._channels.get(key)
+        if history is None:
+            history = ChannelHistory(
+                os.path.join(self.directory, _channel_directory_name(key)), self.raw_capacity, self.tier_capacities
+            )
+            self._channels[key] = history
+        return history
+
+    def add(self, key: str, timestamp: float, voltage: float, moisture: float) -> None:
+        self.channel(key).add(timestamp, voltage, moisture)
+
+    def flush(self) -> None:
+        for history in self._channels.values():
+            history.flush()
+
+    def close(self) -> None:
+        for history in self._channels.values():
+            history.close()
+        self._channels.clear()
+        if not self._lock_file.closed:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+            self._lock_file.close()
+
+
+def _read_capacities(directory: str) -> Tuple[int, Dict[str, int]]:
+    """Liest die Kapazitäten aus vorhandenen Ringdateien, damit die CLI sie nicht neu anlegt."""
+    capacities = {}
+    for tier in (TIER_RAW, *ROLLUP_TIERS):
+        with open(os.path.join(directory, f"{tier}.ring"), "rb") as file:
+            capacities[tier] = HEADER.unpack(file.read(HEADER.size))[3]
+    raw_capacity = capacities.pop(TIER_RAW)
+    return raw_capacity, capacities
+
+
+def main(argv: List[str]) -> None:
+    if len(argv) not in (3, 4):
+        print("Usage: python timeseries_store.py <history_dir> <channel_key> [raw|minute|hour|day]")
+        sys.exit(1)
+    directory = os.path.join(argv[1], _channel_directory_name(argv[2]))
+    tier = argv[3] if len(argv) == 4 else "minute"
+    raw_capacity, tier_capacities = _read_capacities(directory)
+    history = ChannelHistory(directory, raw_capacity, tier_capacities)
+    rows = history.read(tier)
+    if rows:
+        print(",".join(rows[0].keys()))
+        for row in rows:
+            print(",".join(str(value) for value in row.values()))
+    history.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
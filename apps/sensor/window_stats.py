@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Inkrementelle Fenster-Statistik für die Sensor-Messungen.
+
+Jede Messung aktualisiert Anzahl, Mittelwert und Varianz (Welford), Minimum und Maximum
+in O(1), statt am Fensterende Listen aus allen Messungen zu bauen. Für den Median hält ein
+optionaler Ringpuffer (``array('d')``) die letzten N Werte mit festem Speicherbedarf.
+"""
+import math
+from array import array
+from typing import Dict, Optional
+
+
+class RunningStats:
+    __slots__ = ("count", "mean", "_m2", "min", "max")
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def variance(self) -> float:
+        """Stichprobenvarianz (n - 1), wie ``statistics.variance``."""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class RingBuffer:
+    """Fester Puffer für die letzten ``capacity`` Werte."""
+
+    __slots__ = ("capacity", "_values", "_next", "_size")
+
+    def __init__(self, capacity: int) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be greater than 0.")
+        self.capacity = capacity
+        self._values = array("d", bytes(8 * capacity))
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def reset(self) -> None:
+        self._next = 0
+        self._size = 0
+
+    def add(self, value: float) -> None:
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Perzentil mit linearer Interpolation; None, wenn der Puffer leer ist."""
+        if not self._size:
+            return None
+        ordered = sorted(self._values[: self._size])
+        position = (len(ordered) - 1) * percent / 100
+        lower = math.floor(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class WindowAggregator:
+    """Statistik über ein Messfenster für Spannung und Feuchtigkeit eines Kanals."""
+
+    def __init__(self, percentile_capacity: int = 0) -> None:
+        self.voltage = RunningStats()
+        self.moisture = RunningStats()
+        self._voltage_values = RingBuffer(percentile_capacity) if percentile_capacity > 0 else None
+        self._moisture_values = RingBuffer(percentile_capacity) if percentile_capacity > 0 else None
+
+    def __len__(self) -> int:
+        return self.voltage.count
+
+    def add(self, voltage: float, moisture: float) -> None:
+        self.voltage.add(voltage)
+        self.moisture.add(moisture)
+        if self._voltage_values is not None:
+            self._voltage_values.add(voltage)
+            self._moisture_values.add(moisture)
+
+    def reset(self) -> None:
+        self.voltage.reset()
+        self.moisture.reset()
+        if self._voltage_values is not None:
+            self._voltage_values.reset()
+            self._moisture_values.reset()
+
+    def stats(self) -> Dict[str, float]:
+        stats = {
+            "voltage_avg": self.voltage.mean,
+            "voltage_min": self.voltage.min,
+            "voltage_max": self.voltage.max,
+            "voltage_stddev": self.voltage.stddev,
+            "moisture_avg": self.moisture.mean,
+            "moisture_min": self.moisture.min,
+            "moisture_max": self.moisture.max,
+            "moisture_stddev": self.moisture.stddev,
+            "samples": self.voltage.count,
+        }
+        if self._voltage_values is not None:
+            stats["voltage_median"] = self._voltage_values.percentile(50)
+            stats["moisture_median"] = self._moisture_values.percentile(50)
+        return stats
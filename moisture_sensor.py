@@ -1,13 +1,18 @@
 #!/usr/bin/env python3
 import json
 import os
-import time
-import urllib.error
-import urllib.request
+import sys
+from concurrent.futures import ThreadPoolExecutor
 import board
 import busio
 import adafruit_ads1x15.ads1115 as ADS
 from adafruit_ads1x15.analog_in import AnalogIn
+import requests
+
+# Gemeinsamer Directus-Client aus apps/sensor
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "apps", "sensor"))
+from directus_client import DirectusClient  # noqa: E402
+from sampling_scheduler import MonotonicScheduler  # noqa: E402
 
 # --------------------
 # Kalibrierung
@@ -36,40 +41,34 @@ DIRECTUS_PASSWORD = os.getenv("DIRECTUS_PASSWORD")
 DIRECTUS_PLANT_ID = os.getenv("DIRECTUS_PLANT_ID")
 DIRECTUS_STATUS = os.getenv("DIRECTUS_STATUS", "published")
 DIRECTUS_TIMEOUT = float(os.getenv("DIRECTUS_TIMEOUT", "10"))
+# data_raw wiederholt die übrigen Felder als String und verdoppelt den Payload; mit "false" abschaltbar.
+DIRECTUS_SEND_DATA_RAW = os.getenv("DIRECTUS_SEND_DATA_RAW", "true").strip().lower() in {"1", "true", "yes", "on"}
 
 
-def directus_login():
-    if not DIRECTUS_URL or not DIRECTUS_EMAIL or not DIRECTUS_PASSWORD:
-        return None
-
-    payload = json.dumps(
-        {"email": DIRECTUS_EMAIL, "password": DIRECTUS_PASSWORD}
-    ).encode("utf-8")
-    request = urllib.request.Request(
-        f"{DIRECTUS_URL}/auth/login",
-        data=payload,
-        headers={"Content-Type": "application/json"},
-    )
-    with urllib.request.urlopen(request, timeout=DIRECTUS_TIMEOUT) as response:
-        response_data = json.loads(response.read().decode("utf-8"))
-    return response_data["data"]["access_token"]
+directus_client = DirectusClient(
+    DIRECTUS_URL, DIRECTUS_EMAIL, DIRECTUS_PASSWORD, timeout=DIRECTUS_TIMEOUT
+)
 
 
-def post_measurement(access_token, measurement):
-    if not DIRECTUS_URL or not access_token:
+def post_measurement(measurement):
+    if not directus_client.has_credentials:
         return
 
-    payload = json.dumps(measurement).encode("utf-8")
-    request = urllib.request.Request(
-        f"{DIRECTUS_URL}/items/sensor_measurements",
-        data=payload,
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        },
-    )
-    with urllib.request.urlopen(request, timeout=DIRECTUS_TIMEOUT):
-        pass
+    response = directus_client.create_items("sensor_measurements", measurement)
+    response.raise_for_status()
+
+
+def post_measurement_safe(measurement):
+    # Bei 401 loggt sich der Client selbst neu ein und wiederholt den Request.
+    try:
+        post_measurement(measurement)
+    except (requests.RequestException, RuntimeError) as exc:
+        print(f"Directus request failed: {exc}")
+
+
+# Uploads laufen in einem eigenen Thread, damit das Netzwerk den Messtakt nicht verzögert.
+upload_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="uploader")
+pending_upload = None
 
 
 def moisture_percent(voltage, v_dry, v_wet):
@@ -80,9 +79,10 @@ def moisture_percent(voltage, v_dry, v_wet):
 # --------------------
 # Loop
 # --------------------
-access_token = directus_login()
+scheduler = MonotonicScheduler(1.0)
 
 while True:
+    scheduler.wait_next()
     voltage = chan.voltage
 
     voltage_min = min(voltage_min, voltage)
@@ -101,24 +101,22 @@ while True:
 
     payload = {
         **output,
-        "data_raw": json.dumps(output),
         "status": DIRECTUS_STATUS,
     }
+    if DIRECTUS_SEND_DATA_RAW:
+        payload["data_raw"] = json.dumps(output)
     if DIRECTUS_PLANT_ID:
         payload["plant"] = DIRECTUS_PLANT_ID
 
-    try:
-        post_measurement(access_token, payload)
-    except urllib.error.HTTPError as exc:
-        if exc.code == 401:
-            try:
-                access_token = directus_login()
-                post_measurement(access_token, payload)
-            except (urllib.error.HTTPError, urllib.error.URLError) as auth_exc:
-                print(f"Directus auth failed: {auth_exc}")
-        else:
-            print(f"Directus request failed: {exc}")
-    except urllib.error.URLError as exc:
-        print(f"Directus request failed: {exc}")
-
-    time.sleep(1.0)
+    # Ist der vorherige Upload noch nicht fertig, wird diese Messung verworfen statt sich zu stauen.
+    if pending_upload is None or pending_upload.done():
+        pending_upload = upload_executor.submit(post_measurement_safe, payload)
+    else:
+        print("Previous upload still running, skipping this measurement.")
+
+    if scheduler.ticks_total % 60 == 0:
+        stats = scheduler.take_stats()
+        print(
+            f"Sampling: {stats['ticks']} ticks, {stats['missed_ticks']} missed, "
+            f"jitter avg {stats['jitter_avg_ms']:.1f} ms / max {stats['jitter_max_ms']:.1f} ms"
+        )
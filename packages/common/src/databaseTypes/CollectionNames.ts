@@ -17,5 +17,9 @@ export enum CollectionNames {
   PERMISSIONS = 'directus_permissions',
   POLICIES = 'directus_policies',
   WORKFLOWS = 'workflows',
-  WORKFLOWS_RUNS = 'workflows_runs'
+  WORKFLOWS_RUNS = 'workflows_runs',
+  SENSOR_MEASUREMENTS = 'sensor_measurements',
+  SENSOR_MEASUREMENTS_HOURLY = 'sensor_measurements_hourly',
+  SENSOR_MEASUREMENTS_DAILY = 'sensor_measurements_daily',
+  SENSOR_MEASUREMENTS_ROLLUP_STATE = 'sensor_measurements_rollup_state'
 }
@@ -15,6 +15,24 @@ mkdir -p ./data/database_backups/
 # Set read/write/execute permissions for all users
 chmod -R 777 ./data/database_backups/
 
+echo "Setting read/write permission for sensor spool"
+# Ensure the sensor offline spool directory exists
+mkdir -p ./data/sensor-spool/ ./data/sensor-spool-hw/
+# Set read/write/execute permissions for all users
+chmod -R 777 ./data/sensor-spool/ ./data/sensor-spool-hw/
+
+echo "Setting read/write permission for sensor history"
+# Ensure the sensor history directory exists
+mkdir -p ./data/sensor-history/ ./data/sensor-history-hw/
+# Set read/write/execute permissions for all users
+chmod -R 777 ./data/sensor-history/ ./data/sensor-history-hw/
+
+echo "Setting read/write permission for sensor calibration"
+# Ensure the sensor calibration directory exists
+mkdir -p ./data/sensor-calibration/
+# Set read/write/execute permissions for all users
+chmod -R 777 ./data/sensor-calibration/
+
 echo "Setting read/write permission for .env file"
 ENV_FILE="/data/.env"
 if [ -f "$ENV_FILE" ]; then